@@ -1,57 +1,133 @@
-from flask import Flask
+from flask import Flask, current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
-from flask_migrate import Migrate
 from dotenv import load_dotenv
 import os
+import sys
 from flask import jsonify
-from celery import Celery
-from flask_swagger_ui import get_swaggerui_blueprint
 import json
 
 # Load environment variables
 load_dotenv()
 
+# Applies the SQLite connection settings to each engine the extension creates
+class _SQLAlchemy(SQLAlchemy):
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        from app.models import configure_sqlite_engine
+        configure_sqlite_engine(engine)
+        return engine
+
 # Initialize extensions without app
-db = SQLAlchemy()
+db = _SQLAlchemy()
 jwt = JWTManager()
-migrate = Migrate()
 
 # Configure Redis URL - use environment variables or fallback to default
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
-# Create Celery instance
-celery = Celery(__name__,
-               broker=REDIS_URL,
-               backend=REDIS_URL,
-               include=['app.tasks'])
+# Celery, Flask-Migrate and Swagger UI are imported on first use so web workers,
+# the Celery worker and CLI jobs only pay for what they touch
+_celery = None
+_celery_flask_app = None
+_migrate = None
+
+# Create the Celery instance on first access and bind it to the latest app
+def get_celery():
+    global _celery
+    if _celery is None:
+        from celery import Celery, Task
+
+        # Base class of every task, whichever is imported first: tasks run in
+        # the context of the app bound most recently
+        class ContextTask(Task):
+            abstract = True  # Marks this as a base class, not a task to be registered
+
+            def __call__(self, *args, **kwargs):
+                # An eager task called from a request keeps the caller's context and session
+                if _celery_flask_app is None or \
+                        (has_app_context() and current_app._get_current_object() is _celery_flask_app):
+                    return self.run(*args, **kwargs)
+                with _celery_flask_app.app_context():
+                    return self.run(*args, **kwargs)
+
+            # Embedded mode has no broker: queued tasks run on an in-process thread pool
+            def apply_async(self, args=None, kwargs=None, task_id=None, **options):
+                if _celery_flask_app is not None and _celery_flask_app.config.get('EMBEDDED_MODE') \
+                        and not self.app.conf.task_always_eager:
+                    from app.embedded import get_executor
+                    return get_executor(_celery_flask_app).submit(self, args, kwargs, task_id)
+                # The id is chosen here so a publish that raises can still close its trace span
+                from celery.utils import uuid
+                task_id = task_id or uuid()
+                try:
+                    return super().apply_async(args, kwargs, task_id=task_id, **options)
+                finally:
+                    from app.tracing import end_publish_span
+                    end_publish_span(task_id, sys.exc_info()[1])
+
+        _celery = Celery(__name__,
+                         broker=REDIS_URL,
+                         backend=REDIS_URL,
+                         include=['app.tasks'],
+                         task_cls=ContextTask)
+        if _celery_flask_app is not None:
+            make_celery(_celery_flask_app)
+    return _celery
+
+# Create the Flask-Migrate extension on first access
+def get_migrate():
+    global _migrate
+    if _migrate is None:
+        from flask_migrate import Migrate
+        # Batch mode lets autogenerated migrations alter SQLite tables
+        _migrate = Migrate(render_as_batch=True)
+    return _migrate
+
+# Keep `from app import celery, migrate` working while deferring the imports
+def __getattr__(name):
+    if name == 'celery':
+        return get_celery()
+    if name == 'migrate':
+        return get_migrate()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Configure Celery instance with Flask app context for database access
 def make_celery(app=None):
+    global _celery_flask_app
+    celery = get_celery()
     if app:
+        _celery_flask_app = app
         celery.conf.update(
             broker_url=app.config.get('CELERY_BROKER_URL', REDIS_URL),
-            result_backend=app.config.get('CELERY_RESULT_BACKEND', REDIS_URL)
+            result_backend=app.config.get('CELERY_RESULT_BACKEND', REDIS_URL),
+            beat_schedule=app.config.get('CELERY_BEAT_SCHEDULE', {}),
+            task_acks_late=app.config.get('CELERY_TASK_ACKS_LATE', True),
+            task_reject_on_worker_lost=True,
+            worker_prefetch_multiplier=app.config.get('CELERY_WORKER_PREFETCH_MULTIPLIER', 1),
+            broker_transport_options={'visibility_timeout': app.config.get('CELERY_VISIBILITY_TIMEOUT', 3600)},
+            # Notes queued without the scheduler still land on the interactive queue
+            task_routes={'app.tasks.process_note': {'queue': 'notes.interactive'}}
         )
-        celery.conf.update(app.config)
+        # The broker and backend were mapped to new-style names above; passing the
+        # old-style keys too would trip Celery's "cannot mix" settings check
+        celery.conf.update({key: value for key, value in app.config.items()
+                            if key not in ('CELERY_BROKER_URL', 'CELERY_RESULT_BACKEND')})
+        # Carry request traces through task message headers
+        if app.config.get('TRACING_ENABLED'):
+            from app.tracing import instrument_celery
+            instrument_celery()
 
-        class ContextTask(celery.Task):
-            abstract = True  # Marks this as a base class, not a task to be registered
-            
-            def __call__(self, *args, **kwargs):
-                with app.app_context():
-                    return self.run(*args, **kwargs)
-
-        celery.Task = ContextTask
     return celery
 
-# Flask application factory that initializes app with extensions and blueprints
-def create_app(config_class=None):
-    app = Flask(__name__)
-    
-    from app.utils import initialize_limiter
-    limiter = initialize_limiter(app)
-    # Determine which config to load
+# Remember the app Celery should use, configuring it now only if it already exists
+def bind_celery(app):
+    global _celery_flask_app
+    _celery_flask_app = app
+    if _celery is not None:
+        make_celery(app)
+
+# Load the config class, picking one from FLASK_ENV when none is given
+def load_config(app, config_class=None):
     if config_class is None:
         env = os.getenv('FLASK_ENV', 'development')
         if env == 'production':
@@ -67,47 +143,115 @@ def create_app(config_class=None):
         app.config['CELERY_BROKER_URL'] = REDIS_URL
     if 'CELERY_RESULT_BACKEND' not in app.config:
         app.config['CELERY_RESULT_BACKEND'] = REDIS_URL
+    # Embedded mode keeps rate limit counters in this process too
+    if app.config.get('EMBEDDED_MODE'):
+        app.config['RATELIMIT_STORAGE_URL'] = 'memory://'
 
-    # Initialize extensions with app
+# Slim application factory for the Celery worker: config, database and Celery only
+def create_worker_app(config_class=None):
+    app = Flask(__name__)
+    load_config(app, config_class)
+    db.init_app(app)
+    from app.tracing import init_tracing
+    init_tracing(app)
+    make_celery(app)
+    return app
+
+# Flask application factory that initializes app with extensions and blueprints
+def create_app(config_class=None):
+    app = Flask(__name__)
+    load_config(app, config_class)
+
+    # Registers no request hooks; tracing instruments its engine
     db.init_app(app)
+
+    # First, so the request span covers the other request hooks
+    from app.tracing import init_tracing
+    init_tracing(app)
+
+    # Before the rate limiter, so shed requests cost as little as possible
+    from app.admission import init_admission
+    init_admission(app)
+
+    from app.utils import initialize_limiter
+    limiter = initialize_limiter(app)
+
+    # Initialize extensions with app
     jwt.init_app(app)
-    migrate.init_app(app, db)
+    from app.tokens import init_tokens
+    init_tokens(jwt)
+    # The `flask db` commands import Flask-Migrate before the app is created;
+    # web workers never need it
+    if app.config.get('MIGRATE_ENABLED') or 'flask_migrate' in sys.modules:
+        get_migrate().init_app(app, db)
 
-    # Update Celery config with app - make sure to call make_celery!
-    make_celery(app)
+    # Bind Celery to this app; the instance itself is created on first use
+    bind_celery(app)
+    # Without Celery beat, embedded mode runs the periodic jobs in a thread of its own
+    if app.config.get('EMBEDDED_MODE'):
+        from app.embedded import start_beat
+        app.before_first_request(lambda: start_beat(app))
 
     # Register blueprints
     from app.auth import auth_bp
     from app.contacts import contacts_bp
     from app.notes import notes_bp
+    from app.sync import sync_bp
+    from app.events import events_bp
+    from app.batch import batch_bp
+    from app.stats import stats_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(contacts_bp)
     app.register_blueprint(notes_bp)
+    app.register_blueprint(sync_bp)
+    app.register_blueprint(events_bp)
+    app.register_blueprint(batch_bp)
+    app.register_blueprint(stats_bp)
+
+    # Register CLI commands
+    from app.seed import seed_command
+    from app.startup import startup_profile_command
+    from app.scheduling import queues_command
+    from app.stats import rebuild_stats_command
+    app.cli.add_command(seed_command)
+    app.cli.add_command(startup_profile_command)
+    app.cli.add_command(queues_command)
+    app.cli.add_command(rebuild_stats_command)
     
     # Set up Swagger docs
-    SWAGGER_URL = '/api/docs'
-    API_URL = '/static/swagger.json'
+    if app.config.get('SWAGGER_ENABLED', True):
+        from flask_swagger_ui import get_swaggerui_blueprint
+
+        SWAGGER_URL = '/api/docs'
+        API_URL = '/static/swagger.json'
 
-    swaggerui_blueprint = get_swaggerui_blueprint(
-        SWAGGER_URL,
-        API_URL,
-        config={
-            'app_name': "Contact Notes API"
-        }
-    )
+        swaggerui_blueprint = get_swaggerui_blueprint(
+            SWAGGER_URL,
+            API_URL,
+            config={
+                'app_name': "Contact Notes API"
+            }
+        )
 
-    app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+        app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+
+    # Serve swagger.json from memory: parsed, serialized and compressed once at startup
+    from app.compression import StaticDocument, init_compression
+    try:
+        swagger_document = StaticDocument(os.path.join(app.static_folder, 'swagger.json'))
+    except (OSError, json.JSONDecodeError) as e:
+        app.logger.error(f"Error loading swagger file: {str(e)}")
+        swagger_document = None
 
-    # Create a route to serve the swagger.json file
     @app.route('/static/swagger.json')
     def get_swagger():
-        try:
-            with open('app/static/swagger.json', 'r') as f:
-                return jsonify(json.load(f))
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            app.logger.error(f"Error loading swagger file: {str(e)}")
+        if swagger_document is None:
             return jsonify({"error": "Swagger file not available"}), 500
+        return swagger_document.response()
+
+    # Compress responses for clients that send Accept-Encoding
+    init_compression(app)
 
     # Global error handler
     @app.errorhandler(Exception)
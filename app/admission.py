@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+
+from flask import current_app, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Data writes, refused while the processing backlog is full
+BACKLOG_BLUEPRINTS = ('contacts', 'notes', 'batch')
+# Long-lived streams and static documents would skew the latency signal
+EXEMPT_BLUEPRINTS = ('events', 'swagger_ui')
+EXEMPT_ENDPOINTS = ('static', 'get_swagger')
+# Set by the proxy in front of the app to when it received the request
+QUEUE_START_HEADER = 'X-Request-Start'
+
+
+# Seconds a request waited between the proxy and a free worker thread, from an
+# X-Request-Start value: "t=1700000000.123" (nginx), milliseconds or microseconds
+def queue_delay(value, now=None):
+    value = (value or '').strip()
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return 0.0
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    # Clock skew between the proxy and this host must not count as waiting
+    return max(0.0, (now if now is not None else time.time()) - started)
+
+
+class AdaptiveLimiter:
+    """
+    Per-process limit on requests in flight, adjusted AIMD style: each request
+    finishing (queue wait included) within `latency_target` seconds while the limit is at least half
+    used adds 1/limit (about +1 per limit's worth of requests); a slower or
+    failed one cuts it by `backoff`, at most once per `latency_target` so one
+    slow spell is not punished many times over. Writes may only use
+    `write_share` of the limit, so reads keep being admitted once writes are shed.
+    """
+
+    def __init__(self, initial, minimum, maximum, latency_target, write_share, backoff=0.9):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.write_share = write_share
+        self.backoff = backoff
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, write=False):
+        with self._lock:
+            allowed = self.limit * self.write_share if write else self.limit
+            if self.in_flight >= allowed:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, failed=False):
+        with self._lock:
+            busy = self.in_flight >= self.limit / 2
+            self.in_flight -= 1
+            now = time.monotonic()
+            if failed or latency > self.latency_target:
+                if now - self._last_decrease >= self.latency_target:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif busy:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class Admission:
+    """
+    Load shedding for one app: the adaptive in-flight limit, plus a check of
+    the note processing backlog that refuses data writes while more than
+    ADMISSION_MAX_BACKLOG notes wait, re-read at most every
+    ADMISSION_BACKLOG_CHECK_INTERVAL seconds. A threaded server never has more
+    than `threads` requests in flight, so the limit is capped there; above it
+    nothing would ever be shed.
+    """
+
+    def __init__(self, config, threads=None):
+        self.config = config
+        maximum = config['ADMISSION_MAX_LIMIT']
+        if threads:
+            maximum = min(maximum, threads)
+        self.limiter = AdaptiveLimiter(
+            min(config['ADMISSION_INITIAL_LIMIT'], maximum),
+            min(config['ADMISSION_MIN_LIMIT'], maximum),
+            maximum,
+            config['ADMISSION_LATENCY_TARGET_MS'] / 1000,
+            config['ADMISSION_WRITE_SHARE'],
+        )
+        self._backlog_checked_at = None
+        self._backlog_full = False
+        self._backlog_lock = threading.Lock()
+
+    def cached_backlog_full(self):
+        """The last backlog answer while it is fresh, else None."""
+        checked_at = self._backlog_checked_at
+        if checked_at is None or time.monotonic() - checked_at >= self.config['ADMISSION_BACKLOG_CHECK_INTERVAL']:
+            return None
+        return self._backlog_full
+
+    def backlog_full(self):
+        """True while too many notes wait for processing. Redis errors admit writes."""
+        with self._backlog_lock:
+            full = self.cached_backlog_full()
+            if full is not None:
+                return full
+            # Other threads keep the last answer while this one asks Redis
+            self._backlog_checked_at = time.monotonic()
+        from app.scheduling import backlog
+        try:
+            full = backlog() > self.config['ADMISSION_MAX_BACKLOG']
+        except Exception as e:
+            logger.warning(f"Could not read the processing backlog, admitting writes: {str(e)}")
+            full = False
+        self._backlog_full = full
+        return full
+
+    def check(self, write, backlog_full=False):
+        """
+        Admit a request, returning None, or return (error, Retry-After seconds)
+        for the 503 that sheds it.
+        """
+        if backlog_full:
+            return 'Too many notes are waiting to be processed', self.config['ADMISSION_BACKLOG_RETRY_AFTER']
+        if not self.limiter.try_acquire(write):
+            return 'Server is overloaded', self.config['ADMISSION_RETRY_AFTER']
+        return None
+
+
+def init_admission(app):
+    if not app.config.get('ADMISSION_ENABLED'):
+        return
+    app.extensions['admission'] = Admission(app.config, app.config.get('WEB_THREADS'))
+    app.before_request(_admit)
+    app.after_request(_record_status)
+    app.teardown_request(_release)
+
+
+def overloaded_response(error, retry_after):
+    response = jsonify({'error': error})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _admit():
+    if request.blueprint in EXEMPT_BLUEPRINTS or request.endpoint in EXEMPT_ENDPOINTS:
+        return None
+    admission = current_app.extensions['admission']
+    write = request.method not in READ_METHODS
+    shed = admission.check(write, write and request.blueprint in BACKLOG_BLUEPRINTS and admission.backlog_full())
+    if shed:
+        logger.info(f"Shedding {request.method} {request.path}: {shed[0]}")
+        return overloaded_response(*shed)
+    # Time spent queued for a thread counts toward latency; it is what overload looks like here
+    g.admitted_at = time.monotonic() - queue_delay(request.headers.get(QUEUE_START_HEADER))
+    return None
+
+
+def _release(error=None):
+    admitted_at = g.pop('admitted_at', None)
+    if admitted_at is None:
+        return
+    # Server errors (a database timing out, say) count as congestion too
+    failed = error is not None or g.pop('admission_failed', False)
+    current_app.extensions['admission'].limiter.release(time.monotonic() - admitted_at, failed)
+
+
+# Remember 5xx responses for _release, which only sees unhandled exceptions
+def _record_status(response):
+    if 'admitted_at' in g and response.status_code >= 500:
+        g.admission_failed = True
+    return response
@@ -0,0 +1,123 @@
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.models import ArchivedNote, Contact, Note, db
+from app.ownership import cache as ownership
+
+notes_table = Note.__table__
+archive_table = ArchivedNote.__table__
+
+def compress_body(body):
+    return zlib.compress(body.encode('utf-8'), 9)
+
+
+def decompress_body(data):
+    return zlib.decompress(data).decode('utf-8')
+
+
+def archive_notes(older_than_days, batch_size):
+    """
+    Move notes not modified for `older_than_days` into notes_archive with
+    compressed bodies, `batch_size` notes per transaction. Rows are moved
+    with Core statements, so the sync feed does not see the move as a delete.
+    Returns the number of notes archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    last_modified = func.coalesce(notes_table.c.updated_at, notes_table.c.created_at)
+    archived = 0
+    last_id = 0
+    while True:
+        # Notes being edited right now are skipped rather than waited on (Postgres)
+        rows = db.session.execute(
+            select(notes_table).where(
+                notes_table.c.id > last_id,
+                last_modified < cutoff
+            ).order_by(notes_table.c.id).limit(batch_size).with_for_update(skip_locked=True)
+        ).mappings().all()
+        if not rows:
+            break
+        now = datetime.utcnow()
+        db.session.execute(archive_table.insert(), [{
+            'id': row['id'],
+            'contact_id': row['contact_id'],
+            'body_compressed': compress_body(row['body']),
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'edited_at': row['edited_at'],
+            'processing_status': row['processing_status'],
+            'processed_at': row['processed_at'],
+            'archived_at': now
+        } for row in rows])
+        ids = [row['id'] for row in rows]
+        # A note edited since it was read is no longer cold: it stays live and its stale copy is dropped
+        moved = db.session.execute(
+            notes_table.delete().where(notes_table.c.id.in_(ids), last_modified < cutoff)
+        ).rowcount
+        if moved < len(ids):
+            db.session.execute(archive_table.delete().where(
+                archive_table.c.id.in_(select(notes_table.c.id).where(notes_table.c.id.in_(ids)))
+            ))
+        db.session.commit()
+        archived += moved
+        last_id = ids[-1]
+    return archived
+
+
+# JSON for an archived note, in the same shape as a live one
+def archived_note_json(note):
+    return {
+        'id': note.id,
+        'body': decompress_body(note.body_compressed),
+        'created_at': note.created_at.isoformat()
+    }
+
+
+def _owned(statement, user_id, contact_id, ownership_cached=False):
+    if ownership_cached:
+        return statement
+    return statement.join(Contact, Contact.id == ArchivedNote.contact_id).where(
+        Contact.user_id == user_id,
+        Contact.deleted_at.is_(None)
+    )
+
+
+def find_archived_note(user_id, contact_id, note_id):
+    statement = _owned(select(ArchivedNote).where(ArchivedNote.id == note_id, ArchivedNote.contact_id == contact_id),
+                       user_id, contact_id, ownership.is_cached(user_id, contact_id))
+    return db.session.execute(statement).scalars().first()
+
+
+def archived_notes_for_contact(user_id, contact_id):
+    statement = _owned(select(ArchivedNote).where(ArchivedNote.contact_id == contact_id),
+                       user_id, contact_id, ownership.is_cached(user_id, contact_id))
+    return db.session.execute(statement.order_by(ArchivedNote.id)).scalars().all()
+
+
+# Archived notes among `note_ids`, for reads that must not miss any note (the sync feed)
+def load_archived_notes(note_ids):
+    if not note_ids:
+        return []
+    return ArchivedNote.query.filter(ArchivedNote.id.in_(note_ids)).order_by(ArchivedNote.id).all()
+
+
+def restore_note(archived):
+    """
+    Move an archived note back into the notes table before it is edited
+    or deleted. The caller commits.
+    """
+    note = Note(
+        id=archived.id,
+        contact_id=archived.contact_id,
+        body=decompress_body(archived.body_compressed),
+        created_at=archived.created_at,
+        updated_at=archived.updated_at,
+        edited_at=archived.edited_at,
+        processing_status=archived.processing_status,
+        processed_at=archived.processed_at
+    )
+    db.session.delete(archived)
+    db.session.add(note)
+    db.session.flush()
+    return note
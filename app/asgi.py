@@ -0,0 +1,412 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from functools import partial
+from urllib.parse import parse_qsl
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError, InvalidTokenError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import StaticPool
+
+from app import create_app, db, tracing, REDIS_URL
+from app.idempotency import (HEADER as IDEMPOTENCY_HEADER, REPLAYED_HEADER, MAX_KEY_LENGTH,
+                              request_fingerprint, storage_keys, encode_record, replay,
+                              should_store, in_progress_response)
+from app.admission import QUEUE_START_HEADER, READ_METHODS, Admission, queue_delay
+from app.batch import OPERATIONS, WITH_BODY
+from app.compression import compress_body
+from app.notes import wants_archived
+from app.tokens import FAMILY_CLAIM, family_key
+from app.models import configure_sqlite_engine
+from app.utils import apply_operation
+
+try:
+    from redis import asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # redis < 4.2 has no asyncio client
+    aioredis = None
+    RedisError = Exception
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+# How long to stop talking to Redis after a connection failure
+REDIS_RETRY_SECONDS = 5
+
+WINDOWS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+# Map a sync SQLAlchemy URL onto the matching asyncio driver
+def async_database_url(database_uri, root_path=None):
+    url = make_url(database_uri)
+    backend = url.drivername.split('+')[0]
+    url = url.set(drivername=ASYNC_DRIVERS.get(backend, url.drivername))
+    # Flask-SQLAlchemy resolves relative SQLite paths against the app root
+    if backend == 'sqlite' and url.database not in (None, '', ':memory:') and root_path:
+        url = url.set(database=os.path.join(root_path, url.database))
+    return url
+
+
+# Parse limits such as "100 per minute" or "200/minute" into (count, seconds)
+def parse_rate_limit(value):
+    match = re.match(r'\s*(\d+)\s*(?:per|/)\s*(\w+?)s?\s*$', value or '')
+    if not match or match.group(2) not in WINDOWS:
+        return None
+    return int(match.group(1)), WINDOWS[match.group(2)]
+
+
+class AsyncApp:
+    """
+    ASGI application serving the contact and note routes on an async engine.
+    The routes run the same operations as the Flask views (app.contacts,
+    app.notes), on an AsyncSession through run_sync, so database waits yield
+    the event loop instead of holding a worker thread. Authentication, rate
+    limiting and idempotency use the async Redis client. Any other route
+    (auth, docs, autosave, ...) falls through to the regular Flask app.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        config = flask_app.config
+
+        url = async_database_url(
+            config.get('ASYNC_DATABASE_URL') or config['SQLALCHEMY_DATABASE_URI'],
+            flask_app.root_path
+        )
+        options = {}
+        if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+            options['poolclass'] = StaticPool
+        self.engine = create_async_engine(url, **options)
+        # Foreign keys on, so deletes cascade as they do for the Flask app's engine
+        configure_sqlite_engine(self.engine.sync_engine)
+        if tracing.enabled():
+            tracing.instrument_sql(self.engine.sync_engine)
+
+        if config.get('EMBEDDED_MODE'):
+            from app.embedded import async_redis_client
+            self.redis = async_redis_client()
+        else:
+            redis_url = config.get('REDIS_URL', REDIS_URL)
+            self.redis = aioredis.from_url(redis_url) if aioredis else None
+        self._redis_down_until = 0
+        self.wsgi = WsgiToAsgi(flask_app)
+        # Routes falling through keep the Flask app's limiter, capped at WEB_THREADS.
+        # The async routes are bounded by the event loop instead, so theirs is not.
+        self.admission = Admission(config) if 'admission' in flask_app.extensions else None
+        self.rate_limit = parse_rate_limit(config.get('RATE_LIMIT'))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        route = self._match(scope)
+        # Autosave edits are buffered by the Flask route
+        if route is None or _wants_autosave(scope):
+            # Each request gets a thread of its own rather than asgiref's single shared one
+            async with ThreadSensitiveContext():
+                return await self.wsgi(scope, receive, send)
+        rule, params = route
+        endpoint = rule.endpoint
+
+        body = await _read_body(receive)
+        # Named like the Flask app's request spans
+        span, token = tracing.start_span(
+            f"{scope['method']} {rule.rule}", 'server',
+            tracing.parse_traceparent(_header(scope, tracing.TRACEPARENT_HEADER.encode())),
+            **{'http.method': scope['method'], 'http.route': rule.rule}
+        )
+        try:
+            status, payload, *extra = await self._admit_and_dispatch(scope, endpoint, params, body)
+        except BaseException as e:
+            tracing.end_span(span, token, e)
+            raise
+        headers = list(extra[0]) if extra else []
+        if span is not None:
+            span.set_attribute('http.status_code', status)
+            headers.append((tracing.TRACEPARENT_HEADER.encode(), span.traceparent.encode()))
+        tracing.end_span(span, token)
+        accept_encoding = None if scope['method'] == 'HEAD' else _header(scope, b'accept-encoding')
+        await _send_json(send, status, payload, headers, self.flask_app.config, accept_encoding)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.flask_app.config.get('EMBEDDED_MODE'):
+                    from app.embedded import start_beat
+                    start_beat(self.flask_app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                if self.redis is not None:
+                    await self.redis.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # The Flask rule a request maps to, with its view args, when it is one of
+    # the contact and note operations. Everything else, 404s and 405s included,
+    # is answered by the Flask app.
+    def _match(self, scope):
+        if scope['type'] != 'http':
+            return None
+        adapter = self.flask_app.url_map.bind('localhost')
+        try:
+            rule, params = adapter.match(scope['path'], scope['method'], return_rule=True)
+        except HTTPException:
+            return None
+        if rule.endpoint not in OPERATIONS:
+            return None
+        return rule, params
+
+    # Same load shedding as app.admission applies to the Flask routes, on the async routes' own limiter
+    async def _admit_and_dispatch(self, scope, endpoint, params, body):
+        admission = self.admission
+        if admission is None:
+            return await self._dispatch(scope, endpoint, params, body)
+        write = scope['method'] not in READ_METHODS
+        backlog_full = False
+        if write:
+            backlog_full = admission.cached_backlog_full()
+            if backlog_full is None:
+                # Reading the backlog is a Redis round trip; keep it off the event loop
+                backlog_full = await self._run_in_thread(admission.backlog_full)
+        shed = admission.check(write, backlog_full)
+        if shed:
+            error, retry_after = shed
+            return 503, {'error': error}, [(b'retry-after', str(retry_after).encode())]
+
+        started = time.monotonic() - queue_delay(_header(scope, QUEUE_START_HEADER.lower().encode()))
+        failed = True
+        try:
+            result = await self._dispatch(scope, endpoint, params, body)
+            failed = result[0] >= 500
+            return result
+        finally:
+            admission.limiter.release(time.monotonic() - started, failed)
+
+    async def _dispatch(self, scope, endpoint, params, body):
+        identity, error = await self._authenticate(scope)
+        if error:
+            return error
+        if await self._rate_limited(scope):
+            return 429, {'error': 'Rate limit exceeded'}
+
+        key = _header(scope, IDEMPOTENCY_HEADER.lower().encode()) if scope['method'] == 'POST' else None
+        if key and self._redis_available():
+            return await self._dispatch_idempotent(scope, endpoint, params, body, identity, key)
+        return await self._run(scope, endpoint, identity, params, body)
+
+    # Same contract as app.idempotency.idempotent: replay the stored response for a
+    # retried key, 409 while the first request is running, 422 if the body changed
+    async def _dispatch_idempotent(self, scope, endpoint, params, body, identity, key):
+        if len(key) > MAX_KEY_LENGTH:
+            return 400, {'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}
+        fingerprint = request_fingerprint(scope['method'], scope['path'], body)
+        record_key, lock_key = storage_keys(identity, key)
+        config = self.flask_app.config
+
+        stored = await self._redis_call('get', record_key)
+        if stored is not None:
+            status, payload = replay(stored, fingerprint)
+            if status == 422:
+                return status, payload
+            return status, payload, [(REPLAYED_HEADER.lower().encode(), b'true')]
+        locked = await self._redis_call('set', lock_key, fingerprint, nx=True,
+                                        ex=config['IDEMPOTENCY_LOCK_SECONDS'])
+        if not locked:
+            if not self._redis_available():
+                return await self._run(scope, endpoint, identity, params, body)
+            return 409, in_progress_response(), [(b'retry-after', b'1')]
+
+        try:
+            status, payload = await self._run(scope, endpoint, identity, params, body)
+            if should_store(status):
+                await self._redis_call('setex', record_key, config['IDEMPOTENCY_TTL'],
+                                       encode_record(fingerprint, status, payload))
+            return status, payload
+        finally:
+            await self._redis_call('delete', lock_key)
+
+    # Run the route's operation, as the Flask view would, then its deferred side
+    # effects (queueing, cache updates) in the thread pool
+    async def _run(self, scope, endpoint, identity, params, body):
+        params = dict(params)
+        if endpoint in WITH_BODY:
+            try:
+                params['data'] = json.loads(body) if body else None
+            except ValueError:
+                return 400, {'error': 'Invalid JSON body'}
+        if endpoint == 'notes.get_all_notes':
+            query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+            params['include_archived'] = wants_archived(query)
+
+        try:
+            async with AsyncSession(self.engine, expire_on_commit=False) as session:
+                payload, status, callbacks = await session.run_sync(
+                    tracing.propagate(self._apply), partial(OPERATIONS[endpoint], identity, **params)
+                )
+        except Exception as e:
+            logger.error(f"Unhandled exception: {str(e)}")
+            return 500, {'error': 'An unexpected error occurred', 'detail': None}
+        if callbacks:
+            await self._run_in_thread(_run_callbacks, callbacks)
+        return status, payload
+
+    # Runs in run_sync's greenlet: db.session is scoped per greenlet, so pointing this
+    # greenlet's scope at the AsyncSession's sync session lets the operation use it
+    def _apply(self, session, operation):
+        with self.flask_app.app_context():
+            db.session.registry.set(session)
+            return apply_operation(operation)
+
+    # Run blocking code that reads the Flask config on an executor thread
+    def _in_app_context(self, func, *args):
+        with self.flask_app.app_context():
+            return func(*args)
+
+    # Run blocking work in the thread pool, taking the current trace span along
+    async def _run_in_thread(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, tracing.propagate(self._in_app_context), func, *args
+        )
+
+    # Decode the bearer token with the same settings as flask-jwt-extended
+    async def _authenticate(self, scope):
+        header = _header(scope, b'authorization')
+        if not header:
+            return None, (401, {'msg': 'Missing Authorization Header'})
+        parts = header.split()
+        if len(parts) != 2 or parts[0] != 'Bearer':
+            return None, (422, {'msg': "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"})
+
+        try:
+            with self.flask_app.app_context():
+                decoded = decode_token(parts[1])
+        except ExpiredSignatureError:
+            return None, (401, {'msg': 'Token has expired'})
+        except InvalidTokenError as e:
+            return None, (422, {'msg': str(e)})
+        if decoded.get('type') != 'access':
+            return None, (422, {'msg': 'Only non-refresh tokens are allowed'})
+
+        # Tokens revoked through /auth/logout are stored by jti; a revoked refresh
+        # family takes its access tokens with it
+        if await self._redis_call('exists', decoded['jti']):
+            return None, (401, {'msg': 'Token has been revoked'})
+        family = decoded.get(FAMILY_CLAIM)
+        if family and await self._redis_call('exists', family_key(family)) == 0:
+            return None, (401, {'msg': 'Token has been revoked'})
+        return decoded[self.flask_app.config.get('JWT_IDENTITY_CLAIM', 'sub')], None
+
+    # Fixed-window limit per client address, shared across processes through Redis
+    async def _rate_limited(self, scope):
+        if not self.rate_limit:
+            return False
+        limit, seconds = self.rate_limit
+        client = (scope.get('client') or ('unknown',))[0]
+        key = f'async-ratelimit:{client}:{int(time.time() // seconds)}'
+        # One MULTI, so a counter can never be left without its expiry
+        replies = await self._redis_pipeline(('incr', key), ('expire', key, seconds))
+        count = replies[0] if replies else None
+        return bool(count) and count > limit
+
+    def _redis_available(self):
+        return self.redis is not None and time.monotonic() >= self._redis_down_until
+
+    # Run a Redis command, skipping Redis for a while after a connection failure
+    async def _redis_call(self, command, *args, **kwargs):
+        if not self._redis_available():
+            return None
+        try:
+            with tracing.trace(f'redis {command}', 'client', **{'db.system': 'redis'}):
+                return await getattr(self.redis, command)(*args, **kwargs)
+        except (RedisError, OSError) as e:
+            logger.warning(f"Redis unavailable, skipping {command}: {str(e)}")
+            self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            return None
+
+    # Run commands in a MULTI/EXEC transaction, with the same failure handling as _redis_call
+    async def _redis_pipeline(self, *commands):
+        if not self._redis_available():
+            return None
+        try:
+            with tracing.trace('redis pipeline', 'client', **{'db.system': 'redis'}):
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    for command, *args in commands:
+                        getattr(pipe, command)(*args)
+                    return await pipe.execute()
+        except (RedisError, OSError) as e:
+            logger.warning(f"Redis unavailable, skipping pipeline: {str(e)}")
+            self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            return None
+
+
+# Deferred side effects of an operation; one failing does not stop the others
+def _run_callbacks(callbacks):
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"After-commit callback failed: {str(e)}")
+
+
+def _wants_autosave(scope):
+    query = scope.get('query_string', b'').decode('latin-1')
+    return scope['method'] == 'PUT' and any(
+        part.lower() == 'autosave=true' for part in query.split('&')
+    )
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key.lower() == name:
+            return value.decode('latin1')
+    return None
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+# Compressed like app.compression does for the Flask routes when `config` is given
+async def _send_json(send, status, payload, headers=(), config=None, accept_encoding=None):
+    body = json.dumps(payload).encode()
+    headers = list(headers)
+    if config is not None and config['COMPRESSION_ENABLED']:
+        headers.append((b'vary', b'Accept-Encoding'))
+        body, encoding = compress_body(config, body, accept_encoding)
+        if encoding:
+            headers.append((b'content-encoding', encoding.encode()))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+# ASGI application factory: uvicorn asgi:application
+def create_asgi_app(config_class=None):
+    return AsyncApp(create_app(config_class))
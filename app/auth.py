@@ -1,10 +1,8 @@
 from flask import Blueprint, request, jsonify, make_response, current_app
 from werkzeug.security import check_password_hash
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.models import User, db
-from argon2 import PasswordHasher
-from datetime import timedelta
-import redis
+from app import tracing
 import os
 import logging
 
@@ -12,8 +10,15 @@ logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
-# Initialize PasswordHasher
-ph = PasswordHasher()
+# PasswordHasher is created on first use; argon2 is only needed by register and login
+ph = None
+
+def get_password_hasher():
+    global ph
+    if ph is None:
+        from argon2 import PasswordHasher
+        ph = PasswordHasher()
+    return ph
 
 # Redis client will be initialized during request
 redis_client = None
@@ -22,12 +27,19 @@ redis_client = None
 def get_redis_client():
     global redis_client
     if redis_client is None:
-        try:
-            redis_url = current_app.config.get('REDIS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
-            redis_client = redis.from_url(redis_url)
-        except redis.exceptions.ConnectionError:
-            logger.warning("Redis connection failed - token blacklisting won't work")
-            redis_client = None
+        if current_app.config.get('EMBEDDED_MODE'):
+            from app.embedded import redis_client as embedded_redis_client
+            redis_client = embedded_redis_client()
+        else:
+            import redis
+            try:
+                redis_url = current_app.config.get('REDIS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+                redis_client = redis.from_url(redis_url)
+            except redis.exceptions.ConnectionError:
+                logger.warning("Redis connection failed - token blacklisting won't work")
+                redis_client = None
+        if redis_client is not None and tracing.enabled():
+            tracing.instrument_redis(redis_client)
     return redis_client
 
 # Add security headers to all auth blueprint responses
@@ -52,7 +64,7 @@ def register():
     if User.query.filter_by(username=data['username']).first():
         return jsonify({'error': 'Username already exists'}), 409
     
-    user = User(username=data['username'], password_hash=ph.hash(data['password']))
+    user = User(username=data['username'], password_hash=get_password_hasher().hash(data['password']))
     db.session.add(user)
     db.session.commit()
     
@@ -64,37 +76,61 @@ def register():
     response.status_code = 201  # Force the status code
     return response
 
-# Authenticate user and return JWT access token
+# Authenticate user and return a JWT access token and refresh token
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
-    user = User.query.filter_by(username=data.get('username')).first()
+    user = User.query.filter_by(username=data.get('username'), deleted_at=None).first()
     
     try:
-        if not user or not ph.verify(user.password_hash, data.get('password', '')):
+        if not user or not get_password_hasher().verify(user.password_hash, data.get('password', '')):
             return jsonify({'error': 'Invalid credentials'}), 401
     except Exception:
         return jsonify({'error': 'Invalid credentials'}), 401
     
-    access_token = create_access_token(identity=str(user.id))
-    return jsonify(access_token=access_token), 200
+    from app.tokens import issue_tokens
+    return jsonify(issue_tokens(user.id)), 200
 
-# Generate new access token using refresh token
+# Exchange a refresh token for new access and refresh tokens without checking the password again
 @auth_bp.route('/refresh', methods=['POST'])
 @jwt_required(refresh=True)
 def refresh():
-    identity = get_jwt_identity()
-    access_token = create_access_token(identity=identity)
-    return jsonify(access_token=access_token), 200
+    from app.tokens import ROTATED, STALE, rotate
+    user = User.query.filter_by(id=get_jwt_identity(), deleted_at=None).first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 401
+    try:
+        outcome, tokens = rotate(user.id, get_jwt())
+    except Exception as e:
+        logger.warning(f"Refresh token store unavailable: {str(e)}")
+        return jsonify({'error': 'Token refresh is temporarily unavailable; log in again'}), 503
+    if outcome == ROTATED:
+        return jsonify(tokens), 200
+    if outcome == STALE:
+        return jsonify({'error': 'Refresh token was already used'}), 401
+    return jsonify({'error': 'Refresh token has been revoked'}), 401
 
-#Invalidate current token by adding to blacklist in Redis
+#Invalidate current token and its refresh token family by adding them to the blocklist in Redis
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    jti = get_jwt()['jti']
-    redis = get_redis_client()
-    # Only blacklist if Redis is available
-    if redis:
-        # Store the JTI in Redis with an expiry matching token lifetime
-        redis.setex(jti, timedelta(hours=1), 'revoked')
-    return jsonify(message="Successfully logged out"), 200
\ No newline at end of file
+    from app.tokens import revoke
+    revoke(get_jwt())
+    return jsonify(message="Successfully logged out"), 200
+
+# Delete the authenticated user's account with all contacts and notes
+@auth_bp.route('/account', methods=['DELETE'])
+@jwt_required()
+def delete_account():
+    from app.purge import delete_user
+    user = User.query.filter_by(id=get_jwt_identity(), deleted_at=None).first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    # Revoke the token used for the request, as logout does
+    from app.tokens import revoke
+    revoke(get_jwt())
+
+    if delete_user(user):
+        return jsonify(message="Account deletion scheduled"), 202
+    return jsonify(message="Account deleted successfully"), 200
@@ -0,0 +1,211 @@
+import json
+import logging
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, or_, select
+
+from app.auth import get_redis_client
+from app.models import ArchivedNote, Contact, Note, db
+
+logger = logging.getLogger(__name__)
+
+# Contacts with buffered edits waiting for a flush
+DIRTY_KEY = 'autosave:dirty'
+
+notes_table = Note.__table__
+
+
+# Per-contact Redis hash of note id -> latest buffered edit
+def buffer_key(contact_id):
+    return f'autosave:{contact_id}'
+
+
+def _enabled():
+    return current_app.config['AUTOSAVE_ENABLED']
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def buffer_note_update(contact_id, note_id, created_at, body):
+    """
+    Store an edit of a note in its contact's Redis buffer instead of the
+    database. The edit is acknowledged once Redis has it and reaches the
+    notes table on the next flush. Returns the buffered entry, or None when
+    Redis is unavailable so the caller writes the note directly.
+    """
+    redis = get_redis_client()
+    if not redis:
+        return None
+    entry = {'id': note_id, 'body': body, 'created_at': created_at,
+             'updated_at': datetime.utcnow().isoformat()}
+    try:
+        # One MULTI, so a flush that sees the edit also sees the contact marked dirty
+        with redis.pipeline() as pipe:
+            pipe.hset(buffer_key(contact_id), note_id, json.dumps(entry))
+            pipe.sadd(DIRTY_KEY, contact_id)
+            pipe.execute()
+    except Exception as e:
+        logger.warning(f"Autosave buffer unavailable, writing note {note_id} directly: {str(e)}")
+        return None
+    return entry
+
+
+# Latest buffered edit of a note, or None when it has none waiting
+def buffered_note(contact_id, note_id):
+    if not _enabled():
+        return None
+    redis = get_redis_client()
+    if not redis:
+        return None
+    try:
+        raw = redis.hget(buffer_key(contact_id), note_id)
+    except Exception as e:
+        logger.warning(f"Autosave buffer unavailable, reading note {note_id} from the database: {str(e)}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+def buffered_notes(contact_id):
+    if not _enabled():
+        return {}
+    redis = get_redis_client()
+    if not redis:
+        return {}
+    try:
+        raw = redis.hgetall(buffer_key(contact_id))
+    except Exception as e:
+        logger.warning(f"Autosave buffer unavailable, reading notes of {contact_id} from the database: {str(e)}")
+        return {}
+    return {int(_decode(note_id)): json.loads(value) for note_id, value in raw.items()}
+
+
+# Drop a buffered edit once a direct write or delete has replaced it
+def discard(contact_id, note_id):
+    if not _enabled():
+        return
+    redis = get_redis_client()
+    if not redis:
+        return
+    try:
+        redis.hdel(buffer_key(contact_id), note_id)
+    except Exception as e:
+        logger.warning(f"Could not discard buffered edit of note {note_id}: {str(e)}")
+
+
+def flush_contact(contact_id):
+    """
+    Write a contact's buffered edits to the notes table in one transaction,
+    then drop from the buffer the edits whose UPDATE reached their row. An
+    edit that arrives meanwhile replaces its entry, stays buffered and goes
+    with the next flush; the database is written once either way. Rows whose
+    body was written more recently by a direct edit keep that edit. Returns
+    the number of edits flushed.
+    """
+    redis = get_redis_client()
+    if not redis:
+        return 0
+    entries = redis.hgetall(buffer_key(contact_id))
+    written, gone = set(), set()
+    if entries:
+        written, gone = _write_entries(contact_id, [json.loads(value) for value in entries.values()])
+    _remove_flushed(redis, contact_id, {
+        field: value for field, value in entries.items() if int(_decode(field)) in written | gone
+    })
+    return len(written)
+
+
+# Delete the flushed entries whose value has not changed since they were read.
+# Only Redis is retried on a conflict; anything left over is flushed next time.
+def _remove_flushed(redis, contact_id, flushed, attempts=5):
+    from redis.exceptions import WatchError
+    key = buffer_key(contact_id)
+    for _ in range(attempts):
+        with redis.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.hgetall(key)
+                done = [note_id for note_id, value in flushed.items() if current.get(note_id) == value]
+                pipe.multi()
+                if done:
+                    pipe.hdel(key, *done)
+                if len(done) == len(current):
+                    pipe.srem(DIRTY_KEY, contact_id)
+                pipe.execute()
+                return
+            except WatchError:
+                continue
+    logger.warning(f"Buffer of contact {contact_id} kept changing; flushed edits are dropped on the next flush")
+
+
+# Write buffered edits and return (ids of notes whose row was updated, ids of
+# notes that no longer exist). Anything else stays buffered.
+def _write_entries(contact_id, entries):
+    from app.archive import restore_note
+    from app.sync import record_note_updates
+
+    ids = {entry['id'] for entry in entries}
+    user_id = db.session.execute(
+        select(Contact.user_id).where(Contact.id == contact_id, Contact.deleted_at.is_(None))
+    ).scalar()
+    if user_id is None:
+        # The contact is gone or being purged; its edits go with it
+        db.session.rollback()
+        return set(), ids
+
+    live = set(db.session.execute(
+        select(Note.id).where(Note.id.in_(ids), Note.contact_id == contact_id)
+    ).scalars())
+    # A note archived while its edit waited is moved back so the edit lands
+    for archived in ArchivedNote.query.filter(ArchivedNote.id.in_(ids - live),
+                                              ArchivedNote.contact_id == contact_id):
+        live.add(restore_note(archived).id)
+    if not live:
+        db.session.rollback()
+        return set(), ids
+
+    # One statement per edit, so each one knows whether it reached its row. An
+    # edit older than the note's last direct edit matches the row but keeps its body.
+    written = set()
+    for entry in entries:
+        if entry['id'] not in live:
+            continue
+        edited_at = datetime.fromisoformat(entry['updated_at'])
+        newer = or_(notes_table.c.edited_at.is_(None), notes_table.c.edited_at < edited_at)
+        result = db.session.execute(
+            notes_table.update().where(
+                notes_table.c.id == entry['id'],
+                notes_table.c.contact_id == contact_id
+            ).values(
+                body=case((newer, entry['body']), else_=notes_table.c.body),
+                edited_at=case((newer, edited_at), else_=notes_table.c.edited_at),
+                updated_at=case((newer, edited_at), else_=notes_table.c.updated_at)
+            )
+        )
+        if result.rowcount:
+            written.add(entry['id'])
+    if written:
+        record_note_updates(db.session.connection(), user_id, contact_id, sorted(written))
+    db.session.commit()
+    return written, ids - live
+
+
+def flush_all():
+    """
+    Flush every contact with buffered edits. A contact that fails keeps its
+    buffer for the next run. Returns the number of edits flushed.
+    """
+    redis = get_redis_client()
+    if not redis:
+        return 0
+    flushed = 0
+    for contact_id in redis.smembers(DIRTY_KEY):
+        contact_id = int(_decode(contact_id))
+        try:
+            flushed += flush_contact(contact_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to flush buffered edits of contact {contact_id}: {str(e)}")
+    return flushed
@@ -0,0 +1,161 @@
+import re
+from contextlib import contextmanager
+
+from flask import Blueprint, request, jsonify, current_app, g
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+from app import contacts, notes
+from app.models import db
+from app.utils import rate_limit
+from app.idempotency import idempotent
+from app.scheduling import BULK
+
+batch_bp = Blueprint('batch', __name__, url_prefix='/batch')
+
+# The operation behind each contact and note route, called as
+# operation(user_id, **view_args), plus data=body for the ones that take a body.
+# /batch and the async app (app.asgi) both run the routes through these.
+OPERATIONS = {
+    'contacts.create_contact': contacts.add_contact,
+    'contacts.get_all_contacts': contacts.list_contacts,
+    'contacts.get_single_contact': contacts.read_contact,
+    'contacts.update_contact': contacts.edit_contact,
+    'contacts.delete_contact': contacts.remove_contact,
+    'notes.create_note': notes.add_note,
+    'notes.get_all_notes': notes.list_notes,
+    'notes.get_single_note': notes.read_note,
+    'notes.update_note': notes.edit_note,
+    'notes.delete_note': notes.remove_note,
+}
+WITH_BODY = ('contacts.create_contact', 'contacts.update_contact', 'notes.create_note', 'notes.update_note')
+
+# "$c1.id" refers to field `id` of the response of the operation with ref "c1"
+REFERENCE = re.compile(r'\$(\w+)\.(\w+)')
+
+
+class UnresolvedReference(Exception):
+    pass
+
+
+# Substitute references to earlier results in a path or JSON body
+def resolve_references(value, results):
+    if isinstance(value, dict):
+        return {key: resolve_references(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    def lookup(match):
+        ref, field = match.groups()
+        if ref not in results or not isinstance(results[ref], dict) or field not in results[ref]:
+            raise UnresolvedReference(f'Unknown reference ${ref}.{field}')
+        return results[ref][field]
+
+    whole = REFERENCE.fullmatch(value)
+    if whole:
+        # A bare reference keeps the original type (e.g. an integer id)
+        return lookup(whole)
+    return REFERENCE.sub(lambda match: str(lookup(match)), value)
+
+
+# Collect the operations' after-commit side effects for the batch's single commit.
+# Notes created by a batch are processed in the bulk lane.
+@contextmanager
+def single_transaction():
+    g.after_commit_callbacks = []
+    g.processing_lane = BULK
+    try:
+        yield g.after_commit_callbacks
+    finally:
+        g.pop('after_commit_callbacks', None)
+        g.pop('processing_lane', None)
+
+
+def run_operation(adapter, user_id, operation, results, callbacks):
+    if not isinstance(operation, dict) or not isinstance(operation.get('path'), str):
+        return 400, {'error': 'Each operation needs a path'}
+    method = str(operation.get('method', 'GET')).upper()
+    try:
+        path = resolve_references(operation['path'], results)
+        body = resolve_references(operation.get('body'), results)
+    except UnresolvedReference as e:
+        return 400, {'error': str(e)}
+
+    try:
+        endpoint, args = adapter.match(path, method)
+    except NotFound:
+        return 404, {'error': 'No route for path'}
+    except MethodNotAllowed:
+        return 405, {'error': 'Method not allowed'}
+    if endpoint not in OPERATIONS:
+        return 400, {'error': 'Only contact and note routes can be batched'}
+    if endpoint in WITH_BODY:
+        args['data'] = body
+
+    # Each operation runs in a savepoint, so a failed one is undone on its own.
+    # The batch request is already authenticated and rate limited.
+    session = db.session()
+    savepoint = session.begin_nested()
+    pending = len(callbacks)
+    try:
+        result, status = OPERATIONS[endpoint](user_id, **args)
+    except Exception as e:
+        current_app.logger.error(f"Batch operation failed: {str(e)}")
+        result, status = {'error': 'Internal server error'}, 500
+
+    if status >= 400:
+        if savepoint.is_active:
+            savepoint.rollback()
+        # Side effects of the undone operation must not run
+        del callbacks[pending:]
+    else:
+        savepoint.commit()
+    return status, result
+
+
+# Execute an ordered list of contact/note operations in one round trip and one transaction
+@batch_bp.route('', methods=['POST'])
+@jwt_required()
+@rate_limit
+@idempotent
+def run_batch():
+    data = request.get_json()
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    max_operations = current_app.config['BATCH_MAX_OPERATIONS']
+    if len(operations) > max_operations:
+        return jsonify({'error': f'At most {max_operations} operations per batch'}), 400
+    atomic = bool(data.get('atomic', False))
+
+    adapter = current_app.url_map.bind('localhost')
+    user_id = get_jwt_identity()
+    session = db.session()
+    results = {}
+    responses = []
+    failed = None
+    with single_transaction() as callbacks:
+        for index, operation in enumerate(operations):
+            status, body = run_operation(adapter, user_id, operation, results, callbacks)
+            ref = operation.get('ref') if isinstance(operation, dict) else None
+            responses.append({'ref': ref, 'status': status, 'body': body})
+            if status < 400 and ref:
+                results[ref] = body
+            if status >= 400 and atomic:
+                failed = index
+                break
+        callbacks = list(callbacks)
+
+    if failed is not None:
+        session.rollback()
+        return jsonify({'committed': False, 'failed_index': failed, 'results': responses}), 400
+
+    session.commit()
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            current_app.logger.error(f"Batch after-commit callback failed: {str(e)}")
+    return jsonify({'committed': True, 'results': responses}), 200
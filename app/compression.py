@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import json
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'text/html', 'text/plain', 'text/css')
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def choose_encoding(accept_encoding, available=None):
+    """
+    Pick the response encoding from an Accept-Encoding header: the available
+    coding with the highest q-value, preferring brotli on ties.
+    Returns None for identity.
+    """
+    available = available or available_encodings()
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    best, best_q = None, 0.0
+    for coding in available:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    # mtime=0 keeps the output (and any ETag derived from it) stable
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+# Incremental compressor for streamed bodies; each chunk is flushed so clients get it right away
+def _streaming_compressor(encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return (compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            lambda: compressor.flush(zlib.Z_FINISH))
+
+
+def compress_stream(chunks, encoding, level):
+    process, flush, finish = _streaming_compressor(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def _level(config, encoding):
+    return config['COMPRESSION_BROTLI_QUALITY'] if encoding == 'br' else config['COMPRESSION_GZIP_LEVEL']
+
+
+# Same negotiation for bodies built outside a Flask request (the async routes in app.asgi)
+def compress_body(config, data, accept_encoding):
+    """Returns the body to send and its Content-Encoding, None when it is sent as is."""
+    if not config['COMPRESSION_ENABLED'] or len(data) < config['COMPRESSION_MIN_SIZE']:
+        return data, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return data, None
+    return compress(data, encoding, _level(config, encoding)), encoding
+
+
+def compress_response(response):
+    """
+    Compress JSON and text responses for clients that accept gzip or brotli.
+    Bodies under COMPRESSION_MIN_SIZE are sent as is; streamed bodies are
+    compressed chunk by chunk, except Server-Sent Events.
+    """
+    config = current_app.config
+    if not config['COMPRESSION_ENABLED'] or response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers or request.method == 'HEAD'
+            or response.direct_passthrough):
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+
+    level = _level(config, encoding)
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESSION_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    # Each encoding is a different representation, so a strong ETag must differ too
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+class StaticDocument:
+    """
+    A JSON document serialized once and kept in memory in every encoding,
+    with an ETag so clients can revalidate with If-None-Match.
+    """
+
+    def __init__(self, path, gzip_level=9, brotli_quality=11):
+        with open(path) as f:
+            self.body = json.dumps(json.load(f), separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.encoded = {'gzip': compress(self.body, 'gzip', gzip_level)}
+        if brotli:
+            self.encoded['br'] = compress(self.body, 'br', brotli_quality)
+
+    def response(self):
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'),
+                                   tuple(coding for coding in available_encodings() if coding in self.encoded))
+        etag = f'{self.etag}-{encoding}' if encoding else self.etag
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304, mimetype='application/json')
+        else:
+            response = current_app.response_class(self.encoded[encoding] if encoding else self.body,
+                                                  mimetype='application/json')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        # Cached by clients, but revalidated so a redeploy is picked up
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -6,10 +6,115 @@ class BaseConfig:
     TESTING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'gabkbdbbajbkjb')
-    JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 3600))
+    # Access tokens are short-lived and renewed through /auth/refresh, which skips the password hash
+    JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 900))
+    JWT_REFRESH_TOKEN_EXPIRES = int(os.getenv('JWT_REFRESH_TOKEN_EXPIRES', 30 * 86400))
+    # Seconds a just-replaced refresh token is refused without revoking its family
+    REFRESH_TOKEN_REUSE_GRACE = int(os.getenv('REFRESH_TOKEN_REUSE_GRACE', 10))
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
     RATE_LIMIT = os.getenv('RATE_LIMIT', '100 per minute')
+    SWAGGER_ENABLED = os.getenv('SWAGGER_ENABLED', 'true').lower() == 'true'
+    STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 1500))
+    SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 500))
+    SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+    BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 100))
+    # Deletes touching more notes than this run as a chunked background purge
+    PURGE_THRESHOLD = int(os.getenv('PURGE_THRESHOLD', 1000))
+    PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 1000))
+    # Stored responses for Idempotency-Key retries, and how long an in-flight key stays locked
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 30))
+    # Notes not modified for this many days move to the compressed notes_archive table
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 180))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+    # Single-process deployment without Redis or a Celery broker (see app/embedded.py)
+    EMBEDDED_MODE = os.getenv('EMBEDDED_MODE', 'false').lower() == 'true'
+    EMBEDDED_TASK_WORKERS = int(os.getenv('EMBEDDED_TASK_WORKERS', 4))
+    # The in-process store only drops an expired key when it is read again; sweep the rest this often
+    EMBEDDED_SWEEP_INTERVAL = float(os.getenv('EMBEDDED_SWEEP_INTERVAL', 60))
+    # PUT ?autosave=true edits wait in Redis and reach the database every AUTOSAVE_FLUSH_INTERVAL seconds.
+    # Off by default in embedded mode, where the buffer would die with the process.
+    AUTOSAVE_ENABLED = os.getenv('AUTOSAVE_ENABLED', 'false' if EMBEDDED_MODE else 'true').lower() == 'true'
+    AUTOSAVE_FLUSH_INTERVAL = float(os.getenv('AUTOSAVE_FLUSH_INTERVAL', 30))
+    # Longest date range GET /stats answers in one request
+    STATS_MAX_DAYS = int(os.getenv('STATS_MAX_DAYS', 366))
+    # Note routes cache which contacts a user owns, in process and optionally in Redis
+    OWNERSHIP_CACHE_SIZE = int(os.getenv('OWNERSHIP_CACHE_SIZE', 10000))
+    OWNERSHIP_CACHE_TTL = int(os.getenv('OWNERSHIP_CACHE_TTL', 60))
+    OWNERSHIP_CACHE_REDIS = os.getenv('OWNERSHIP_CACHE_REDIS', 'true').lower() == 'true'
+    # Response compression negotiated from Accept-Encoding; smaller bodies are sent as is
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+    # Load shedding (see app/admission.py): the per-process limit on requests in flight shrinks
+    # while requests take longer than ADMISSION_LATENCY_TARGET_MS and grows back while they are
+    # fast. Writes get ADMISSION_WRITE_SHARE of it, so reads are still served under overload.
+    # The WSGI app caps the limits at WEB_THREADS; latency counts from X-Request-Start.
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_INITIAL_LIMIT = int(os.getenv('ADMISSION_INITIAL_LIMIT', 20))
+    ADMISSION_MIN_LIMIT = int(os.getenv('ADMISSION_MIN_LIMIT', 1))
+    ADMISSION_MAX_LIMIT = int(os.getenv('ADMISSION_MAX_LIMIT', 200))
+    ADMISSION_LATENCY_TARGET_MS = float(os.getenv('ADMISSION_LATENCY_TARGET_MS', 1000))
+    ADMISSION_WRITE_SHARE = float(os.getenv('ADMISSION_WRITE_SHARE', 0.75))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 1))
+    # Contact and note writes are refused while more notes than this wait for processing
+    ADMISSION_MAX_BACKLOG = int(os.getenv('ADMISSION_MAX_BACKLOG', 10000))
+    ADMISSION_BACKLOG_CHECK_INTERVAL = float(os.getenv('ADMISSION_BACKLOG_CHECK_INTERVAL', 1))
+    ADMISSION_BACKLOG_RETRY_AFTER = int(os.getenv('ADMISSION_BACKLOG_RETRY_AFTER', 30))
+    # Distributed tracing (see app/tracing.py): share of new traces recorded, spans kept per
+    # trace, and where they go: 'file' (JSON lines in TRACING_FILE), 'log' or a class path
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'false').lower() == 'true'
+    TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', 0.1))
+    TRACING_MAX_SPANS = int(os.getenv('TRACING_MAX_SPANS', 1000))
+    TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'file')
+    TRACING_FILE = os.getenv('TRACING_FILE', 'traces.jsonl')
+    SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+    # Fair note processing: tasks outstanding per lane, notes a tenant is served per
+    # round, and how many waiting interactive notes move a tenant to the bulk lane
+    SCHEDULER_INTERACTIVE_IN_FLIGHT = int(os.getenv('SCHEDULER_INTERACTIVE_IN_FLIGHT', 16))
+    SCHEDULER_BULK_IN_FLIGHT = int(os.getenv('SCHEDULER_BULK_IN_FLIGHT', 8))
+    SCHEDULER_QUANTUM = int(os.getenv('SCHEDULER_QUANTUM', 4))
+    SCHEDULER_INTERACTIVE_BURST = int(os.getenv('SCHEDULER_INTERACTIVE_BURST', 20))
+    SCHEDULER_IN_FLIGHT_TIMEOUT = int(os.getenv('SCHEDULER_IN_FLIGHT_TIMEOUT', 900))
+    # Workers take one task at a time and ack after running it, so a crash redelivers
+    CELERY_TASK_ACKS_LATE = os.getenv('CELERY_TASK_ACKS_LATE', 'true').lower() == 'true'
+    CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv('CELERY_WORKER_PREFETCH_MULTIPLIER', 1))
+    CELERY_VISIBILITY_TIMEOUT = int(os.getenv('CELERY_VISIBILITY_TIMEOUT', 3600))
+    # Production server (gunicorn.conf.py); WEB_WORKERS=0 sizes the pool from the CPU count
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:8000')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', os.getenv('WEB_CONCURRENCY', 0)))
+    WEB_MAX_WORKERS = int(os.getenv('WEB_MAX_WORKERS', 12))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+    # Each open /events stream holds one worker thread; past SSE_MAX_STREAMS per
+    # process new streams get 503, so the other threads stay free for requests
+    SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', max(WEB_THREADS // 2, 1)))
+    SSE_RETRY_AFTER = int(os.getenv('SSE_RETRY_AFTER', 30))
+    WEB_PRELOAD = os.getenv('WEB_PRELOAD', 'true').lower() == 'true'
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 30))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+    WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', 10000))
+    # Periodic jobs run by `celery -A celery_worker.celery beat`
+    CELERY_BEAT_SCHEDULE = {
+        'compact-sync-tombstones': {
+            'task': 'app.tasks.compact_sync_changes',
+            'schedule': 3600.0,
+        },
+        'dispatch-note-queues': {
+            'task': 'app.tasks.dispatch_note_queues',
+            'schedule': 5.0,
+        },
+        'archive-old-notes': {
+            'task': 'app.tasks.archive_old_notes',
+            'schedule': 86400.0,
+        },
+    }
+    if AUTOSAVE_ENABLED:
+        CELERY_BEAT_SCHEDULE['flush-autosaves'] = {
+            'task': 'app.tasks.flush_autosaves',
+            'schedule': AUTOSAVE_FLUSH_INTERVAL,
+        }
     
 
 class DevelopmentConfig(BaseConfig):
@@ -1,103 +1,111 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select
 from app.models import Contact, db
-from app.utils import rate_limit
+from app.purge import delete_contact as purge_or_delete_contact
+from app.utils import commit_operation, rate_limit
+from app.idempotency import idempotent
 
 contacts_bp = Blueprint('contacts', __name__, url_prefix='/contacts')
 
-# Create a new contact for the authenticated user
-@contacts_bp.route('', methods=['POST'])
-@jwt_required()
-@rate_limit
-def create_contact():
-    current_user_id = get_jwt_identity()
-    data = request.get_json()
+# A contact as the API returns it
+def contact_json(contact):
+    return {
+        'id': contact.id,
+        'name': contact.name,
+        'email': contact.email
+    }
+
+# Statements behind the contact operations
+def active_contacts_query(user_id):
+    return select(Contact).where(Contact.user_id == user_id, Contact.deleted_at.is_(None))
+
+def owned_contact_query(user_id, contact_id):
+    return active_contacts_query(user_id).where(Contact.id == contact_id)
+
+def _owned_contact(user_id, contact_id):
+    return db.session.execute(owned_contact_query(user_id, contact_id)).scalars().first()
+
+# Contact operations take the caller's identity and return (body, status). They
+# flush but leave committing to the caller: a view commits each one, /batch runs
+# many in one transaction.
 
+def add_contact(user_id, data):
     if not data or not data.get('name'):
-        return jsonify({'error': 'Name is required'}), 400
+        return {'error': 'Name is required'}, 400
 
     new_contact = Contact(
-        user_id=current_user_id,
+        user_id=user_id,
         name=data['name'],
         email=data.get('email')
     )
-    
     db.session.add(new_contact)
-    db.session.commit()
-    
-    return jsonify({
-        'id': new_contact.id,
-        'name': new_contact.name,
-        'email': new_contact.email
-    }), 201
+    db.session.flush()
+    return contact_json(new_contact), 201
+
+def list_contacts(user_id):
+    contacts = db.session.execute(active_contacts_query(user_id)).scalars().all()
+    return [contact_json(contact) for contact in contacts], 200
+
+def read_contact(user_id, contact_id):
+    contact = _owned_contact(user_id, contact_id)
+    if not contact:
+        return {'error': 'Contact not found'}, 404
+    return contact_json(contact), 200
+
+def edit_contact(user_id, contact_id, data):
+    contact = _owned_contact(user_id, contact_id)
+    if not contact:
+        return {'error': 'Contact not found'}, 404
+
+    data = data or {}
+    if 'name' in data:
+        contact.name = data['name']
+    if 'email' in data:
+        contact.email = data['email']
+    db.session.flush()
+    return contact_json(contact), 200
+
+def remove_contact(user_id, contact_id):
+    contact = _owned_contact(user_id, contact_id)
+    if not contact:
+        return {'error': 'Contact not found'}, 404
+    if purge_or_delete_contact(contact):
+        return {'message': 'Contact deletion scheduled'}, 202
+    return {'message': 'Contact deleted successfully'}, 200
+
+# Create a new contact for the authenticated user
+@contacts_bp.route('', methods=['POST'])
+@jwt_required()
+@rate_limit
+@idempotent
+def create_contact():
+    return commit_operation(add_contact, get_jwt_identity(), request.get_json())
 
 # Retrieve all contacts for the authenticated user
 @contacts_bp.route('', methods=['GET'])
 @jwt_required()
 @rate_limit
 def get_all_contacts():
-    current_user_id = get_jwt_identity()
-    contacts = Contact.query.filter_by(user_id=current_user_id).all()
-    
-    return jsonify([{
-        'id': contact.id,
-        'name': contact.name,
-        'email': contact.email
-    } for contact in contacts]), 200
+    return commit_operation(list_contacts, get_jwt_identity())
 
 # Retrieve a specific contact by ID for the authenticated user
 @contacts_bp.route('/<int:contact_id>', methods=['GET'])
 @jwt_required()
 @rate_limit
 def get_single_contact(contact_id):
-    current_user_id = get_jwt_identity()
-    contact = Contact.query.filter_by(id=contact_id, user_id=current_user_id).first()
-    
-    if not contact:
-        return jsonify({'error': 'Contact not found'}), 404
-    
-    return jsonify({
-        'id': contact.id,
-        'name': contact.name,
-        'email': contact.email
-    }), 200
+    return commit_operation(read_contact, get_jwt_identity(), contact_id)
+
 # Update an existing contact's information
 @contacts_bp.route('/<int:contact_id>', methods=['PUT'])
 @jwt_required()
 @rate_limit
 def update_contact(contact_id):
-    current_user_id = get_jwt_identity()
-    contact = Contact.query.filter_by(id=contact_id, user_id=current_user_id).first()
-    
-    if not contact:
-        return jsonify({'error': 'Contact not found'}), 404
+    return commit_operation(edit_contact, get_jwt_identity(), contact_id, request.get_json())
 
-    data = request.get_json()
-    if 'name' in data:
-        contact.name = data['name']
-    if 'email' in data:
-        contact.email = data['email']
-    
-    db.session.commit()
-    
-    return jsonify({
-        'id': contact.id,
-        'name': contact.name,
-        'email': contact.email
-    }), 200
-    
-# Delete a contact and all associated notes
+# Delete a contact and all associated notes; large contacts are purged in the background
 @contacts_bp.route('/<int:contact_id>', methods=['DELETE'])
 @jwt_required()
 @rate_limit
 def delete_contact(contact_id):
-    current_user_id = get_jwt_identity()
-    contact = Contact.query.filter_by(id=contact_id, user_id=current_user_id).first()
-    
-    if not contact:
-        return jsonify({'error': 'Contact not found'}), 404
-    
-    db.session.delete(contact)
-    db.session.commit()
-    
-    return jsonify({'message': 'Contact deleted successfully'}), 200
\ No newline at end of file
+    return commit_operation(remove_contact, get_jwt_identity(), contact_id)
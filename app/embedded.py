@@ -0,0 +1,167 @@
+"""
+Single-node mode (EMBEDDED_MODE=true) for small deployments and CI: Redis,
+the Celery broker and Celery beat are replaced by in-process equivalents.
+
+- Redis: one in-memory fakeredis server per process, shared by every
+  client. Code written against redis-py (the token blocklist, refresh token
+  families, idempotency keys, the note scheduler, pub/sub) runs unchanged,
+  TTLs included. fakeredis is not in requirements.txt; install
+  requirements-embedded.txt for this mode.
+- Celery: tasks keep their `delay`/`apply_async` interface but run on a
+  thread pool of EMBEDDED_TASK_WORKERS threads.
+- Beat: a daemon thread runs CELERY_BEAT_SCHEDULE through the same pool,
+  and sweeps expired keys out of the store every EMBEDDED_SWEEP_INTERVAL.
+
+State lives in the process, so run a single worker process (with threads).
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_server = None
+_executor = None
+_beat = None
+
+
+def redis_server():
+    global _server
+    with _lock:
+        if _server is None:
+            try:
+                import fakeredis
+            except ImportError:
+                raise RuntimeError('EMBEDDED_MODE needs fakeredis: pip install -r requirements-embedded.txt')
+            _server = fakeredis.FakeServer()
+        return _server
+
+
+def redis_client():
+    import fakeredis
+    return fakeredis.FakeRedis(server=redis_server())
+
+
+def async_redis_client():
+    import fakeredis.aioredis
+    return fakeredis.aioredis.FakeRedis(server=redis_server())
+
+
+# fakeredis drops an expired key only when it is read or the keyspace is walked, so
+# keys nobody asks for again (revoked jtis, idempotency records, rate limit windows)
+# would stay forever in a process that is never recycled. DBSIZE walks the keyspace.
+def sweep_expired_keys():
+    return redis_client().dbsize()
+
+
+class TaskResult:
+    """The parts of Celery's AsyncResult callers use: id, ready(), get()."""
+
+    def __init__(self, task_id, future):
+        self.id = task_id
+        self._future = future
+
+    def ready(self):
+        return self._future.done()
+
+    def successful(self):
+        return self.ready() and self._future.exception() is None
+
+    def get(self, timeout=None, propagate=True):
+        # Celery's eager result re-raises the task's exception when asked to
+        result = self._future.result(timeout)
+        return result.get(propagate=propagate)
+
+
+class TaskExecutor:
+    """Runs Celery tasks in this process on a thread pool, as Celery's eager mode would inline."""
+
+    def __init__(self, workers):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='embedded-task')
+
+    def submit(self, task, args=None, kwargs=None, task_id=None):
+        task_id = task_id or str(uuid.uuid4())
+        from app import tracing
+        # A task queued by a traced request joins its trace
+        future = self._pool.submit(tracing.propagate(self._run), task, args or (), kwargs or {}, task_id)
+        return TaskResult(task_id, future)
+
+    @staticmethod
+    def _run(task, args, kwargs, task_id):
+        result = task.apply(args=args, kwargs=kwargs, task_id=task_id)
+        if result.failed():
+            logger.error(f"Embedded task {task.name}[{task_id}] failed: {result.result!r}")
+        return result
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+def get_executor(flask_app):
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = TaskExecutor(flask_app.config['EMBEDDED_TASK_WORKERS'])
+        return _executor
+
+
+class Beat(threading.Thread):
+    """
+    Queues each CELERY_BEAT_SCHEDULE entry on the executor every `schedule`
+    seconds, and runs the store's expiry sweep on this thread.
+    """
+
+    SWEEP = 'sweep-expired-keys'
+
+    def __init__(self, flask_app, schedule):
+        super().__init__(name='embedded-beat', daemon=True)
+        self.flask_app = flask_app
+        self.schedule = {name: float(entry['schedule']) for name, entry in schedule.items()}
+        self.tasks = {name: entry['task'] for name, entry in schedule.items()}
+        self.schedule[self.SWEEP] = float(flask_app.config['EMBEDDED_SWEEP_INTERVAL'])
+        self._stopped = threading.Event()
+
+    def run(self):
+        from app import get_celery
+        import app.tasks  # noqa: F401  registers the tasks
+        celery = get_celery()
+        due = {name: time.monotonic() + interval for name, interval in self.schedule.items()}
+        while due and not self._stopped.wait(max(0, min(due.values()) - time.monotonic())):
+            now = time.monotonic()
+            for name, at in due.items():
+                if at <= now:
+                    try:
+                        if name == self.SWEEP:
+                            sweep_expired_keys()
+                        else:
+                            celery.tasks[self.tasks[name]].apply_async()
+                    except Exception as e:
+                        logger.error(f"Embedded beat could not run {name}: {str(e)}")
+                    due[name] = now + self.schedule[name]
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_beat(flask_app):
+    global _beat
+    with _lock:
+        if _beat is None:
+            _beat = Beat(flask_app, flask_app.config.get('CELERY_BEAT_SCHEDULE', {}))
+            _beat.start()
+        return _beat
+
+
+# Threads do not survive fork, so a forked process starts its own pool and beat
+def reset():
+    global _executor, _beat
+    with _lock:
+        if _beat is not None:
+            _beat.stop()
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+        _beat = None
@@ -0,0 +1,154 @@
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import Blueprint, Response, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from app.admission import overloaded_response
+from app.auth import get_redis_client
+from app.utils import rate_limit
+
+logger = logging.getLogger(__name__)
+
+events_bp = Blueprint('events', __name__, url_prefix='/events')
+
+CHANNEL_PREFIX = 'events:user:'
+
+
+# Publish a note processing state transition to the owner's channel
+def publish_note_status(note, user_id):
+    redis = get_redis_client()
+    if not redis:
+        return
+    payload = {
+        'type': 'note.status',
+        'note_id': note.id,
+        'contact_id': note.contact_id,
+        'status': note.processing_status,
+        'processed_at': note.processed_at.isoformat() if note.processed_at else None,
+        'at': datetime.utcnow().isoformat()
+    }
+    try:
+        redis.publish(f'{CHANNEL_PREFIX}{user_id}', json.dumps(payload))
+    except Exception as e:
+        logger.warning(f"Failed to publish status for note {note.id}: {str(e)}")
+
+
+class EventBroker:
+    """
+    Fans out Redis pub/sub messages to the SSE connections of this process.
+    One pattern subscription serves every connected user; each connection
+    gets a bounded queue so a slow client cannot hold up the others.
+    """
+
+    def __init__(self, queue_size=100, reconnect_delay=1.0):
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    # Register a connection for a user and return the queue it reads from,
+    # or None when `limit` connections are already open
+    def subscribe(self, user_id, redis=None, limit=None):
+        events = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if limit is not None and self._count() >= limit:
+                return None
+            self._subscribers.setdefault(str(user_id), set()).add(events)
+        self._ensure_listener(redis)
+        return events
+
+    def unsubscribe(self, user_id, events):
+        with self._lock:
+            connections = self._subscribers.get(str(user_id))
+            if connections:
+                connections.discard(events)
+                if not connections:
+                    del self._subscribers[str(user_id)]
+
+    def connection_count(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return sum(len(connections) for connections in self._subscribers.values())
+
+    def _ensure_listener(self, redis):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            redis = redis or get_redis_client()
+            if not redis:
+                return
+            self._listener = threading.Thread(target=self._listen, args=(redis,), name='event-broker', daemon=True)
+            self._listener.start()
+
+    def _listen(self, redis):
+        while True:
+            try:
+                pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                for message in pubsub.listen():
+                    self._dispatch(message)
+            except Exception as e:
+                logger.warning(f"Event subscriber disconnected, retrying: {str(e)}")
+                time.sleep(self.reconnect_delay)
+
+    def _dispatch(self, message):
+        channel = message.get('channel')
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        data = message.get('data')
+        if isinstance(data, bytes):
+            data = data.decode()
+        if not channel or not channel.startswith(CHANNEL_PREFIX):
+            return
+        with self._lock:
+            connections = list(self._subscribers.get(channel[len(CHANNEL_PREFIX):], ()))
+        for events in connections:
+            try:
+                events.put_nowait(data)
+            except queue.Full:
+                logger.warning(f"Dropping event for slow SSE client on {channel}")
+
+
+# One subscriber per process, shared by every SSE connection
+broker = EventBroker()
+
+
+# Stream note processing updates for the authenticated user as Server-Sent Events
+@events_bp.route('', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+@rate_limit
+def stream_events():
+    current_user_id = get_jwt_identity()
+    keepalive = current_app.config['SSE_KEEPALIVE_SECONDS']
+    events = broker.subscribe(current_user_id, limit=current_app.config['SSE_MAX_STREAMS'])
+    if events is None:
+        logger.info(f"Refusing event stream for user {current_user_id}: SSE_MAX_STREAMS reached")
+        return overloaded_response('Too many open event streams', current_app.config['SSE_RETRY_AFTER'])
+
+    def stream():
+        yield f'retry: {int(keepalive * 1000)}\n\n'
+        while True:
+            try:
+                data = events.get(timeout=keepalive)
+            except queue.Empty:
+                # Comment lines keep proxies from closing an idle stream
+                yield ': keepalive\n\n'
+                continue
+            yield f'event: note.status\ndata: {data}\n\n'
+
+    response = Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, even if the body was never iterated
+    # (a generator's finally would not), so the slot under SSE_MAX_STREAMS is freed
+    response.call_on_close(lambda: broker.unsubscribe(current_user_id, events))
+    return response
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import logging
+from functools import wraps
+
+from flask import request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+
+from app.auth import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+# Hash of what the client asked for, so a key reused for a different request is rejected
+def request_fingerprint(method, path, body):
+    digest = hashlib.sha256()
+    digest.update(f'{method} {path}\n'.encode())
+    digest.update(body or b'')
+    return digest.hexdigest()
+
+
+# Redis keys for the stored response and the in-flight lock; keys are scoped per user
+def storage_keys(user_id, key):
+    base = f'idempotency:{user_id}:{key}'
+    return base, base + ':lock'
+
+
+def encode_record(fingerprint, status, body):
+    return json.dumps({'fingerprint': fingerprint, 'status': status, 'body': body})
+
+
+# Turn a stored record into the (status, body) to send back for a retried request
+def replay(raw, fingerprint):
+    record = json.loads(raw)
+    if record['fingerprint'] != fingerprint:
+        return 422, {'error': f'{HEADER} was already used for a different request'}
+    return record['status'], record['body']
+
+
+# Responses worth replaying: server errors and rate limiting are left retryable
+def should_store(status):
+    return status < 500 and status != 429
+
+
+def in_progress_response():
+    return {'error': f'A request with this {HEADER} is still in progress'}
+
+
+def idempotent(func):
+    """
+    Let clients retry a POST safely by sending an Idempotency-Key header.
+    The first response is kept in Redis for IDEMPOTENCY_TTL seconds and returned
+    for any retry with the same key and body, without running the view again.
+    A retry that arrives while the first request is still running gets 409.
+    Without Redis the view runs normally.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return func(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        redis = get_redis_client()
+        if not redis:
+            return func(*args, **kwargs)
+        fingerprint = request_fingerprint(request.method, request.path, request.get_data())
+        record_key, lock_key = storage_keys(get_jwt_identity(), key)
+
+        try:
+            stored = redis.get(record_key)
+            locked = stored is None and redis.set(lock_key, fingerprint, nx=True,
+                                                  ex=current_app.config['IDEMPOTENCY_LOCK_SECONDS'])
+        except Exception as e:
+            logger.warning(f"Idempotency store unavailable, running request without it: {str(e)}")
+            return func(*args, **kwargs)
+
+        if stored is not None:
+            status, body = replay(stored, fingerprint)
+            response = jsonify(body)
+            response.status_code = status
+            if status != 422:
+                response.headers[REPLAYED_HEADER] = 'true'
+            return response
+        if not locked:
+            response = jsonify(in_progress_response())
+            response.status_code = 409
+            response.headers['Retry-After'] = '1'
+            return response
+
+        try:
+            response = current_app.make_response(func(*args, **kwargs))
+            if should_store(response.status_code):
+                _store(redis, record_key, encode_record(fingerprint, response.status_code, response.get_json()))
+            return response
+        finally:
+            _release(redis, lock_key)
+    return wrapper
+
+
+# The view already ran, so a failed write to Redis must not fail the request
+def _store(redis, record_key, record):
+    try:
+        redis.setex(record_key, current_app.config['IDEMPOTENCY_TTL'], record)
+    except Exception as e:
+        logger.warning(f"Failed to store idempotent response for {record_key}: {str(e)}")
+
+
+def _release(redis, lock_key):
+    try:
+        redis.delete(lock_key)
+    except Exception as e:
+        logger.warning(f"Failed to release idempotency lock {lock_key}: {str(e)}")
@@ -1,5 +1,7 @@
 from app import db
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
 # Data models for the application:
 #User: Stores user credentials and links to their contacts
@@ -8,7 +10,11 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
-    contacts = db.relationship('Contact', backref='user', lazy=True, cascade="all, delete-orphan")
+    # Set when account deletion is accepted; the rows are purged in the background
+    deleted_at = db.Column(db.DateTime)
+    # Children are removed by ON DELETE CASCADE in the database, not loaded by the ORM
+    contacts = db.relationship('Contact', backref='user', lazy=True, cascade="all, delete-orphan",
+                               passive_deletes=True)
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -16,20 +22,138 @@ class User(db.Model):
 class Contact(db.Model):
     __tablename__ = 'contacts'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(80), nullable=False)
     email = db.Column(db.String(120))
-    notes = db.relationship('Note', backref='contact', lazy=True, cascade="all, delete-orphan")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set when a large delete is handed to the purge task; hidden from every read
+    deleted_at = db.Column(db.DateTime)
+    notes = db.relationship('Note', backref='contact', lazy=True, cascade="all, delete-orphan",
+                            passive_deletes=True)
     
+    # Contacts that have not been deleted
+    @classmethod
+    def active(cls):
+        return cls.query.filter(cls.deleted_at.is_(None))
+
     def __repr__(self):
         return f'<Contact {self.name}>'
 #Note: Stores text notes associated with contacts
 class Note(db.Model):
     __tablename__ = 'notes'
+    # Archived notes keep their id, so SQLite must never hand it out again
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
-    contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id'), nullable=False)
+    contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
     body = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Last time the user wrote the body (a PUT or a flushed autosave); background writes
+    # leave it alone, so buffered edits are only ever compared with other edits
+    edited_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Background processing state: pending -> processing -> processed | failed
+    processing_status = db.Column(db.String(16), nullable=False, default='pending')
+    processed_at = db.Column(db.DateTime)
     
     def __repr__(self):
-        return f'<Note {self.id} for Contact {self.contact_id}>'
\ No newline at end of file
+        return f'<Note {self.id} for Contact {self.contact_id}>'
+#ArchivedNote: Cold notes moved out of the notes table, body stored zlib-compressed
+class ArchivedNote(db.Model):
+    __tablename__ = 'notes_archive'
+    # Same id as the note it was archived from
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
+    body_compressed = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    edited_at = db.Column(db.DateTime)
+    processing_status = db.Column(db.String(16), nullable=False)
+    processed_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ArchivedNote {self.id} for Contact {self.contact_id}>'
+#SyncChange: Latest change per contact/note; the id is the monotonically increasing sync token
+class SyncChange(db.Model):
+    __tablename__ = 'sync_changes'
+    # AUTOINCREMENT stops SQLite from reusing the id of a compacted row as a token
+    __table_args__ = (
+        db.UniqueConstraint('entity', 'entity_id', name='uq_sync_changes_entity'),
+        db.Index('ix_sync_changes_user_id_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    entity = db.Column(db.String(16), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    contact_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SyncChange {self.id} {self.entity} {self.entity_id}>'
+#SyncCompaction: Highest token removed by each tombstone compaction run
+class SyncCompaction(db.Model):
+    __tablename__ = 'sync_compactions'
+    id = db.Column(db.Integer, primary_key=True)
+    watermark = db.Column(db.Integer, nullable=False)
+    compacted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+#NoteActivity: Notes created per contact per UTC day, maintained as notes are written
+class NoteActivity(db.Model):
+    __tablename__ = 'note_activity_daily'
+    __table_args__ = (
+        db.Index('ix_note_activity_daily_user_id_day', 'user_id', 'day'),
+    )
+    contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    # Copied from the contact so a user's activity is one index range
+    user_id = db.Column(db.Integer, nullable=False)
+    notes_created = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<NoteActivity {self.contact_id} {self.day}: {self.notes_created}>'
+#NoteTotal: Current number of notes per contact; rows go with the contact through ON DELETE CASCADE
+class NoteTotal(db.Model):
+    __tablename__ = 'note_totals'
+    contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    notes = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<NoteTotal {self.contact_id}: {self.notes}>'
+
+# Record every contact and note write in the sync change feed
+@event.listens_for(Session, 'after_flush')
+def record_sync_changes(session, flush_context):
+    from app.sync import record_changes
+    record_changes(session)
+
+# Fold note writes into the activity rollups in the same transaction
+@event.listens_for(Session, 'after_flush')
+def record_note_activity(session, flush_context):
+    from app.stats import record_activity
+    record_activity(session)
+# pysqlite only opens a transaction at the first write, so SAVEPOINTs (used by
+# /batch) would commit on release. Let SQLAlchemy emit BEGIN itself instead.
+# SQLite also ignores ON DELETE CASCADE unless foreign keys are switched on.
+# Registered on the app's engines only, so other engines in the process keep
+# the driver defaults.
+def configure_sqlite_engine(engine):
+    if engine.dialect.name != 'sqlite':
+        return
+    event.listen(engine, 'connect', configure_sqlite_connection)
+    if engine.dialect.driver == 'pysqlite':
+        event.listen(engine, 'begin', begin_pysqlite_transaction)
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    if type(dbapi_connection).__module__ == 'sqlite3':
+        dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+def begin_pysqlite_transaction(conn):
+    conn.exec_driver_sql('BEGIN')
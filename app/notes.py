@@ -1,142 +1,234 @@
-from flask import Blueprint, request, jsonify
+from datetime import datetime
+from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select
 from app.models import Contact, Note, db
-from app.utils import normalize_note_data, rate_limit
-from app.tasks import process_note, call_upstream_service  # Import the shared function
+from app.utils import commit_operation, normalize_note_data, rate_limit, after_commit
+from app.idempotency import idempotent
+from app.ownership import cache as ownership
+from app.archive import archived_note_json, archived_notes_for_contact, find_archived_note, restore_note
+from app.autosave import buffer_note_update, buffered_note, buffered_notes, discard, flush_contact
 from flask import current_app as app
 
 notes_bp = Blueprint('notes', __name__, url_prefix='/contacts/<int:contact_id>/notes')
 
+# A note as the API returns it; `body` overrides the stored one (an autosaved edit)
+def note_json(note, body=None):
+    return {
+        'id': note.id,
+        'body': body if body is not None else note.body,
+        'created_at': note.created_at.isoformat()
+    }
+
+# Statements behind the note operations
+def contact_notes_query(contact_id):
+    return select(Note).where(Note.contact_id == contact_id)
+
+def owned_note_query(user_id, contact_id, note_id):
+    return select(Note).join(Contact).where(
+        Note.id == note_id,
+        Contact.id == contact_id,
+        Contact.user_id == user_id,
+        Contact.deleted_at.is_(None)
+    )
+
+# ?include_archived=true on the note list, read the same way by the async app
+def wants_archived(args):
+    return args.get('include_archived', 'false').lower() == 'true'
+
+# Note operations follow the contact ones (app.contacts): the caller's identity
+# in, (body, status) out, and the caller commits.
+
+def add_note(user_id, contact_id, data):
+    if not ownership.owns(user_id, contact_id):
+        return {'error': 'Contact not found'}, 404
+    if not data:
+        return {'error': 'No data provided'}, 400
+
+    # Enhanced normalization
+    body = data.get('body') or data.get('note_body') or data.get('note_text')
+    if not body:
+        return {'error': 'Note content is required'}, 400
+
+    new_note = Note(
+        contact_id=contact_id,
+        body=body
+    )
+    db.session.add(new_note)
+    db.session.flush()
+
+    after_commit(lambda note_id=new_note.id, lane=g.get('processing_lane'):
+                 queue_note_processing(note_id, user_id, lane))
+    return note_json(new_note), 201
+
+def list_notes(user_id, contact_id, include_archived=False):
+    if not ownership.owns(user_id, contact_id):
+        return {'error': 'Contact not found'}, 404
+
+    notes = db.session.execute(contact_notes_query(contact_id)).scalars().all()
+    # Cold notes are only read when the client asks for them
+    archived = archived_notes_for_contact(user_id, contact_id) if include_archived else []
+    # Autosaved edits not flushed yet win over the stored body
+    buffered = buffered_notes(contact_id) if notes else {}
+    return [archived_note_json(note) for note in archived] + [
+        note_json(note, buffered[note.id]['body'] if note.id in buffered else None)
+        for note in notes
+    ], 200
+
+def read_note(user_id, contact_id, note_id):
+    note = find_owned_note(user_id, contact_id, note_id)
+    if not note:
+        # Reads through to the archive for notes that have gone cold
+        archived = find_archived_note(user_id, contact_id, note_id)
+        if archived:
+            return archived_note_json(archived), 200
+        return {'error': 'Note not found'}, 404
+
+    buffered = buffered_note(contact_id, note.id)
+    return note_json(note, buffered['body'] if buffered else None), 200
+
+def edit_note(user_id, contact_id, note_id, data):
+    note = find_owned_note(user_id, contact_id, note_id, restore=True)
+    if not note:
+        return {'error': 'Note not found'}, 404
+
+    data = normalize_note_data(data)
+    if not data.get('body'):
+        return {'error': 'Note body is required'}, 400
+
+    note.body = data['body']
+    note.edited_at = datetime.utcnow()
+    db.session.flush()
+    # This write supersedes any autosaved edit still waiting for a flush
+    after_commit(lambda: discard(contact_id, note_id))
+    return note_json(note), 200
+
+def remove_note(user_id, contact_id, note_id):
+    note = find_owned_note(user_id, contact_id, note_id, restore=True)
+    if not note:
+        return {'error': 'Note not found'}, 404
+
+    db.session.delete(note)
+    db.session.flush()
+    after_commit(lambda: discard(contact_id, note_id))
+    return {'message': 'Note deleted successfully'}, 200
+
 # Create a new note for a specific contact and queue for background processing
 @notes_bp.route('', methods=['POST'])
 @jwt_required()
 @rate_limit
+@idempotent
 def create_note(contact_id):
     try:
-        current_user_id = get_jwt_identity()
-        contact = Contact.query.filter_by(id=contact_id, user_id=current_user_id).first()
-        
-        if not contact:
-            return jsonify({'error': 'Contact not found'}), 404
-
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-
-        # Enhanced normalization
-        body = data.get('body') or data.get('note_body') or data.get('note_text')
-        if not body:
-            return jsonify({'error': 'Note content is required'}), 400
-
-        new_note = Note(
-            contact_id=contact_id,
-            body=body
-        )
-        
-        db.session.add(new_note)
-        db.session.commit()
-        
-        # Add error handling for Celery task
-        try:
-            process_note.delay(new_note.id)
-        except Exception as e:
-            app.logger.error(f"Failed to queue Celery task: {str(e)}")
-            # Continue even if Celery fails - this might be what you want
-        
-        return jsonify({
-            'id': new_note.id,
-            'body': new_note.body,
-            'created_at': new_note.created_at.isoformat()
-        }), 201
-
+        return commit_operation(add_note, get_jwt_identity(), contact_id, request.get_json())
     except Exception as e:
-        db.session.rollback()
         app.logger.error(f"Note creation failed: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
+
+# Queue background processing for a committed note through the per-tenant scheduler
+def queue_note_processing(note_id, user_id, lane=None):
+    # Add error handling for Celery task
+    try:
+        # Imported here so serving requests doesn't load Celery until a note is queued
+        from app.scheduling import enqueue_note, INTERACTIVE
+        enqueue_note(note_id, user_id, lane or INTERACTIVE)
+    except Exception as e:
+        app.logger.error(f"Failed to queue Celery task: {str(e)}")
+        # Continue even if Celery fails - this might be what you want
+
+# Load a note of a contact the user owns. The contact join is skipped when
+# ownership is already cached, and a successful join fills the cache.
+# With `restore`, an archived note is moved back so it can be changed.
+def find_owned_note(user_id, contact_id, note_id, restore=False):
+    note = _find_live_note(user_id, contact_id, note_id)
+    if note is None and restore:
+        archived = find_archived_note(user_id, contact_id, note_id)
+        if archived:
+            note = restore_note(archived)
+    return note
+
+def _find_live_note(user_id, contact_id, note_id):
+    if ownership.is_cached(user_id, contact_id):
+        return db.session.execute(
+            contact_notes_query(contact_id).where(Note.id == note_id)
+        ).scalars().first()
+    generation = ownership.generation(user_id)
+    note = db.session.execute(owned_note_query(user_id, contact_id, note_id)).scalars().first()
+    if note:
+        after_commit(lambda: ownership.remember(user_id, contact_id, generation))
+    return note
+
 # Retrieve all notes for a specific contact
 @notes_bp.route('', methods=['GET'])
 @jwt_required()
 @rate_limit
 def get_all_notes(contact_id):
-    current_user_id = get_jwt_identity()
-    contact = Contact.query.filter_by(id=contact_id, user_id=current_user_id).first()
-    
-    if not contact:
-        return jsonify({'error': 'Contact not found'}), 404
-    
-    notes = Note.query.filter_by(contact_id=contact_id).all()
-    
-    return jsonify([{
-        'id': note.id,
-        'body': note.body,
-        'created_at': note.created_at.isoformat()
-    } for note in notes]), 200
+    return commit_operation(list_notes, get_jwt_identity(), contact_id, wants_archived(request.args))
 
 # Retrieve a specific note by ID for a given contact
 @notes_bp.route('/<int:note_id>', methods=['GET'])
 @jwt_required()
 @rate_limit
 def get_single_note(contact_id, note_id):
-    current_user_id = get_jwt_identity()
-    note = Note.query.join(Contact).filter(
-        Note.id == note_id,
-        Contact.id == contact_id,
-        Contact.user_id == current_user_id
-    ).first()
-    
-    if not note:
-        return jsonify({'error': 'Note not found'}), 404
-    
-    return jsonify({
-        'id': note.id,
-        'body': note.body,
-        'created_at': note.created_at.isoformat()
-    }), 200
+    return commit_operation(read_note, get_jwt_identity(), contact_id, note_id)
 
-# Update an existing note's content
+# Update an existing note's content; ?autosave=true buffers the edit in Redis instead
 @notes_bp.route('/<int:note_id>', methods=['PUT'])
 @jwt_required()
 @rate_limit
 def update_note(contact_id, note_id):
     current_user_id = get_jwt_identity()
-    note = Note.query.join(Contact).filter(
-        Note.id == note_id,
-        Contact.id == contact_id,
-        Contact.user_id == current_user_id
-    ).first()
-    
-    if not note:
-        return jsonify({'error': 'Note not found'}), 404
+    if request.args.get('autosave', 'false').lower() == 'true' and app.config['AUTOSAVE_ENABLED']:
+        response = autosave_note(current_user_id, contact_id, note_id)
+        if response is not None:
+            return response
 
-    data = normalize_note_data(request.get_json())
-    if not data.get('body'):
-        return jsonify({'error': 'Note body is required'}), 400
-    
-    note.body = data['body']
-    db.session.commit()
-    
-    return jsonify({
-        'id': note.id,
-        'body': note.body,
-        'created_at': note.created_at.isoformat()
-    }), 200
+    return commit_operation(edit_note, current_user_id, contact_id, note_id, request.get_json())
 
 # Delete a specific note from a contact
 @notes_bp.route('/<int:note_id>', methods=['DELETE'])
 @jwt_required()
 @rate_limit
 def delete_note(contact_id, note_id):
+    return commit_operation(remove_note, get_jwt_identity(), contact_id, note_id)
+
+# Buffer an autosave edit. A note already in the buffer was checked when it got
+# there, so repeat saves skip the database. Returns None to fall back to a direct write.
+def autosave_note(user_id, contact_id, note_id):
+    buffered = buffered_note(contact_id, note_id) if ownership.owns(user_id, contact_id) else None
+    if buffered:
+        created_at = buffered['created_at']
+    else:
+        note = find_owned_note(user_id, contact_id, note_id, restore=True)
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+        # Commits a restore from the archive, if there was one
+        db.session.commit()
+        created_at = note.created_at.isoformat()
+
+    data = normalize_note_data(request.get_json())
+    if not data.get('body'):
+        return jsonify({'error': 'Note body is required'}), 400
+    entry = buffer_note_update(contact_id, note_id, created_at, data['body'])
+    if entry is None:
+        return None
+
+    response = jsonify({'id': note_id, 'body': entry['body'], 'created_at': created_at})
+    response.headers['Autosave-Buffered'] = 'true'
+    return response, 200
+
+# Write the contact's buffered autosave edits to the database now, e.g. when the editor closes
+@notes_bp.route('/flush', methods=['POST'])
+@jwt_required()
+@rate_limit
+def flush_notes(contact_id):
     current_user_id = get_jwt_identity()
-    note = Note.query.join(Contact).filter(
-        Note.id == note_id,
-        Contact.id == contact_id,
-        Contact.user_id == current_user_id
-    ).first()
-    
-    if not note:
-        return jsonify({'error': 'Note not found'}), 404
-    
-    db.session.delete(note)
-    db.session.commit()
-    
-    return jsonify({'message': 'Note deleted successfully'}), 200
\ No newline at end of file
+    if not ownership.owns(current_user_id, contact_id):
+        return jsonify({'error': 'Contact not found'}), 404
+    try:
+        flushed = flush_contact(contact_id)
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Autosave flush failed for contact {contact_id}: {str(e)}")
+        return jsonify({'error': 'Autosave buffer unavailable'}), 503
+    return jsonify({'flushed': flushed}), 200
\ No newline at end of file
@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.auth import get_redis_client
+from app.models import Contact
+from app.utils import after_commit
+
+logger = logging.getLogger(__name__)
+
+# Per-user Redis hash of contact ids the user is known to own
+KEY_PREFIX = 'ownership:'
+# Deletions are announced here so every process drops its local entries
+CHANNEL = 'ownership:invalidate'
+
+
+class OwnershipCache:
+    """
+    Remembers which contacts a user owns so note routes can skip the
+    ownership query. Entries live in a bounded in-process LRU for
+    OWNERSHIP_CACHE_TTL seconds, backed by an optional Redis tier shared
+    by all processes. Only positive answers are cached; deleting a contact
+    or account removes its entries here, in Redis and, through pub/sub,
+    in every other process.
+    """
+
+    def __init__(self, reconnect_delay=1.0):
+        self.reconnect_delay = reconnect_delay
+        self._entries = OrderedDict()
+        # Bumped on invalidation so a lookup that raced a delete is not cached
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def owns(self, user_id, contact_id):
+        """Return True if the user owns the active contact, querying only on a cache miss."""
+        if self.is_cached(user_id, contact_id):
+            return True
+        generation = self.generation(user_id)
+        owned = Contact.active().with_entities(Contact.id).filter_by(id=contact_id, user_id=user_id).first()
+        if owned:
+            # A contact created earlier in the same /batch is only cached once that commits
+            after_commit(lambda: self.remember(user_id, contact_id, generation))
+        return owned is not None
+
+    def is_cached(self, user_id, contact_id):
+        user_id, contact_id = str(user_id), int(contact_id)
+        if self._get_local(user_id, contact_id):
+            return True
+        if not self._redis_get(user_id, contact_id):
+            return False
+        self._put_local(user_id, contact_id, self.generation(user_id))
+        return True
+
+    # Cache a confirmed ownership; `generation` is taken before the database was read
+    def remember(self, user_id, contact_id, generation=None):
+        user_id, contact_id = str(user_id), int(contact_id)
+        if generation is None:
+            generation = self.generation(user_id)
+        if self._put_local(user_id, contact_id, generation):
+            self._redis_put(user_id, contact_id)
+
+    def invalidate_contact(self, user_id, contact_id):
+        self._invalidate(str(user_id), int(contact_id))
+
+    def invalidate_user(self, user_id):
+        self._invalidate(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    # Read before querying the database and pass to remember()
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(str(user_id), 0)
+
+    def _get_local(self, user_id, contact_id):
+        key = (user_id, contact_id)
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def _put_local(self, user_id, contact_id, generation):
+        config = current_app.config
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return False
+            self._entries[(user_id, contact_id)] = time.monotonic() + config['OWNERSHIP_CACHE_TTL']
+            self._entries.move_to_end((user_id, contact_id))
+            while len(self._entries) > config['OWNERSHIP_CACHE_SIZE']:
+                self._entries.popitem(last=False)
+            return True
+
+    def _drop_local(self, user_id, contact_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if contact_id is not None:
+                self._entries.pop((user_id, contact_id), None)
+                return
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def _invalidate(self, user_id, contact_id):
+        self._drop_local(user_id, contact_id)
+        redis = self._redis()
+        if not redis:
+            return
+        try:
+            if contact_id is None:
+                redis.delete(KEY_PREFIX + user_id)
+            else:
+                redis.hdel(KEY_PREFIX + user_id, contact_id)
+            redis.publish(CHANNEL, f'{user_id}:{"" if contact_id is None else contact_id}')
+        except Exception as e:
+            logger.warning(f"Failed to invalidate shared ownership cache for user {user_id}: {str(e)}")
+
+    def _redis(self):
+        if not current_app.config['OWNERSHIP_CACHE_REDIS']:
+            return None
+        return get_redis_client()
+
+    def _redis_get(self, user_id, contact_id):
+        redis = self._redis()
+        if not redis:
+            return False
+        try:
+            found = redis.hexists(KEY_PREFIX + user_id, contact_id)
+        except Exception as e:
+            logger.warning(f"Shared ownership cache unavailable: {str(e)}")
+            return False
+        # Redis is reachable, so other processes' invalidations can reach this one
+        self._ensure_listener(redis)
+        return found
+
+    def _redis_put(self, user_id, contact_id):
+        redis = self._redis()
+        if not redis:
+            return
+        try:
+            with redis.pipeline() as pipe:
+                pipe.hset(KEY_PREFIX + user_id, contact_id, 1)
+                pipe.expire(KEY_PREFIX + user_id, current_app.config['OWNERSHIP_CACHE_TTL'])
+                pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to store shared ownership for user {user_id}: {str(e)}")
+
+    def _ensure_listener(self, redis):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, args=(redis,),
+                                              name='ownership-invalidation', daemon=True)
+            self._listener.start()
+
+    def _listen(self, redis):
+        while True:
+            try:
+                pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for message in pubsub.listen():
+                    self._handle(message.get('data'))
+            except Exception as e:
+                logger.warning(f"Ownership invalidation subscriber disconnected, retrying: {str(e)}")
+                time.sleep(self.reconnect_delay)
+
+    def _handle(self, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+        if not isinstance(data, str) or ':' not in data:
+            return
+        user_id, contact_id = data.split(':', 1)
+        self._drop_local(user_id, int(contact_id) if contact_id else None)
+
+
+# One cache per process, shared by every request thread
+cache = OwnershipCache()
+
+
+# Drop cached ownership right away, so later operations in the same batch see it,
+# and again after commit in case a concurrent lookup re-cached the uncommitted row
+def forget_ownership(user_id, contact_id=None):
+    if contact_id is None:
+        cache.invalidate_user(user_id)
+        after_commit(lambda: cache.invalidate_user(user_id))
+    else:
+        cache.invalidate_contact(user_id, contact_id)
+        after_commit(lambda: cache.invalidate_contact(user_id, contact_id))
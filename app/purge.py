@@ -0,0 +1,109 @@
+import logging
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.models import User, Contact, Note, ArchivedNote, SyncChange, db
+from app.ownership import forget_ownership
+from app.utils import after_commit
+
+logger = logging.getLogger(__name__)
+
+notes_table = Note.__table__
+contacts_table = Contact.__table__
+archive_table = ArchivedNote.__table__
+
+
+# True when more than PURGE_THRESHOLD notes match; counts at most threshold + 1 rows
+def exceeds_purge_threshold(note_query):
+    threshold = current_app.config['PURGE_THRESHOLD']
+    return note_query.with_entities(Note.id).limit(threshold + 1).count() > threshold
+
+
+def delete_contact(contact):
+    """
+    Delete a contact and its notes. Small contacts go in one statement
+    (the database cascades to the notes); large ones are hidden now and
+    purged in bounded batches by a background task. The caller commits.
+    Returns True if the purge was deferred.
+    """
+    user_id, contact_id = contact.user_id, contact.id
+    if not exceeds_purge_threshold(Note.query.filter_by(contact_id=contact.id)):
+        db.session.delete(contact)
+        db.session.flush()
+        forget_ownership(user_id, contact_id)
+        return False
+
+    contact.deleted_at = datetime.utcnow()
+    db.session.flush()
+    forget_ownership(user_id, contact_id)
+    after_commit(lambda contact_id=contact.id: queue_purge('purge_contact', contact_id))
+    return True
+
+
+def delete_user(user):
+    """
+    Delete an account with all of its contacts and notes, deferring to the
+    purge task above the same threshold as contacts.
+    Returns True if the purge was deferred.
+    """
+    notes = Note.query.join(Contact).filter(Contact.user_id == user.id)
+    if not exceeds_purge_threshold(notes):
+        user_id = user.id
+        SyncChange.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+        db.session.delete(user)
+        db.session.commit()
+        forget_ownership(user_id)
+        return False
+
+    now = datetime.utcnow()
+    user.deleted_at = now
+    db.session.execute(contacts_table.update().where(
+        contacts_table.c.user_id == user.id,
+        contacts_table.c.deleted_at.is_(None)
+    ).values(deleted_at=now))
+    db.session.commit()
+    forget_ownership(user.id)
+    after_commit(lambda user_id=user.id: queue_purge('purge_user', user_id))
+    return True
+
+
+# Queue a purge task; lazily imported like the other task producers
+def queue_purge(task_name, entity_id):
+    try:
+        from app import tasks
+        getattr(tasks, task_name).delay(entity_id)
+    except Exception as e:
+        logger.error(f"Failed to queue {task_name} for {entity_id}: {str(e)}")
+
+
+# Delete a contact's notes (live and archived) in batches of `batch_size`, committing
+# each batch so no transaction holds locks for long, then the contact row itself
+def purge_contact_rows(contact_id, batch_size):
+    removed = 0
+    for table in (notes_table, archive_table):
+        while True:
+            batch = select(table.c.id).where(table.c.contact_id == contact_id).limit(batch_size)
+            deleted = db.session.execute(table.delete().where(table.c.id.in_(batch))).rowcount
+            db.session.commit()
+            removed += deleted
+            if deleted < batch_size:
+                break
+    db.session.execute(contacts_table.delete().where(contacts_table.c.id == contact_id))
+    db.session.commit()
+    return removed
+
+
+def purge_user_rows(user_id, batch_size):
+    removed = 0
+    contact_ids = db.session.execute(
+        select(contacts_table.c.id).where(contacts_table.c.user_id == user_id)
+    ).scalars().all()
+    for contact_id in contact_ids:
+        removed += purge_contact_rows(contact_id, batch_size)
+    SyncChange.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    # Anything created while the purge ran goes with the user through ON DELETE CASCADE
+    db.session.execute(User.__table__.delete().where(User.__table__.c.id == user_id))
+    db.session.commit()
+    return removed
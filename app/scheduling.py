@@ -0,0 +1,291 @@
+import json
+import logging
+import time
+import uuid
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.auth import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Interactive work (a user saving a note) is dispatched ahead of bulk work (batches, sync backfills)
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+LANES = (INTERACTIVE, BULK)
+
+# Celery queue each lane dispatches to
+QUEUES = {INTERACTIVE: 'notes.interactive', BULK: 'notes.bulk'}
+
+PREFIX = 'sched'
+WEIGHTS_KEY = f'{PREFIX}:weights'
+LOCK_KEY = f'{PREFIX}:dispatch:lock'
+
+
+def _tenant_queue(lane, user_id):
+    return f'{PREFIX}:{lane}:queue:{user_id}'
+
+
+# Ring of tenants with pending work; the right end is the tenant being served
+def _ring(lane):
+    return f'{PREFIX}:{lane}:ring'
+
+
+def _members(lane):
+    return f'{PREFIX}:{lane}:members'
+
+
+def _deficits(lane):
+    return f'{PREFIX}:{lane}:deficit'
+
+
+# Dispatched note ids scored by dispatch time
+def _in_flight(lane):
+    return f'{PREFIX}:{lane}:in_flight'
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def enqueue_note(note_id, user_id, lane=INTERACTIVE):
+    """
+    Queue a note for processing in its owner's sub-queue. Tenants are served
+    round-robin so one user's backlog cannot starve the others. A user with
+    more than SCHEDULER_INTERACTIVE_BURST notes waiting is moved to the bulk lane.
+    Without Redis the task goes straight to Celery.
+    """
+    redis = get_redis_client()
+    try:
+        if not redis:
+            raise ConnectionError('Redis client unavailable')
+        if lane == INTERACTIVE and redis.llen(_tenant_queue(lane, user_id)) >= \
+                current_app.config['SCHEDULER_INTERACTIVE_BURST']:
+            lane = BULK
+        redis.rpush(_tenant_queue(lane, user_id), json.dumps({'note_id': note_id, 'queued_at': time.time()}))
+        # New tenants join at the far end of the ring
+        if redis.sadd(_members(lane), user_id):
+            redis.lpush(_ring(lane), user_id)
+    except Exception as e:
+        logger.warning(f"Fair scheduler unavailable, queueing note {note_id} directly: {str(e)}")
+        from app.tasks import process_note
+        process_note.delay(note_id)
+        return
+    try:
+        dispatch(redis)
+    except Exception as e:
+        # The note is queued; the periodic dispatcher will pick it up
+        logger.warning(f"Dispatch after queueing note {note_id} failed: {str(e)}")
+
+
+def dispatch(redis=None):
+    """
+    Move work from tenant sub-queues onto the Celery queues, keeping at most
+    SCHEDULER_<LANE>_IN_FLIGHT tasks outstanding per lane so the ordering
+    decision stays here rather than in the broker. Each visit gives a tenant
+    SCHEDULER_QUANTUM x its weight in credit (deficit round robin).
+    Returns the number of tasks dispatched.
+    """
+    redis = redis or get_redis_client()
+    config = current_app.config
+    # One dispatcher at a time; work queued while the lock is held is picked up by the
+    # next task completion or the periodic dispatch_note_queues task
+    token = uuid.uuid4().hex
+    if not redis.set(LOCK_KEY, token, nx=True, ex=10):
+        return 0
+    try:
+        picked = []
+        for lane in LANES:
+            capacity = config[f'SCHEDULER_{lane.upper()}_IN_FLIGHT'] - _count_in_flight(redis, lane)
+            picked.extend((lane, user_id, item) for user_id, item in _pick(redis, lane, capacity))
+    finally:
+        _release_lock(redis, token)
+
+    from app.tasks import process_note
+    failed = []
+    for lane, user_id, item in picked:
+        note_id = json.loads(item)['note_id']
+        try:
+            process_note.apply_async(args=[note_id], kwargs={'lane': lane}, queue=QUEUES[lane])
+        except Exception as e:
+            logger.warning(f"Could not publish note {note_id}, returning it to its queue: {str(e)}")
+            failed.append((lane, user_id, item))
+    # Reversed so each tenant's notes go back in their original order
+    for lane, user_id, item in reversed(failed):
+        _requeue(redis, lane, user_id, item)
+    return len(picked) - len(failed)
+
+
+def _count_in_flight(redis, lane):
+    # Tasks lost with a crashed worker stop counting after SCHEDULER_IN_FLIGHT_TIMEOUT
+    expired = time.time() - current_app.config['SCHEDULER_IN_FLIGHT_TIMEOUT']
+    redis.zremrangebyscore(_in_flight(lane), '-inf', expired)
+    return redis.zcard(_in_flight(lane))
+
+
+def _pick(redis, lane, capacity):
+    quantum = current_app.config['SCHEDULER_QUANTUM']
+    picked = []
+    while capacity > 0:
+        user_id = _decode(redis.lindex(_ring(lane), -1))
+        if user_id is None:
+            break
+        deficit = float(redis.hget(_deficits(lane), user_id) or 0)
+        if deficit < 1:
+            deficit += quantum * float(redis.hget(WEIGHTS_KEY, user_id) or 1)
+
+        queue = _tenant_queue(lane, user_id)
+        while deficit >= 1 and capacity > 0:
+            item = redis.lpop(queue)
+            if item is None:
+                break
+            picked.append((user_id, item))
+            deficit -= 1
+            capacity -= 1
+
+        if _leave_if_idle(redis, lane, user_id):
+            continue
+        redis.hset(_deficits(lane), user_id, deficit)
+        if deficit < 1:
+            redis.rpoplpush(_ring(lane), _ring(lane))
+
+    if picked:
+        now = time.time()
+        redis.zadd(_in_flight(lane), {str(json.loads(item)['note_id']): now for _, item in picked})
+    return picked
+
+
+# Put a picked note back at the head of its tenant's queue and free its slot
+def _requeue(redis, lane, user_id, item):
+    redis.lpush(_tenant_queue(lane, user_id), item)
+    redis.zrem(_in_flight(lane), str(json.loads(item)['note_id']))
+    # The tenant may have left the ring when its queue emptied; it is next in line again
+    if redis.sadd(_members(lane), user_id):
+        redis.rpush(_ring(lane), user_id)
+
+
+# A dispatcher that outlived the lock's expiry must not delete the next holder's lock,
+# so the key is deleted only while it still holds this dispatcher's token. WATCH rather
+# than a Lua script, which the embedded store cannot run.
+def _release_lock(redis, token):
+    from redis.exceptions import WatchError
+    with redis.pipeline() as pipe:
+        try:
+            pipe.watch(LOCK_KEY)
+            if _decode(pipe.get(LOCK_KEY)) != token:
+                return False
+            pipe.multi()
+            pipe.delete(LOCK_KEY)
+            pipe.execute()
+            return True
+        except WatchError:
+            return False
+
+
+# Idle tenants leave the ring and lose unused credit. WATCH makes this fail if
+# enqueue_note pushes to the queue concurrently, so no tenant is stranded.
+def _leave_if_idle(redis, lane, user_id):
+    from redis.exceptions import WatchError
+    queue = _tenant_queue(lane, user_id)
+    with redis.pipeline() as pipe:
+        try:
+            pipe.watch(queue)
+            if pipe.llen(queue):
+                return False
+            pipe.multi()
+            pipe.lrem(_ring(lane), 0, user_id)
+            pipe.srem(_members(lane), user_id)
+            pipe.hdel(_deficits(lane), user_id)
+            pipe.execute()
+            return True
+        except WatchError:
+            return False
+
+
+# Called by process_note when a scheduled task finishes, freeing its slot
+def task_finished(note_id, lane):
+    redis = get_redis_client()
+    try:
+        redis.zrem(_in_flight(lane), str(note_id))
+        dispatch(redis)
+    except Exception as e:
+        logger.warning(f"Could not release scheduler slot for note {note_id}: {str(e)}")
+
+
+# Give a tenant a larger (or smaller) share of processing; 1 is the default
+def set_tenant_weight(user_id, weight, redis=None):
+    redis = redis or get_redis_client()
+    if weight == 1:
+        redis.hdel(WEIGHTS_KEY, user_id)
+    else:
+        redis.hset(WEIGHTS_KEY, user_id, weight)
+
+
+def backlog(redis=None):
+    """Notes waiting to be processed: in tenant sub-queues or on the broker's queues."""
+    redis = redis or get_redis_client()
+    tenants = {lane: redis.smembers(_members(lane)) for lane in LANES}
+    with redis.pipeline(transaction=False) as pipe:
+        for lane in LANES:
+            pipe.llen(QUEUES[lane])
+            for user_id in tenants[lane]:
+                pipe.llen(_tenant_queue(lane, _decode(user_id)))
+        return sum(pipe.execute())
+
+
+def queue_stats(redis=None):
+    """
+    Per-lane in-flight counts and, per tenant, the number of notes waiting
+    and how long the oldest one has waited.
+    """
+    redis = redis or get_redis_client()
+    now = time.time()
+    stats = {}
+    for lane in LANES:
+        tenants = []
+        for user_id in sorted(_decode(member) for member in redis.smembers(_members(lane))):
+            queue = _tenant_queue(lane, user_id)
+            head = redis.lindex(queue, 0)
+            tenants.append({
+                'user_id': int(user_id),
+                'depth': redis.llen(queue),
+                'oldest_wait_seconds': round(now - json.loads(head)['queued_at'], 3) if head else 0.0,
+                'weight': float(redis.hget(WEIGHTS_KEY, user_id) or 1)
+            })
+        tenants.sort(key=lambda tenant: tenant['depth'], reverse=True)
+        stats[lane] = {
+            'queue': QUEUES[lane],
+            'in_flight': redis.zcard(_in_flight(lane)),
+            'waiting': sum(tenant['depth'] for tenant in tenants),
+            'tenants': tenants
+        }
+    return stats
+
+
+# CLI command: flask queues [--json] [--weight USER_ID WEIGHT]
+@click.command('queues')
+@click.option('--json', 'as_json', is_flag=True, help='Print the raw stats as JSON.')
+@click.option('--weight', type=(int, float), default=None, metavar='USER_ID WEIGHT',
+              help="Set a tenant's scheduling weight before printing.")
+@click.option('--top', default=20, show_default=True, help='Tenants to list per lane.')
+@with_appcontext
+def queues_command(as_json, weight, top):
+    """Show per-tenant note processing queue depth and wait time."""
+    try:
+        if weight:
+            set_tenant_weight(*weight)
+        stats = queue_stats()
+    except Exception as e:
+        raise click.ClickException(f'Redis unavailable: {str(e)}')
+
+    if as_json:
+        click.echo(json.dumps(stats, indent=2))
+        return
+    for lane, lane_stats in stats.items():
+        click.echo(f"{lane} ({lane_stats['queue']}): {lane_stats['waiting']} waiting, "
+                   f"{lane_stats['in_flight']} in flight, {len(lane_stats['tenants'])} tenants")
+        for tenant in lane_stats['tenants'][:top]:
+            click.echo(f"  user {tenant['user_id']:>8}  depth {tenant['depth']:>7}  "
+                       f"oldest {tenant['oldest_wait_seconds']:>9.1f}s  weight {tenant['weight']:g}")
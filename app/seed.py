@@ -0,0 +1,240 @@
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import create_engine, false, func, literal, select, text
+
+from app import db
+from app.models import User, Contact, Note, SyncChange
+from app.stats import rollup_inserts
+
+# Every seeded user shares this password so load tests can log in as any of them
+SEED_PASSWORD = 'seedpass'
+
+WORDS = (
+    'call follow up meeting lunch coffee project deadline invoice proposal '
+    'contract renewal budget review quarter client partner feedback demo '
+    'launch roadmap hiring intro referral conference travel birthday family '
+    'schedule reminder update pricing discount support ticket issue resolved '
+    'pending signed shipped delayed urgent later tomorrow next week monday'
+).split()
+
+# Engine reused by a seeding worker process across the chunks it handles
+_worker_engine = None
+
+
+# Draw a heavy-tailed count (Pareto) whose mean is roughly `mean`
+def skewed_count(rng, mean, alpha=1.5, cap_factor=50):
+    if mean <= 0:
+        return 0
+    scale = mean * (alpha - 1) / alpha
+    return min(int(scale * rng.paretovariate(alpha)), int(mean * cap_factor))
+
+
+# Draw a note length in characters from a log-normal distribution (median ~120)
+def note_length(rng):
+    return max(1, min(int(rng.lognormvariate(4.8, 0.9)), 5000))
+
+
+# Build a random block of words that note bodies are sliced from
+def build_corpus(rng, size=1 << 16):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+# Seed one contiguous range of users, their contacts and notes
+def _seed_chunk(task, engine=None):
+    global _worker_engine
+    if engine is None:
+        if _worker_engine is None:
+            _worker_engine = create_engine(task['database_uri'])
+        engine = _worker_engine
+
+    rng = random.Random(task['seed'])
+    corpus = build_corpus(rng)
+    batch_size = task['batch_size']
+    now = datetime.utcnow()
+    mean_age = task['history_days'] / 8
+
+    user_rows = [{
+        'id': user_id,
+        'username': f'seed_user_{user_id}',
+        'password_hash': task['password_hash']
+    } for user_id in range(task['user_start'], task['user_start'] + len(task['contact_counts']))]
+    for start in range(0, len(user_rows), batch_size):
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert(), user_rows[start:start + batch_size])
+
+    contact_rows = []
+    note_rows = []
+    notes_written = 0
+    contact_id = task['contact_start']
+    for offset, count in enumerate(task['contact_counts']):
+        user_id = task['user_start'] + offset
+        for _ in range(count):
+            contact_rows.append({
+                'id': contact_id,
+                'user_id': user_id,
+                'name': f'Contact {contact_id}',
+                'email': f'contact{contact_id}@example.com'
+            })
+            for _ in range(skewed_count(rng, task['notes_per_contact'])):
+                length = note_length(rng)
+                start = rng.randrange(0, len(corpus) - length) if length < len(corpus) else 0
+                # Recent activity dominates: ages are exponential, capped at the history window
+                age = min(rng.expovariate(1 / mean_age), task['history_days'])
+                created_at = now - timedelta(days=age)
+                note_rows.append({
+                    'contact_id': contact_id,
+                    'body': corpus[start:start + length],
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                    'edited_at': created_at
+                })
+            contact_id += 1
+
+            # Contacts must land before the notes that reference them
+            if len(note_rows) >= batch_size or len(contact_rows) >= batch_size:
+                notes_written += _flush_rows(engine, contact_rows, note_rows)
+                contact_rows, note_rows = [], []
+    notes_written += _flush_rows(engine, contact_rows, note_rows)
+
+    return {
+        'users': len(task['contact_counts']),
+        'contacts': contact_id - task['contact_start'],
+        'notes': notes_written
+    }
+
+
+# Insert pending contact and note rows, plus their sync feed entries and rollups, in one transaction
+def _flush_rows(engine, contact_rows, note_rows):
+    if not contact_rows and not note_rows:
+        return 0
+    first, last = contact_rows[0]['id'], contact_rows[-1]['id']
+    with engine.begin() as conn:
+        conn.execute(Contact.__table__.insert(), contact_rows)
+        if note_rows:
+            conn.execute(Note.__table__.insert(), note_rows)
+        _record_seeded_changes(conn, first, last)
+        for statement in rollup_inserts(Contact.id.between(first, last)):
+            conn.execute(statement)
+    return len(note_rows)
+
+
+# Add change-feed rows for a contiguous range of seeded contacts and their notes
+def _record_seeded_changes(conn, first, last):
+    columns = ['user_id', 'entity', 'entity_id', 'contact_id', 'deleted', 'changed_at']
+    changes = SyncChange.__table__
+    conn.execute(changes.insert().from_select(columns, select(
+        Contact.user_id, literal('contact'), Contact.id, Contact.id, false(), Contact.updated_at
+    ).where(Contact.id.between(first, last)).order_by(Contact.id)))
+    conn.execute(changes.insert().from_select(columns, select(
+        Contact.user_id, literal('note'), Note.id, Note.contact_id, false(), Note.updated_at
+    ).join(Contact, Note.contact_id == Contact.id).where(Contact.id.between(first, last)).order_by(Note.id)))
+
+
+# Move PostgreSQL id sequences past the explicitly inserted ids
+def _reset_sequences(engine):
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as conn:
+        for table in ('users', 'contacts'):
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+            ))
+
+
+def seed_data(users, contacts_per_user=20, notes_per_contact=10, batch_size=5000,
+              workers=1, seed=42, history_days=730, echo=None):
+    """
+    Generate synthetic users, contacts and notes with bulk inserts.
+    Users and contacts get explicit ids so chunks can run in parallel processes.
+    """
+    engine = db.engine
+    if workers > 1 and engine.dialect.name == 'sqlite' and engine.url.database in (None, '', ':memory:'):
+        raise ValueError('Multiple workers need a database shared between processes')
+
+    rng = random.Random(seed)
+    contact_counts = [skewed_count(rng, contacts_per_user) for _ in range(users)]
+    from argon2 import PasswordHasher
+    password_hash = PasswordHasher().hash(SEED_PASSWORD)
+
+    user_start = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    contact_start = (db.session.query(func.max(Contact.id)).scalar() or 0) + 1
+    db.session.commit()
+
+    # Several chunks per worker keep processes busy when tenant sizes are skewed
+    chunk_size = max(1, math.ceil(users / (workers * 4)))
+    tasks = []
+    for start in range(0, users, chunk_size):
+        counts = contact_counts[start:start + chunk_size]
+        tasks.append({
+            'database_uri': engine.url.render_as_string(hide_password=False),
+            'user_start': user_start + start,
+            'contact_start': contact_start,
+            'contact_counts': counts,
+            'notes_per_contact': notes_per_contact,
+            'password_hash': password_hash,
+            'batch_size': batch_size,
+            'history_days': history_days,
+            'seed': rng.getrandbits(32)
+        })
+        contact_start += sum(counts)
+
+    totals = {'users': 0, 'contacts': 0, 'notes': 0}
+    started = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_seed_chunk, tasks)
+            for result in results:
+                _add_totals(totals, result, echo)
+    else:
+        for task in tasks:
+            _add_totals(totals, _seed_chunk(task, engine=engine), echo)
+    _reset_sequences(engine)
+
+    totals['seconds'] = time.perf_counter() - started
+    return totals
+
+
+def _add_totals(totals, result, echo):
+    for key in ('users', 'contacts', 'notes'):
+        totals[key] += result[key]
+    if echo:
+        echo(f"  ...{totals['users']} users, {totals['contacts']} contacts, {totals['notes']} notes")
+
+
+# CLI command: flask seed --users 100000 --workers 8
+@click.command('seed')
+@click.option('--users', default=1000, show_default=True, help='Number of users to create.')
+@click.option('--contacts-per-user', default=20.0, show_default=True, help='Mean contacts per user (heavy-tailed).')
+@click.option('--notes-per-contact', default=10.0, show_default=True, help='Mean notes per contact (heavy-tailed).')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per INSERT batch and commit.')
+@click.option('--workers', default=1, show_default=True, help='Parallel seeding processes.')
+@click.option('--seed', default=42, show_default=True, help='Random seed for reproducible data.')
+@click.option('--history-days', default=730, show_default=True, help='Oldest note age in days.')
+@with_appcontext
+def seed_command(users, contacts_per_user, notes_per_contact, batch_size, workers, seed, history_days):
+    """Bulk-generate synthetic users, contacts and notes."""
+    try:
+        totals = seed_data(users, contacts_per_user, notes_per_contact, batch_size,
+                           workers, seed, history_days, echo=click.echo)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    rate = totals['notes'] / totals['seconds'] if totals['seconds'] else 0
+    click.echo(
+        f"Seeded {totals['users']} users, {totals['contacts']} contacts and "
+        f"{totals['notes']} notes in {totals['seconds']:.1f}s ({rate:.0f} notes/s). "
+        f"Password for every seeded user: {SEED_PASSWORD}"
+    )
@@ -0,0 +1,53 @@
+import gc
+import importlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Modules web workers end up importing on first use. The pre-fork master imports
+# them once so every worker shares those pages instead of loading its own copy.
+PRELOAD_MODULES = ('redis', 'argon2', 'requests', 'tenacity', 'app.tasks')
+
+
+def worker_count(configured=0, max_workers=12, cpus=None):
+    """
+    Number of worker processes: `configured` when set, otherwise two per CPU
+    plus one, capped at `max_workers` so large hosts do not run out of memory
+    or database connections.
+    """
+    if configured > 0:
+        return configured
+    cpus = cpus or os.cpu_count() or 1
+    return max(2, min(cpus * 2 + 1, max_workers))
+
+
+# Runs in the master after the app is preloaded, just before workers are forked
+def warm_master():
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f"Could not preload {module}: {str(e)}")
+    # Objects created so far are never collected in the workers, so the
+    # collector does not touch (and copy) their pages after fork
+    gc.freeze()
+
+
+def reset_after_fork(flask_app):
+    """
+    Give a freshly forked worker its own connections. Pools inherited from
+    the master would share sockets between processes.
+    """
+    import app
+    from app import db
+    from app import auth
+    from app import embedded
+
+    with flask_app.app_context():
+        # close=False leaves the master's sockets untouched; the worker just stops using them
+        db.engine.dispose(close=False)
+    auth.redis_client = None
+    embedded.reset()
+    if app._celery is not None:
+        app._celery._after_fork()
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FACTORIES = {
+    'web': 'create_app',
+    'worker': 'create_worker_app',
+}
+
+# Modules each factory must not import at startup; they are loaded on first use
+LAZY_MODULES = {
+    'web': ('celery', 'flask_migrate', 'alembic', 'redis', 'argon2', 'requests', 'tenacity'),
+    'worker': ('flask_migrate', 'alembic', 'flask_limiter', 'flask_swagger_ui', 'argon2', 'app.auth'),
+}
+
+PROBE = '''
+import sys, time
+started = time.perf_counter()
+from app import {factory}
+{factory}({config!r})
+print('wall:', (time.perf_counter() - started) * 1000)
+print('eager:', ','.join(m for m in {lazy!r} if m in sys.modules))
+'''
+
+
+def profile_startup(target='web', config_class=None, top=15):
+    """
+    Build an app in a fresh interpreter under `python -X importtime`.
+    Returns wall time, total import time, the slowest top-level imports and
+    any lazily loaded modules that were imported anyway.
+    """
+    code = PROBE.format(factory=FACTORIES[target], config=config_class, lazy=LAZY_MODULES[target])
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    probe = dict(line.split(': ', 1) for line in result.stdout.splitlines() if ': ' in line)
+    wall_ms, eager = probe['wall'], probe['eager']
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append({
+            'name': name.strip(),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        })
+
+    roots = sorted((m for m in modules if m['depth'] == 0), key=lambda m: m['cumulative_ms'], reverse=True)
+    return {
+        'target': target,
+        'wall_ms': float(wall_ms),
+        'import_ms': sum(m['self_ms'] for m in modules),
+        'modules': len(modules),
+        'top': roots[:top],
+        'eager': [m for m in eager.split(',') if m]
+    }
+
+
+# CLI command: flask startup-profile --target worker
+@click.command('startup-profile')
+@click.option('--target', type=click.Choice(sorted(FACTORIES)), default='web', show_default=True,
+              help='Which application factory to profile.')
+@click.option('--top', default=15, show_default=True, help='Number of top-level imports to list.')
+@click.option('--budget', type=float, default=None, help='Startup budget in ms (default: STARTUP_BUDGET_MS).')
+@with_appcontext
+def startup_profile_command(target, top, budget):
+    """Report import-time cost of building the app and enforce a budget."""
+    budget = budget if budget is not None else current_app.config['STARTUP_BUDGET_MS']
+    report = profile_startup(target, top=top)
+
+    click.echo(f"{report['target']} startup: {report['wall_ms']:.0f}ms wall, "
+               f"{report['import_ms']:.0f}ms in {report['modules']} imports (budget {budget:.0f}ms)")
+    for module in report['top']:
+        click.echo(f"  {module['cumulative_ms']:8.1f}ms  {module['name']}")
+    if report['eager']:
+        click.echo(f"Lazily loaded modules imported at startup: {', '.join(report['eager'])}")
+
+    if report['wall_ms'] > budget or report['eager']:
+        raise click.ClickException('Startup regression budget exceeded')
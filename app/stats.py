@@ -0,0 +1,232 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import click
+from flask import Blueprint, request, jsonify, current_app
+from flask.cli import with_appcontext
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import case, func, literal, select, union_all
+
+from app.models import ArchivedNote, Contact, Note, NoteActivity, NoteTotal, db
+from app.utils import rate_limit
+
+stats_bp = Blueprint('stats', __name__, url_prefix='/stats')
+
+activity_table = NoteActivity.__table__
+totals_table = NoteTotal.__table__
+
+GRANULARITIES = ('day', 'week')
+
+
+# Fold the notes created and deleted by a flush into the rollups (called from after_flush).
+# Daily activity only ever grows, so past days keep their counts when a note is deleted;
+# deletions come off the totals. Notes moved in or out of notes_archive keep their rollup
+# rows: archiving uses Core statements, and a restore is an archived row deleted in the same flush.
+def record_activity(session):
+    restored = {obj.id for obj in session.deleted if isinstance(obj, ArchivedNote)}
+    changed = [(obj, 1) for obj in session.new if isinstance(obj, Note) and obj.id not in restored]
+    changed += [(obj, -1) for obj in session.deleted if isinstance(obj, Note)]
+    if not changed:
+        return
+
+    conn = session.connection()
+    contact_ids = {obj.contact_id for obj, _ in changed}
+    # Contacts deleted in this flush are already gone, and their rollups with them
+    owners = {obj.id: obj.user_id for obj in session.new
+              if isinstance(obj, Contact) and obj.id in contact_ids}
+    missing = contact_ids - set(owners)
+    if missing:
+        owners.update(conn.execute(
+            select(Contact.id, Contact.user_id).where(Contact.id.in_(missing))
+        ).all())
+
+    daily = defaultdict(int)
+    totals = defaultdict(int)
+    for obj, delta in changed:
+        if obj.contact_id not in owners:
+            continue
+        if delta > 0:
+            daily[(obj.contact_id, (obj.created_at or datetime.utcnow()).date())] += delta
+        totals[obj.contact_id] += delta
+
+    _merge_counts(conn, activity_table, ('contact_id', 'day'), 'notes_created', [
+        {'contact_id': contact_id, 'day': day, 'user_id': int(owners[contact_id]), 'notes_created': created}
+        for (contact_id, day), created in daily.items()
+    ])
+    _merge_counts(conn, totals_table, ('contact_id',), 'notes', [
+        {'contact_id': contact_id, 'user_id': int(owners[contact_id]), 'notes': delta}
+        for contact_id, delta in totals.items() if delta
+    ])
+
+
+def _add(stored, new):
+    return stored + new
+
+
+def _greatest(stored, new):
+    return case((new > stored, new), else_=stored)
+
+
+# Combine each row's count with the stored one (added by default), inserting rows that do not exist yet
+def _merge_counts(conn, table, keys, column, rows, combine=_add):
+    if not rows:
+        return
+    dialect = conn.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        conn.execute(statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: combine(table.c[column], statement.excluded[column])}
+        ), rows)
+        return
+    for row in rows:
+        match = [table.c[key] == row[key] for key in keys]
+        updated = conn.execute(table.update().where(*match).values(
+            {column: combine(table.c[column], literal(row[column]))}
+        )).rowcount
+        if not updated:
+            conn.execute(table.insert(), row)
+
+
+# SELECTs computing the daily activity and the totals of the contacts matching
+# `scope` with a GROUP BY over live and archived notes
+def _rollup_selects(*scope):
+    notes = union_all(
+        select(Note.contact_id, Note.created_at),
+        select(ArchivedNote.contact_id, ArchivedNote.created_at)
+    ).subquery()
+    day = func.date(notes.c.created_at)
+    return (
+        select(notes.c.contact_id, day, Contact.user_id, func.count())
+        .join(Contact, Contact.id == notes.c.contact_id)
+        .where(*scope)
+        .group_by(notes.c.contact_id, day, Contact.user_id),
+        select(notes.c.contact_id, Contact.user_id, func.count())
+        .join(Contact, Contact.id == notes.c.contact_id)
+        .where(*scope)
+        .group_by(notes.c.contact_id, Contact.user_id)
+    )
+
+
+# INSERT ... SELECT statements filling the rollups of contacts that have none yet
+def rollup_inserts(*scope):
+    activity, totals = _rollup_selects(*scope)
+    return [
+        activity_table.insert().from_select(['contact_id', 'day', 'user_id', 'notes_created'], activity),
+        totals_table.insert().from_select(['contact_id', 'user_id', 'notes'], totals)
+    ]
+
+
+def rebuild_rollups(contact_ids=None):
+    """
+    Recompute the rollups for every contact, or only `contact_ids`, from
+    the notes tables. Used to repair drift after writes that bypass the
+    ORM. Deleted notes are gone from the notes tables, so a day's count is
+    only ever raised to what the notes show, never lowered. The caller commits.
+    """
+    scope = [Contact.id.in_(contact_ids)] if contact_ids is not None else []
+    activity, totals = _rollup_selects(*scope)
+    delete = totals_table.delete()
+    if contact_ids is not None:
+        delete = delete.where(totals_table.c.contact_id.in_(contact_ids))
+    db.session.execute(delete)
+    db.session.execute(totals_table.insert().from_select(['contact_id', 'user_id', 'notes'], totals))
+
+    conn = db.session.connection()
+    _merge_counts(conn, activity_table, ('contact_id', 'day'), 'notes_created', [
+        {'contact_id': contact_id, 'day': _as_date(day), 'user_id': user_id, 'notes_created': count}
+        for contact_id, day, user_id, count in conn.execute(activity)
+    ], combine=_greatest)
+
+
+def _parse_day(value, default):
+    if not value:
+        return default
+    return date.fromisoformat(value)
+
+
+# Start of the period a day falls in; weeks start on Monday
+def _period(day, granularity):
+    return day - timedelta(days=day.weekday()) if granularity == 'week' else day
+
+
+def _as_date(value):
+    # SQLite hands back func.date() results and Date columns read through Core as strings
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+# Note activity over a date range, read from the rollup tables only
+@stats_bp.route('', methods=['GET'])
+@jwt_required()
+@rate_limit
+def get_stats():
+    current_user_id = int(get_jwt_identity())
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+    try:
+        end = _parse_day(request.args.get('to'), datetime.utcnow().date())
+        start = _parse_day(request.args.get('from'), end - timedelta(days=29))
+        contact_id = request.args.get('contact_id', type=int)
+    except ValueError:
+        return jsonify({'error': 'from and to must be dates (YYYY-MM-DD)'}), 400
+    if start > end:
+        return jsonify({'error': 'from must not be after to'}), 400
+    max_days = current_app.config['STATS_MAX_DAYS']
+    if (end - start).days + 1 > max_days:
+        return jsonify({'error': f'Date range is limited to {max_days} days'}), 400
+
+    # Contacts hidden for a background purge no longer count
+    contacts = [Contact.user_id == current_user_id, Contact.deleted_at.is_(None)]
+    if contact_id is not None:
+        if not Contact.active().filter_by(id=contact_id, user_id=current_user_id).first():
+            return jsonify({'error': 'Contact not found'}), 404
+        contacts.append(Contact.id == contact_id)
+
+    rows = db.session.execute(
+        select(NoteActivity.day, func.sum(NoteActivity.notes_created))
+        .join(Contact, Contact.id == NoteActivity.contact_id)
+        .where(NoteActivity.user_id == current_user_id, NoteActivity.day.between(start, end), *contacts)
+        .group_by(NoteActivity.day)
+    ).all()
+    counts = defaultdict(int)
+    for day, created in rows:
+        counts[_period(_as_date(day), granularity)] += int(created or 0)
+
+    contact_count, note_count = db.session.execute(
+        select(func.count(Contact.id), func.coalesce(func.sum(NoteTotal.notes), 0))
+        .select_from(Contact)
+        .outerjoin(NoteTotal, NoteTotal.contact_id == Contact.id)
+        .where(*contacts)
+    ).one()
+
+    # One entry per period in the range, including empty ones
+    series = []
+    period = _period(start, granularity)
+    step = timedelta(days=7 if granularity == 'week' else 1)
+    while period <= end:
+        series.append({'period': period.isoformat(), 'notes_created': counts.get(period, 0)})
+        period += step
+
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'granularity': granularity,
+        'contact_id': contact_id,
+        'totals': {'contacts': contact_count, 'notes': int(note_count)},
+        'activity': series
+    }), 200
+
+
+# CLI command: flask rebuild-stats
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Recompute the note activity rollups from the notes tables."""
+    rebuild_rollups()
+    db.session.commit()
+    click.echo(f'Rebuilt rollups for {db.session.query(func.count(NoteTotal.contact_id)).scalar()} contacts.')
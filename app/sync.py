@@ -0,0 +1,209 @@
+import time
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func, select, text
+
+from app.models import Contact, Note, SyncChange, SyncCompaction, db
+from app.utils import rate_limit
+from app.archive import decompress_body, load_archived_notes
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/sync')
+
+changes_table = SyncChange.__table__
+
+# Advisory lock namespace serializing each user's change-feed writes on Postgres
+SYNC_LOCK_SPACE = 29
+
+# Compaction watermark cached per process so a no-change sync stays a single query
+WATERMARK_TTL = 60
+_watermark = {'value': 0, 'expires': 0}
+
+
+# Write one change row per contact/note touched by a flush (called from after_flush).
+# Each entity keeps only its latest row, so the feed compacts as it is written.
+def record_changes(session):
+    changed = []
+    for obj in session.new:
+        if isinstance(obj, (Contact, Note)):
+            changed.append((obj, False))
+    for obj in session.dirty:
+        if isinstance(obj, (Contact, Note)) and session.is_modified(obj, include_collections=False):
+            # A contact hidden for a background purge is already gone as far as clients know
+            changed.append((obj, isinstance(obj, Contact) and obj.deleted_at is not None))
+    for obj in session.deleted:
+        if isinstance(obj, (Contact, Note)):
+            changed.append((obj, True))
+    if not changed:
+        return
+
+    owners = {obj.id: int(obj.user_id) for obj, _ in changed if isinstance(obj, Contact)}
+    # A contact tombstone covers its notes, so their rows are dropped instead
+    deleted_contacts = {obj.id for obj, deleted in changed if deleted and isinstance(obj, Contact)}
+
+    conn = session.connection()
+    missing = {obj.contact_id for obj, _ in changed if isinstance(obj, Note)} - set(owners)
+    if missing:
+        owners.update(conn.execute(
+            select(Contact.id, Contact.user_id).where(Contact.id.in_(missing))
+        ).all())
+
+    now = datetime.utcnow()
+    rows = []
+    for obj, deleted in changed:
+        if isinstance(obj, Contact):
+            rows.append({'user_id': owners[obj.id], 'entity': 'contact', 'entity_id': obj.id,
+                         'contact_id': obj.id, 'deleted': deleted, 'changed_at': now})
+        elif obj.contact_id not in deleted_contacts and obj.contact_id in owners:
+            rows.append({'user_id': int(owners[obj.contact_id]), 'entity': 'note', 'entity_id': obj.id,
+                         'contact_id': obj.contact_id, 'deleted': deleted, 'changed_at': now})
+
+    if deleted_contacts:
+        conn.execute(changes_table.delete().where(
+            changes_table.c.entity == 'note',
+            changes_table.c.contact_id.in_(deleted_contacts)
+        ))
+    _write_changes(conn, rows)
+
+
+# Record updates made with Core statements, which the after_flush hook does not see
+def record_note_updates(conn, user_id, contact_id, note_ids):
+    now = datetime.utcnow()
+    _write_changes(conn, [{'user_id': int(user_id), 'entity': 'note', 'entity_id': note_id,
+                           'contact_id': contact_id, 'deleted': False, 'changed_at': now}
+                          for note_id in note_ids])
+
+
+# Replace each entity's previous change row with the new one
+def _write_changes(conn, rows):
+    if rows and conn.dialect.name == 'postgresql':
+        _lock_feeds(conn, {row['user_id'] for row in rows})
+    for entity in ('contact', 'note'):
+        ids = [row['entity_id'] for row in rows if row['entity'] == entity]
+        if ids:
+            conn.execute(changes_table.delete().where(
+                changes_table.c.entity == entity,
+                changes_table.c.entity_id.in_(ids)
+            ))
+    if rows:
+        conn.execute(changes_table.insert(), rows)
+
+
+# Postgres numbers rows at INSERT but they become visible at COMMIT, so two writers
+# could commit out of id order and a client syncing in between would step over the
+# lower id. Holding a per-user lock from allocating the id to commit keeps each
+# user's feed in commit order. SQLite already serializes writers.
+def _lock_feeds(conn, user_ids):
+    # Sorted, so transactions touching several users cannot deadlock on each other
+    for user_id in sorted(user_ids):
+        conn.execute(text('SELECT pg_advisory_xact_lock(:space, :user_id)'),
+                     {'space': SYNC_LOCK_SPACE, 'user_id': user_id})
+
+
+# Highest token removed by tombstone compaction; older tokens must resync from 0
+def current_watermark():
+    now = time.monotonic()
+    if now >= _watermark['expires']:
+        _watermark['value'] = db.session.query(func.max(SyncCompaction.watermark)).scalar() or 0
+        _watermark['expires'] = now + WATERMARK_TTL
+    return _watermark['value']
+
+
+def compact_tombstones(retention_days):
+    """
+    Remove tombstones older than the retention window and record the new
+    watermark. Clients holding an older token are told to resync from scratch.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    watermark = db.session.query(func.max(SyncChange.id)).filter(
+        SyncChange.deleted.is_(True),
+        SyncChange.changed_at < cutoff
+    ).scalar()
+    if watermark is None:
+        return 0
+
+    removed = SyncChange.query.filter(
+        SyncChange.deleted.is_(True),
+        SyncChange.id <= watermark
+    ).delete(synchronize_session=False)
+    db.session.add(SyncCompaction(watermark=watermark))
+    db.session.commit()
+    _watermark['expires'] = 0
+    return removed
+
+
+# Return contacts and notes created, updated or deleted since a change token
+@sync_bp.route('', methods=['GET'])
+@jwt_required()
+@rate_limit
+def sync():
+    current_user_id = int(get_jwt_identity())
+    page_size = current_app.config['SYNC_PAGE_SIZE']
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', page_size))
+    except ValueError:
+        return jsonify({'error': 'since and limit must be integers'}), 400
+    if since < 0:
+        return jsonify({'error': 'since must not be negative'}), 400
+    limit = max(1, min(limit, page_size))
+
+    if since and since < current_watermark():
+        return jsonify({'error': 'Sync token expired, resync from 0', 'reset': True}), 410
+
+    # Served by the (user_id, id) index
+    changes = SyncChange.query.filter(
+        SyncChange.user_id == current_user_id,
+        SyncChange.id > since
+    ).order_by(SyncChange.id).limit(limit + 1).all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    result = {
+        'contacts': [],
+        'notes': [],
+        'deleted': {'contacts': [], 'notes': []},
+        'next_token': changes[-1].id if changes else since,
+        'has_more': has_more
+    }
+    live = {'contact': [], 'note': []}
+    for change in changes:
+        if change.deleted:
+            result['deleted'][change.entity + 's'].append(change.entity_id)
+        else:
+            live[change.entity].append(change.entity_id)
+
+    if live['contact']:
+        result['contacts'] = [{
+            'id': contact.id,
+            'name': contact.name,
+            'email': contact.email,
+            'updated_at': (contact.updated_at or datetime.utcnow()).isoformat()
+        } for contact in Contact.query.filter(
+            Contact.id.in_(live['contact']),
+            Contact.user_id == current_user_id,
+            Contact.deleted_at.is_(None)
+        ).order_by(Contact.id)]
+    if live['note']:
+        notes = Note.query.filter(Note.id.in_(live['note'])).order_by(Note.id).all()
+        result['notes'] = [{
+            'id': note.id,
+            'contact_id': note.contact_id,
+            'body': note.body,
+            'created_at': note.created_at.isoformat(),
+            'updated_at': (note.updated_at or note.created_at).isoformat(),
+            'processing_status': note.processing_status
+        } for note in notes]
+        # A client catching up must still get notes archived since they changed
+        missing = set(live['note']) - {note.id for note in notes}
+        result['notes'].extend({
+            'id': note.id,
+            'contact_id': note.contact_id,
+            'body': decompress_body(note.body_compressed),
+            'created_at': note.created_at.isoformat(),
+            'updated_at': (note.updated_at or note.created_at).isoformat(),
+            'processing_status': note.processing_status
+        } for note in load_archived_notes(missing))
+
+    return jsonify(result), 200
@@ -1,52 +1,138 @@
-from app import celery, db
+from flask import current_app
+from app import celery, db, tracing
 from app.models import Note
 import requests
 from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 #Note processing queue
 @celery.task
-def process_note(note_id):
+def process_note(note_id, lane=None):
     """
     Process a note in the background.
     This could include analytics, enrichment, or pushing to external services.
+    Each state transition is stored on the note and published to the owner's event stream.
+    Tasks dispatched by the fair scheduler release their lane slot when done.
     """
+    try:
+        return _process_note(note_id)
+    finally:
+        if lane:
+            from app.scheduling import task_finished
+            task_finished(note_id, lane)
+
+def _process_note(note_id):
     # Context is handled by the ContextTask class in __init__.py
     note = Note.query.get(note_id)
     if note:
+        set_processing_status(note, 'processing')
         try:
             # Call the upstream service with retry
             call_upstream_service(note)
-            # Update the note to mark as processed if needed
-            # note.processed = True
-            # db.session.commit()
+            set_processing_status(note, 'processed')
             return {"status": "success", "note_id": note_id}
         except Exception as e:
             logger.error(f"Error processing note {note_id}: {str(e)}")
+            set_processing_status(note, 'failed')
             return {"status": "error", "note_id": note_id, "error": str(e)}
     return {"status": "error", "note_id": note_id, "error": "Note not found"}
+#Persist a processing state transition and push it to subscribed clients.
+#Background work is not a user edit: a Core UPDATE leaves updated_at alone and
+#skips the session hooks, so the sync feed and the archive cutoff do not see it.
+def set_processing_status(note, status):
+    from app.events import publish_note_status
+    values = {'processing_status': status}
+    if status == 'processed':
+        values['processed_at'] = datetime.utcnow()
+    notes = Note.__table__
+    db.session.execute(
+        notes.update().where(notes.c.id == note.id).values(updated_at=notes.c.updated_at, **values)
+    )
+    db.session.commit()
+    publish_note_status(note, note.contact.user_id)
 #External service call with retry mechanism
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def call_upstream_service(note):
     """
     Call an external service with retry capability.
     """
+    url = f'http://127.0.0.1:5000/contacts/{note.contact_id}/notes'
+    # One span per attempt, so retries show up in the trace
+    attempt = call_upstream_service.retry.statistics.get('attempt_number')
     try:
-        # Simulate calling an external service
-        response = requests.post(
-                f'http://127.0.0.1:5000/contacts/{note.contact_id}/notes',
-                json={
-                    'body': note.body
-                },
-                timeout=3
-            )
-        response.raise_for_status()
-        return response.json()
+        with tracing.trace('POST upstream', 'client', **{'http.url': url, 'http.attempt': attempt}) as span:
+            # Simulate calling an external service
+            # A stable key lets the upstream dedupe tenacity and task retries of the same note
+            response = requests.post(
+                    url,
+                    json={
+                        'body': note.body
+                    },
+                    headers=tracing.inject_headers({'Idempotency-Key': f'process-note-{note.id}'}),
+                    timeout=3
+                )
+            if span is not None:
+                span.set_attribute('http.status_code', response.status_code)
+            response.raise_for_status()
+            return response.json()
     
     except requests.exceptions.Timeout:
         logger.warning(f"Upstream service timeout for note {note.id}")
         raise Exception("Service temporarily unavailable")
     except requests.exceptions.RequestException as e:
         logger.error(f"Error calling upstream service: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+#Periodic sync change-feed compaction
+@celery.task
+def compact_sync_changes():
+    """
+    Drop sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS.
+    """
+    from app.sync import compact_tombstones
+    removed = compact_tombstones(current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS'])
+    return {"status": "success", "removed": removed}
+#Background purge of a large deleted contact
+@celery.task
+def purge_contact(contact_id):
+    """
+    Delete a hidden contact's notes in PURGE_BATCH_SIZE chunks, then the contact.
+    """
+    from app.purge import purge_contact_rows
+    removed = purge_contact_rows(contact_id, current_app.config['PURGE_BATCH_SIZE'])
+    return {"status": "success", "contact_id": contact_id, "notes_removed": removed}
+#Background purge of a deleted account
+@celery.task
+def purge_user(user_id):
+    """
+    Delete every contact and note of a deleted account in chunks, then the user.
+    """
+    from app.purge import purge_user_rows
+    removed = purge_user_rows(user_id, current_app.config['PURGE_BATCH_SIZE'])
+    return {"status": "success", "user_id": user_id, "notes_removed": removed}
+#Periodic hand-off from the per-tenant queues to Celery
+@celery.task
+def dispatch_note_queues():
+    """
+    Dispatch queued notes that no task completion picked up, e.g. after a worker restart.
+    """
+    from app.scheduling import dispatch
+    return {"status": "success", "dispatched": dispatch()}
+#Periodic move of cold notes into the compressed archive
+@celery.task
+def archive_old_notes():
+    """
+    Archive notes not modified for ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE per transaction.
+    """
+    from app.archive import archive_notes
+    archived = archive_notes(current_app.config['ARCHIVE_AFTER_DAYS'], current_app.config['ARCHIVE_BATCH_SIZE'])
+    return {"status": "success", "archived": archived}
+#Periodic write of buffered autosave edits to the notes table
+@celery.task
+def flush_autosaves():
+    """
+    Flush every contact's buffered autosave edits, one transaction per contact.
+    """
+    from app.autosave import flush_all
+    return {"status": "success", "flushed": flush_all()}
@@ -0,0 +1,156 @@
+import logging
+import uuid
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token
+
+from app import auth
+
+logger = logging.getLogger(__name__)
+
+# Claim naming the refresh token family a token was issued from
+FAMILY_CLAIM = 'fam'
+
+# Refresh outcomes
+ROTATED = 'rotated'
+STALE = 'stale'
+REUSED = 'reused'
+UNKNOWN = 'unknown'
+
+
+# Redis key holding the jti of the one refresh token of a family that is still valid
+def family_key(family):
+    return f'refresh:{family}'
+
+
+# The token this family replaced last, accepted without revoking for a short grace period
+def _previous_key(family):
+    return f'refresh:{family}:previous'
+
+
+def _seconds(value):
+    return int(value.total_seconds()) if hasattr(value, 'total_seconds') else int(value)
+
+
+def access_expires():
+    return _seconds(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'])
+
+
+def issue_tokens(user_id):
+    """
+    Issue an access token and a refresh token starting a new family for a
+    login. Without Redis there is nowhere to track rotation, so only the
+    access token is issued and clients log in again when it expires.
+    """
+    family, jti = uuid.uuid4().hex, str(uuid.uuid4())
+    redis = auth.get_redis_client()
+    try:
+        if not redis:
+            raise ConnectionError('Redis is not configured')
+        redis.set(family_key(family), jti, ex=_seconds(current_app.config['JWT_REFRESH_TOKEN_EXPIRES']))
+    except Exception as e:
+        logger.warning(f"Refresh token store unavailable, issuing an access token only: {str(e)}")
+        return {'access_token': create_access_token(identity=str(user_id))}
+    return _token_pair(user_id, family, jti)
+
+
+def _token_pair(user_id, family, jti):
+    claims = {FAMILY_CLAIM: family}
+    return {
+        'access_token': create_access_token(identity=str(user_id), additional_claims=claims),
+        'refresh_token': create_refresh_token(identity=str(user_id), additional_claims={**claims, 'jti': jti})
+    }
+
+
+def rotate(user_id, claims):
+    """
+    Exchange a refresh token for a new access and refresh token. Each refresh
+    token is good for one use: presenting a replaced one again means it was
+    copied, so the whole family is revoked and its owner must log in again.
+    Within REFRESH_TOKEN_REUSE_GRACE seconds of a rotation the replaced token
+    is only refused, so two tabs refreshing at once do not log the user out.
+    Returns (outcome, tokens).
+    """
+    family = claims.get(FAMILY_CLAIM)
+    if not family:
+        return UNKNOWN, None
+    redis = auth.get_redis_client()
+    if not redis:
+        raise ConnectionError('Redis is not configured')
+
+    config = current_app.config
+    key, previous_key = family_key(family), _previous_key(family)
+    new_jti = str(uuid.uuid4())
+    outcome = []
+
+    # WATCH the family so concurrent refreshes with the same token cannot both win
+    def swap(pipe):
+        outcome.clear()
+        current, previous = pipe.get(key), pipe.get(previous_key)
+        current = current.decode() if isinstance(current, bytes) else current
+        previous = previous.decode() if isinstance(previous, bytes) else previous
+        pipe.multi()
+        if current is None:
+            outcome.append(UNKNOWN)
+        elif current == claims['jti']:
+            pipe.set(key, new_jti, ex=_seconds(config['JWT_REFRESH_TOKEN_EXPIRES']))
+            pipe.set(previous_key, claims['jti'], ex=config['REFRESH_TOKEN_REUSE_GRACE'])
+            outcome.append(ROTATED)
+        elif previous == claims['jti']:
+            outcome.append(STALE)
+        else:
+            pipe.delete(key, previous_key)
+            outcome.append(REUSED)
+
+    redis.transaction(swap, key, previous_key)
+    if outcome[0] == REUSED:
+        logger.warning(f"Refresh token reuse detected for user {user_id}; revoking family {family}")
+    if outcome[0] != ROTATED:
+        return outcome[0], None
+    return ROTATED, _token_pair(user_id, family, new_jti)
+
+
+def revoke(claims):
+    """
+    Revoke an access token until it expires, along with the refresh token
+    family it belongs to. Skipped without Redis, like the blocklist check.
+    """
+    redis = auth.get_redis_client()
+    if not redis:
+        return
+    try:
+        with redis.pipeline() as pipe:
+            pipe.setex(claims['jti'], access_expires(), 'revoked')
+            if claims.get(FAMILY_CLAIM):
+                pipe.delete(family_key(claims[FAMILY_CLAIM]), _previous_key(claims[FAMILY_CLAIM]))
+            pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not revoke token {claims['jti']}: {str(e)}")
+
+
+def is_token_revoked(jwt_header, jwt_payload):
+    """
+    Blocklist check for every protected request: an access token is revoked
+    when its jti was logged out or its refresh family was revoked. Refresh
+    tokens are checked by `rotate`. Fails open when Redis is unavailable.
+    """
+    if jwt_payload.get('type') != 'access':
+        return False
+    redis = auth.get_redis_client()
+    if not redis:
+        return False
+    family = jwt_payload.get(FAMILY_CLAIM)
+    try:
+        with redis.pipeline(transaction=False) as pipe:
+            pipe.exists(jwt_payload['jti'])
+            if family:
+                pipe.exists(family_key(family))
+            results = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Token blocklist unavailable, accepting token: {str(e)}")
+        return False
+    return bool(results[0]) or (family is not None and not results[1])
+
+
+def init_tokens(jwt):
+    jwt.token_in_blocklist_loader(is_token_revoked)
@@ -0,0 +1,456 @@
+"""
+Distributed tracing (TRACING_ENABLED=true).
+
+A trace starts at an incoming HTTP request, or continues the one named by its
+W3C `traceparent` header, and follows the work it causes: SQL statements,
+Redis commands, Celery tasks (through a `traceparent` message header, with
+the time spent waiting in the queue) and outgoing HTTP calls, which carry
+the header on to the next service.
+
+Sampling is decided once per trace, at the root: TRACING_SAMPLE_RATE of new
+traces are recorded and an incoming sampled flag is honoured. Unsampled
+requests still pass their trace id on but record nothing. A trace keeps at
+most TRACING_MAX_SPANS spans.
+
+Spans are handed to an exporter one trace at a time when its local root span
+ends. TRACING_EXPORTER is `file` (JSON lines in TRACING_FILE), `log`, or the
+dotted path of a class taking the app config, with export(spans) and
+shutdown() methods.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'
+# Celery message header holding the time a task was published
+PUBLISHED_AT_HEADER = 'trace_published_at'
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_current = contextvars.ContextVar('trace_span', default=None)
+_tracer = None
+_celery_instrumented = False
+# Publish spans by task id, from before_task_publish until the broker has the message
+_publishing = {}
+
+
+def _new_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class SpanContext:
+    """Identifies a span in another process, as carried by a traceparent header."""
+
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class Span:
+    def __init__(self, name, kind, trace_id, parent_id, sampled, root=None, start=None, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start = start if start is not None else time.time()
+        self.attributes = dict(attributes or {})
+        self.error = None
+        # Spans of the trace finished in this process, exported together with their root
+        self.root = root or self
+        if root is None:
+            self.finished = []
+            self.dropped = 0
+            self.exported = False
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None, end=None):
+        if not self.sampled or _tracer is None:
+            return
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}' if isinstance(error, BaseException) else str(error)
+        self.duration_ms = round(((end if end is not None else time.time()) - self.start) * 1000, 3)
+        _tracer.finish(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start': self.start,
+            'duration_ms': self.duration_ms,
+            'status': 'error' if self.error else 'ok',
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class Tracer:
+    def __init__(self, exporter, sample_rate=1.0, max_spans=1000):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.max_spans = max_spans
+
+    def start(self, name, kind='internal', parent=None, start=None, attributes=None):
+        """
+        Start a span under `parent` (a Span, a SpanContext from another process,
+        or None for a new trace). New traces are sampled at TRACING_SAMPLE_RATE.
+        """
+        if isinstance(parent, Span):
+            return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled,
+                        root=parent.root, start=start, attributes=attributes)
+        if isinstance(parent, SpanContext):
+            return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled,
+                        start=start, attributes=attributes)
+        return Span(name, kind, _new_id(128), None, random.random() < self.sample_rate,
+                    start=start, attributes=attributes)
+
+    def finish(self, span):
+        root = span.root
+        if span is not root:
+            if root.exported:
+                # Outlived its root (e.g. a task run on another thread): export on its own
+                self._export([span])
+            elif len(root.finished) < self.max_spans - 1:
+                root.finished.append(span)
+            else:
+                root.dropped += 1
+            return
+        if root.dropped:
+            root.attributes['dropped_spans'] = root.dropped
+        root.exported = True
+        self._export(root.finished + [root])
+
+    def _export(self, spans):
+        try:
+            self.exporter.export([span.to_dict() for span in spans])
+        except Exception as e:
+            logger.warning(f"Could not export {len(spans)} spans: {str(e)}")
+
+
+class FileExporter:
+    """Appends spans to a file as JSON lines, one write per trace."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def export(self, spans):
+        data = ''.join(json.dumps(span, default=str) + '\n' for span in spans)
+        with self._lock:
+            # A forked worker opens its own handle instead of sharing the master's buffer
+            if self._file is None or self._pid != os.getpid():
+                self._file = open(self.path, 'a', encoding='utf-8')
+                self._pid = os.getpid()
+            self._file.write(data)
+            self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class LogExporter:
+    """Writes each span to the `app.tracing` logger."""
+
+    def export(self, spans):
+        for span in spans:
+            logger.info(json.dumps(span, default=str))
+
+    def shutdown(self):
+        pass
+
+
+def create_exporter(config):
+    name = config.get('TRACING_EXPORTER', 'file')
+    if name == 'file':
+        return FileExporter(config.get('TRACING_FILE', 'traces.jsonl'))
+    if name == 'log':
+        return LogExporter()
+    module, _, attribute = name.replace(':', '.').rpartition('.')
+    return getattr(import_module(module), attribute)(config)
+
+
+def init_tracing(app):
+    """Set up the process tracer from the app config and trace its requests."""
+    global _tracer
+    shutdown_tracing()
+    if not app.config.get('TRACING_ENABLED'):
+        return
+    _tracer = Tracer(create_exporter(app.config),
+                     sample_rate=app.config.get('TRACING_SAMPLE_RATE', 1.0),
+                     max_spans=app.config.get('TRACING_MAX_SPANS', 1000))
+    from app import db
+    instrument_sql(db.get_engine(app))
+    app.before_request(_start_request_span)
+    app.after_request(_finish_request_span)
+    app.teardown_request(_end_request_span)
+
+
+def shutdown_tracing():
+    global _tracer
+    if _tracer is not None:
+        _tracer.exporter.shutdown()
+        _tracer = None
+
+
+def enabled():
+    return _tracer is not None
+
+
+def current_span():
+    return _current.get()
+
+
+def propagate(func):
+    """
+    Wrap func to run under the current span in another thread. Only the span
+    goes along: copying the whole context would share Flask's contexts too.
+    """
+    span = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(span)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+def parse_traceparent(value):
+    match = _TRACEPARENT.match((value or '').strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+
+# Headers carrying the current trace to another service or task
+def inject_headers(headers=None):
+    headers = dict(headers or {})
+    span = _current.get()
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.traceparent
+    return headers
+
+
+def start_span(name, kind='internal', parent=None, start=None, **attributes):
+    """
+    Start a span as the current one and return (span, token); pass the token
+    to end_span. Returns (None, None) when tracing is off.
+    """
+    if _tracer is None:
+        return None, None
+    span = _tracer.start(name, kind, parent if parent is not None else _current.get(), start, attributes)
+    return span, _current.set(span)
+
+
+def end_span(span, token, error=None):
+    if span is None:
+        return
+    _current.reset(token)
+    span.end(error)
+
+
+@contextmanager
+def trace(name, kind='internal', **attributes):
+    """Record the enclosed block as a span when a sampled trace is active."""
+    parent = _current.get()
+    if _tracer is None or parent is None or not parent.sampled:
+        yield None
+        return
+    span, token = start_span(name, kind, parent, **attributes)
+    try:
+        yield span
+    except BaseException as e:
+        end_span(span, token, e)
+        raise
+    end_span(span, token)
+
+
+# Requests: one server span each, continuing the caller's trace when it sent one
+
+def _start_request_span():
+    from flask import g, request
+    route = request.url_rule.rule if request.url_rule else request.path
+    g.trace_span, g.trace_token = start_span(
+        f'{request.method} {route}', 'server', parse_traceparent(request.headers.get(TRACEPARENT_HEADER)),
+        **{'http.method': request.method, 'http.route': route}
+    )
+
+
+def _finish_request_span(response):
+    from flask import g
+    span = g.get('trace_span')
+    if span is not None:
+        span.set_attribute('http.status_code', response.status_code)
+        response.headers[TRACEPARENT_HEADER] = span.traceparent
+    return response
+
+
+def _end_request_span(error=None):
+    from flask import g
+    span = g.pop('trace_span', None)
+    end_span(span, g.pop('trace_token', None), error)
+
+
+# SQL: a span per statement, from engine events
+
+def instrument_sql(engine):
+    """Trace the statements of one engine; others (e.g. seed workers') are left alone."""
+    from sqlalchemy import event
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_sql_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if _tracer is None or parent is None or not parent.sampled:
+        return
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'SQL'
+    span = _tracer.start(f'SQL {verb}', 'client', parent, attributes={
+        'db.system': conn.dialect.name,
+        'db.statement': statement[:500],
+        'db.executemany': executemany,
+    })
+    conn.info.setdefault('trace_spans', []).append(span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('trace_spans')
+    if spans:
+        span = spans.pop()
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute('db.rowcount', cursor.rowcount)
+        span.end()
+
+
+def _handle_sql_error(context):
+    spans = context.connection.info.get('trace_spans') if context.connection is not None else None
+    if spans:
+        spans.pop().end(context.original_exception)
+
+
+# Redis: a span per command or pipeline of the given client
+
+def instrument_redis(client):
+    """Trace the commands and pipelines of a redis-py client."""
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    def traced_execute_command(*args, **options):
+        with trace(f'redis {args[0]}', 'client', **{'db.system': 'redis'}):
+            return execute_command(*args, **options)
+
+    def traced_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def traced_execute(*execute_args, **execute_kwargs):
+            commands = [command[0][0] for command in pipe.command_stack]
+            with trace('redis pipeline', 'client', **{'db.system': 'redis', 'db.commands': commands[:20]}):
+                return execute(*execute_args, **execute_kwargs)
+
+        pipe.execute = traced_execute
+        return pipe
+
+    client.execute_command = traced_execute_command
+    client.pipeline = traced_pipeline
+    return client
+
+
+# Celery: the publisher adds the trace to the message headers, the worker continues it
+
+def instrument_celery():
+    global _celery_instrumented
+    if _celery_instrumented:
+        return
+    from celery import signals
+    signals.before_task_publish.connect(_before_task_publish, weak=False)
+    signals.after_task_publish.connect(_after_task_publish, weak=False)
+    signals.task_prerun.connect(_task_prerun, weak=False)
+    signals.task_postrun.connect(_task_postrun, weak=False)
+    _celery_instrumented = True
+
+
+def _before_task_publish(sender=None, headers=None, **kwargs):
+    parent = _current.get()
+    if _tracer is None or parent is None or headers is None:
+        return
+    span = parent
+    if parent.sampled:
+        span = _tracer.start(f'publish {sender}', 'producer', parent, attributes={'celery.task_id': headers.get('id')})
+        _publishing[headers.get('id')] = span
+    headers[TRACEPARENT_HEADER] = span.traceparent
+    headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+def _after_task_publish(sender=None, headers=None, **kwargs):
+    end_publish_span((headers or {}).get('id'))
+
+
+def end_publish_span(task_id, error=None):
+    """End the publish span of a task, if still open; a failed publish never reaches after_task_publish."""
+    span = _publishing.pop(task_id, None)
+    if span is not None:
+        span.end(error)
+
+
+# Custom message headers show up on the task request, or under its headers on some paths
+def _request_header(request, name):
+    return request.get(name) or (request.get('headers') or {}).get(name)
+
+
+def _task_prerun(task_id=None, task=None, **kwargs):
+    if _tracer is None:
+        return
+    request = task.request
+    # Tasks from the broker continue the publisher's trace, eager and embedded tasks
+    # the caller's span; the rest (e.g. periodic jobs) start a trace of their own
+    parent = parse_traceparent(_request_header(request, TRACEPARENT_HEADER)) or _current.get()
+    started = time.time()
+    published_at = _request_header(request, PUBLISHED_AT_HEADER)
+    span, token = start_span(f'task {task.name}', 'consumer', parent, **{
+        'celery.task_id': task_id,
+        'celery.retries': request.retries or 0,
+    })
+    if published_at:
+        span.set_attribute('celery.queue_wait_ms', round((started - float(published_at)) * 1000, 3))
+        if span.sampled:
+            _tracer.start('queue wait', 'internal', span, start=float(published_at)).end(end=started)
+    request.trace_span, request.trace_token = span, token
+
+
+def _task_postrun(task=None, state=None, retval=None, **kwargs):
+    span = getattr(task.request, 'trace_span', None)
+    if span is None:
+        return
+    span.set_attribute('celery.state', state)
+    end_span(span, task.request.trace_token, retval if isinstance(retval, BaseException) else None)
+    task.request.trace_span = None
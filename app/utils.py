@@ -1,7 +1,5 @@
-from flask import jsonify, current_app
+from flask import jsonify, current_app, g
 from functools import wraps
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 
 # We'll initialize limiter in create_app, here we just define it
 limiter = None
@@ -9,6 +7,9 @@ limiter = None
 # Initialize rate limiting for the application
 def initialize_limiter(app):
     global limiter
+    from flask_limiter import Limiter
+    from flask_limiter.util import get_remote_address
+
     limiter = Limiter(
         app,
         key_func=get_remote_address,
@@ -27,6 +28,41 @@ def rate_limit(func):
         return func(*args, **kwargs)
     return wrapper
 
+# Run a side effect (e.g. queueing a task) once the current transaction has committed.
+# commit_operation and /batch collect these and run them after their commit.
+def after_commit(callback):
+    pending = g.get('after_commit_callbacks')
+    if pending is None:
+        callback()
+    else:
+        pending.append(callback)
+
+# Run a contact or note operation (see app.contacts) as a whole request: commit it
+# if it succeeded or roll it back. Returns (body, status, callbacks), where
+# callbacks are the side effects it deferred, for the caller to run.
+def apply_operation(operation, *args, **kwargs):
+    from app import db
+    g.after_commit_callbacks = []
+    try:
+        body, status = operation(*args, **kwargs)
+        if status < 400:
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        callbacks = g.pop('after_commit_callbacks')
+    return body, status, callbacks if status < 400 else []
+
+# Run an operation for a Flask view and return the view's response
+def commit_operation(operation, *args):
+    body, status, callbacks = apply_operation(operation, *args)
+    for callback in callbacks:
+        callback()
+    return jsonify(body), status
+
 # Standardize note data format from different input fields
 def normalize_note_data(data):
     if not data:
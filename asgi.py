@@ -0,0 +1,4 @@
+from app.asgi import create_asgi_app
+
+# ASGI entrypoint: uvicorn asgi:application --workers 2
+application = create_asgi_app()
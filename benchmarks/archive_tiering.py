@@ -0,0 +1,111 @@
+"""
+Compare hot-table size and note read latency before and after archiving
+cold notes into the compressed notes_archive table.
+
+    python benchmarks/archive_tiering.py --users 2000 --archive-after-days 180
+
+A temporary SQLite database is seeded with `flask seed`'s generator, whose
+note ages are exponential over a two-year history. Latency is the median of
+listing one contact's live notes and of fetching single recent notes by id,
+measured on the same random sample before and after `archive_notes` runs.
+Table sizes come from SQLite's dbstat virtual table after a VACUUM.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def table_mb(db, *names):
+    from sqlalchemy import text
+    total = 0
+    for name in names:
+        total += db.session.execute(
+            text('SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name = :name'), {'name': name}
+        ).scalar()
+    return total / (1024 * 1024)
+
+
+def median_ms(samples, run):
+    timings = []
+    for sample in samples:
+        started = time.perf_counter()
+        run(sample)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def measure(db, contact_ids, note_ids):
+    from app.models import Note
+    list_ms = median_ms(contact_ids, lambda contact_id: Note.query.filter_by(contact_id=contact_id).all())
+    get_ms = median_ms(note_ids, lambda note_id: Note.query.get(note_id))
+    db.session.remove()
+    return {
+        'rows': Note.query.count(),
+        'hot_mb': table_mb(db, 'notes', 'ix_notes_contact_id'),
+        'archive_mb': table_mb(db, 'notes_archive', 'ix_notes_archive_contact_id'),
+        'list_ms': list_ms,
+        'get_ms': get_ms
+    }
+
+
+def vacuum(db):
+    db.session.remove()
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('VACUUM')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--contacts-per-user', type=int, default=10)
+    parser.add_argument('--notes-per-contact', type=int, default=20)
+    parser.add_argument('--archive-after-days', type=int, default=180)
+    parser.add_argument('--samples', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                           'FLASK_ENV': 'development'})
+        from app import create_app, db
+        from app.archive import archive_notes
+        from app.models import Contact, Note
+        from app.seed import seed_data
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            totals = seed_data(args.users, args.contacts_per_user, args.notes_per_contact)
+            print(f"seeded {totals['notes']} notes for {totals['contacts']} contacts")
+
+            rng = random.Random(7)
+            contact_ids = rng.sample([row[0] for row in db.session.query(Contact.id)],
+                                     min(args.samples, totals['contacts']))
+            # Recent notes are the ones that stay hot
+            recent = [row[0] for row in db.session.query(Note.id).order_by(Note.created_at.desc())
+                      .limit(args.samples * 10)]
+            note_ids = rng.sample(recent, min(args.samples, len(recent)))
+
+            vacuum(db)
+            before = measure(db, contact_ids, note_ids)
+            started = time.perf_counter()
+            archived = archive_notes(args.archive_after_days, app.config['ARCHIVE_BATCH_SIZE'])
+            seconds = time.perf_counter() - started
+            vacuum(db)
+            after = measure(db, contact_ids, note_ids)
+
+        print(f'archived {archived} notes in {seconds:.1f}s')
+        print(f"{'':<8}{'hot rows':>10}{'hot MB':>9}{'archive MB':>12}{'list ms':>9}{'get ms':>8}")
+        for label, result in (('before', before), ('after', after)):
+            print(f"{label:<8}{result['rows']:>10}{result['hot_mb']:>9.1f}{result['archive_mb']:>12.1f}"
+                  f"{result['list_ms']:>9.3f}{result['get_ms']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
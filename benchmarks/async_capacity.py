@@ -0,0 +1,161 @@
+"""
+Compare concurrent-connection capacity per GB of RAM for the threaded WSGI
+server and the ASGI serving mode.
+
+    python benchmarks/async_capacity.py --connections 50 200 500 --duration 10
+
+Each mode is started as a subprocess against a temporary SQLite database.
+Every client connection is kept alive and repeatedly fetches one contact's
+notes. Peak resident memory of the server process is sampled from /proc.
+Non-200 responses (e.g. 429 from the per-address rate limit) are reported
+separately from connection errors.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SERVERS = {
+    'wsgi': [sys.executable, '-c',
+             'from werkzeug.serving import run_simple; from app import create_app; '
+             'run_simple("127.0.0.1", {port}, create_app(), threaded=True)'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application',
+             '--port', '{port}', '--log-level', 'warning', '--no-access-log'],
+}
+
+
+def prepare_database(path):
+    os.environ.update({'DATABASE_URL': f'sqlite:///{path}', 'JWT_SECRET_KEY': 'benchmark-secret',
+                       'FLASK_ENV': 'development'})
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db
+    from app.models import User, Contact, Note
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        contact = Contact(user_id=user.id, name='Bench Contact')
+        db.session.add(contact)
+        db.session.commit()
+        db.session.add_all(Note(contact_id=contact.id, body=f'note {i}') for i in range(20))
+        db.session.commit()
+        return create_access_token(identity=str(user.id)), contact.id
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return 0.0
+
+
+async def client(port, request, deadline, counts):
+    reader = writer = None
+    try:
+        while time.monotonic() < deadline:
+            # Servers that close after each response (HTTP/1.0) get a fresh connection
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            await writer.drain()
+            headers = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            keep_alive = headers.startswith(b'HTTP/1.1')
+            for line in headers.split(b'\r\n'):
+                name, _, value = line.partition(b':')
+                if name.lower() == b'content-length':
+                    length = int(value)
+                elif name.lower() == b'connection':
+                    keep_alive = value.strip().lower() == b'keep-alive'
+            await reader.readexactly(length)
+            counts[0 if headers.split(b' ')[1] == b'200' else 1] += 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+    except (asyncio.IncompleteReadError, ConnectionError):
+        counts[2] += 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def load(port, request, connections, duration, pid):
+    counts = [0, 0, 0]
+    peak = [rss_mb(pid)]
+
+    async def sample():
+        while True:
+            peak[0] = max(peak[0], rss_mb(pid))
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample())
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(client(port, request, deadline, counts) for _ in range(connections)),
+                         return_exceptions=True)
+    sampler.cancel()
+    return counts, peak[0]
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--connections', type=int, nargs='+', default=[50, 200, 500])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--modes', nargs='+', default=list(SERVERS), choices=list(SERVERS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token, contact_id = prepare_database(os.path.join(tmp, 'bench.db'))
+        request = (f'GET /contacts/{contact_id}/notes HTTP/1.1\r\nHost: localhost\r\n'
+                   f'Authorization: Bearer {token}\r\n\r\n').encode()
+
+        print(f"{'mode':<6}{'conns':>7}{'ok/s':>8}{'non-200':>9}{'errors':>8}{'peak MB':>10}{'conns/GB':>10}")
+        for mode in args.modes:
+            for connections in args.connections:
+                port = free_port()
+                command = [part.format(port=port) for part in SERVERS[mode]]
+                server = subprocess.Popen(command, cwd=ROOT, env={**os.environ, 'RATE_LIMIT': '1000000 per minute'},
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                try:
+                    wait_for_port(port)
+                    (done, rejected, errors), peak = asyncio.run(load(port, request, connections, args.duration, server.pid))
+                finally:
+                    server.terminate()
+                    server.wait()
+                per_gb = connections / (peak / 1024) if peak else 0
+                print(f'{mode:<6}{connections:>7}{done / args.duration:>8.0f}{rejected:>9}{errors:>8}'
+                      f'{peak:>10.1f}{per_gb:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Report the bandwidth and CPU tradeoff of response compression levels.
+
+    python benchmarks/compression_levels.py --notes 10 100 1000
+
+Payloads are note lists shaped like GET /contacts/<id>/notes, with bodies
+drawn from the seeder's word corpus and log-normal lengths, plus the
+Swagger document. For each gzip level and brotli quality the table shows
+the compressed size, the ratio, and the median time to compress one
+response, which is CPU spent by a web worker on every request.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.compression import brotli, compress  # noqa: E402
+from app.seed import build_corpus, note_length  # noqa: E402
+
+LEVELS = [('gzip', level) for level in (1, 6, 9)]
+if brotli:
+    LEVELS += [('br', quality) for quality in (1, 4, 6, 9, 11)]
+
+
+def note_list(rng, corpus, count):
+    now = datetime.utcnow()
+    notes = []
+    for i in range(count):
+        length = note_length(rng)
+        start = rng.randrange(0, len(corpus) - length) if length < len(corpus) else 0
+        notes.append({
+            'id': i + 1,
+            'body': corpus[start:start + length],
+            'created_at': (now - timedelta(minutes=rng.randrange(500000))).isoformat()
+        })
+    return json.dumps(notes).encode()
+
+
+def median_ms(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--notes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    corpus = build_corpus(rng)
+    payloads = [(f'{count} notes', note_list(rng, corpus, count)) for count in args.notes]
+    with open(os.path.join(ROOT, 'app', 'static', 'swagger.json')) as f:
+        payloads.append(('swagger', json.dumps(json.load(f), separators=(',', ':')).encode()))
+    if not brotli:
+        print('brotli is not installed; showing gzip only')
+
+    print(f"{'payload':<12}{'bytes':>9}{'encoding':>10}{'level':>6}{'out bytes':>11}{'ratio':>7}{'ms':>9}{'MB/s':>8}")
+    for name, data in payloads:
+        for encoding, level in LEVELS:
+            out = compress(data, encoding, level)
+            ms = median_ms(lambda: compress(data, encoding, level), args.repeat)
+            throughput = len(data) / (1024 * 1024) / (ms / 1000) if ms else 0
+            print(f'{name:<12}{len(data):>9}{encoding:>10}{level:>6}{len(out):>11}'
+                  f'{len(data) / len(out):>7.2f}{ms:>9.3f}{throughput:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
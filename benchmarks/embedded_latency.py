@@ -0,0 +1,133 @@
+"""
+Compare per-request latency in embedded mode (in-process stores and task
+pool) with the networked setup (Redis server and Celery broker).
+
+    python benchmarks/embedded_latency.py --redis-url redis://localhost:6379/0
+
+Each request goes through the Flask test client against a SQLite database
+in a temporary directory, so the difference between the two columns is the
+cost of the Redis round trips a request makes: the token blocklist check,
+the ownership cache, the fair scheduler and the Celery broker when a note is
+created. Notes are processed with the upstream call stubbed out; in embedded
+mode the benchmark waits (untimed) for each note's task before the next
+request, since SQLite lets only one thread write at a time. Without
+--redis-url (or when it is unreachable) only embedded mode is measured.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def redis_reachable(url):
+    import redis
+    try:
+        return redis.from_url(url, socket_connect_timeout=1).ping()
+    except redis.exceptions.RedisError:
+        return False
+
+
+def measure(embedded, redis_url, requests, workdir):
+    from app import auth, create_app, db, embedded as embedded_mode, get_celery
+    from app.auth import get_password_hasher
+    from app.config import TestingConfig
+    from app.models import Contact, Note, User
+
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'embedded' if embedded else 'networked')}.db"
+        RATELIMIT_ENABLED = False
+        # Every note is handed to Celery (or the task pool) straight away
+        SCHEDULER_INTERACTIVE_IN_FLIGHT = requests + 1
+        EMBEDDED_MODE = embedded
+        REDIS_URL = redis_url
+        CELERY_BROKER_URL = redis_url
+        CELERY_RESULT_BACKEND = redis_url
+
+    auth.redis_client = None
+    embedded_mode.reset()
+    app = create_app(BenchmarkConfig)
+    get_celery()
+    timings = {}
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', password_hash=get_password_hasher().hash('benchpass'))
+        db.session.add(user)
+        db.session.flush()
+        contact = Contact(user_id=user.id, name='Bench', email='bench@example.com')
+        db.session.add(contact)
+        db.session.commit()
+        contact_id = contact.id
+
+    # Requests run outside an app context so each one opens and closes its own, as in production
+    client = app.test_client()
+    token = client.post('/auth/login', json={'username': 'bench', 'password': 'benchpass'}).get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    created = []
+
+    def create_note():
+        response = client.post(f'/contacts/{contact_id}/notes', json={'body': 'Benchmark note'}, headers=headers)
+        created.append(response.get_json()['id'])
+        return response
+
+    def wait_for_task():
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with app.app_context():
+                if db.session.get(Note, created[-1]).processing_status not in ('pending', 'processing'):
+                    return
+            time.sleep(0.001)
+
+    endpoints = [
+        ('GET /contacts', lambda: client.get('/contacts', headers=headers)),
+        ('POST note', create_note),
+        ('GET note', lambda: client.get(f'/contacts/{contact_id}/notes/{created[-1]}', headers=headers)),
+        ('GET notes', lambda: client.get(f'/contacts/{contact_id}/notes', headers=headers)),
+    ]
+    with patch('app.tasks.call_upstream_service'):
+        for name, run in endpoints:
+            samples = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = run()
+                samples.append((time.perf_counter() - started) * 1000)
+                assert response.status_code < 300, response.get_json()
+                if embedded and run is create_note:
+                    wait_for_task()
+            samples.sort()
+            timings[name] = (statistics.median(samples), samples[int(len(samples) * 0.95) - 1])
+
+    embedded_mode.reset()
+    with app.app_context():
+        db.drop_all()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=300, help='Requests per endpoint.')
+    parser.add_argument('--redis-url', default=None)
+    args = parser.parse_args()
+
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-of-32-bytes!')
+    with tempfile.TemporaryDirectory() as workdir:
+        results = {'embedded': measure(True, 'redis://unused:6379/0', args.requests, workdir)}
+        if args.redis_url and redis_reachable(args.redis_url):
+            results['networked'] = measure(False, args.redis_url, args.requests, workdir)
+        elif args.redis_url:
+            print(f'Redis at {args.redis_url} is unreachable; measuring embedded mode only\n')
+
+    modes = list(results)
+    print(f"{'ms per request':<16}" + ''.join(f'{mode + " p50":>16}{mode + " p95":>16}' for mode in modes))
+    for name in results['embedded']:
+        print(f'{name:<16}' + ''.join(f'{results[mode][name][0]:>16.2f}{results[mode][name][1]:>16.2f}'
+                                      for mode in modes))
+
+
+if __name__ == '__main__':
+    main()
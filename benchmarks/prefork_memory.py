@@ -0,0 +1,132 @@
+"""
+Measure memory per worker for the gunicorn production server with and
+without preloading the app in the master.
+
+    python benchmarks/prefork_memory.py --workers 4 --requests 200
+
+Each mode starts `gunicorn -c gunicorn.conf.py wsgi:app` against a temporary
+SQLite database and warms every worker with a mix of login, contact and note
+requests. Memory is read from /proc/<pid>/smaps_rollup (Linux only): RSS
+counts shared pages in full, PSS splits them between the processes sharing
+them, and USS is memory private to the worker, i.e. what one more worker costs.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.async_capacity import free_port, wait_for_port  # noqa: E402
+
+
+def prepare_database(path):
+    os.environ.update({'DATABASE_URL': f'sqlite:///{path}', 'JWT_SECRET_KEY': 'benchmark-secret',
+                       'FLASK_ENV': 'development'})
+    from app import create_app, db
+    from app.models import User
+    from argon2 import PasswordHasher
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='bench', password_hash=PasswordHasher().hash('benchpass')))
+        db.session.commit()
+
+
+def memory_kb(pid):
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    }
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name is in parentheses and may contain spaces
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (FileNotFoundError, ProcessLookupError, IndexError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return found
+
+
+# Responses such as 429 from the per-address rate limit still exercise the worker
+def call(port, method, path, body=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return {'status': e.code}
+
+
+def warm(port, requests):
+    token = call(port, 'POST', '/auth/login', {'username': 'bench', 'password': 'benchpass'})['access_token']
+    contact = call(port, 'POST', '/contacts', {'name': 'Bench Contact'}, token)
+    for i in range(requests):
+        call(port, 'GET', '/contacts', token=token)
+        call(port, 'GET', f"/contacts/{contact['id']}/notes", token=token)
+        if i % 10 == 0:
+            call(port, 'POST', '/auth/login', {'username': 'bench', 'password': 'benchpass'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'preload':<9}{'workers':>8}{'RSS MB':>9}{'PSS MB':>9}{'USS MB':>9}{'total PSS MB':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_database(os.path.join(tmp, 'bench.db'))
+        for preload in ('false', 'true'):
+            port = free_port()
+            env = {**os.environ, 'WEB_BIND': f'127.0.0.1:{port}', 'WEB_WORKERS': str(args.workers),
+                   'WEB_PRELOAD': preload, 'RATE_LIMIT': '1000000 per minute'}
+            server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                       '--access-logfile', '/dev/null', 'wsgi:app'],
+                                      cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_for_port(port)
+                # Connections are spread over the workers by the kernel
+                warm(port, args.requests * args.workers)
+                time.sleep(1)
+                workers = [memory_kb(pid) for pid in children(server.pid)]
+                master = memory_kb(server.pid)
+            finally:
+                server.terminate()
+                server.wait()
+
+            count = len(workers) or 1
+            average = {key: sum(w[key] for w in workers) / count / 1024 for key in ('rss', 'pss', 'uss')}
+            total_pss = (sum(w['pss'] for w in workers) + master['pss']) / 1024
+            print(f"{preload:<9}{len(workers):>8}{average['rss']:>9.1f}{average['pss']:>9.1f}"
+                  f"{average['uss']:>9.1f}{total_pss:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
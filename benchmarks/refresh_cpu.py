@@ -0,0 +1,107 @@
+"""
+Quantify the web worker CPU saved by renewing access tokens with refresh
+tokens instead of repeating the Argon2 login.
+
+    python benchmarks/refresh_cpu.py --clients 10000 --active-hours 8
+
+CPU time (time.process_time) is measured per request through the Flask
+test client for POST /auth/login and POST /auth/refresh, against an
+in-memory SQLite database. Refresh tokens are stored in the Redis at
+--redis-url when given, otherwise in an in-process fakeredis, which costs
+more CPU than a network round trip and so understates the saving.
+
+The daily total compares clients that log in again every time a 1-hour
+access token expires with clients that refresh a JWT_ACCESS_TOKEN_EXPIRES
+token and log in once per JWT_REFRESH_TOKEN_EXPIRES.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def cpu_ms(samples, run):
+    timings = []
+    for _ in range(samples):
+        started = time.process_time()
+        run()
+        timings.append((time.process_time() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--active-hours', type=float, default=8, help='Hours per day each client is in use.')
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--redis-url', default=None)
+    args = parser.parse_args()
+
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-of-32-bytes!')
+    from app import create_app, db
+    from app.config import TestingConfig
+    from app.models import User
+    from app.auth import get_password_hasher
+
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+        RATELIMIT_ENABLED = False
+
+    if args.redis_url:
+        import redis
+        store = redis.from_url(args.redis_url)
+    else:
+        import fakeredis
+        store = fakeredis.FakeRedis()
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context(), patch('app.auth.get_redis_client', return_value=store):
+        db.create_all()
+        db.session.add(User(username='bench', password_hash=get_password_hasher().hash('benchpass')))
+        db.session.commit()
+        client = app.test_client()
+        credentials = {'username': 'bench', 'password': 'benchpass'}
+
+        def login():
+            response = client.post('/auth/login', json=credentials)
+            assert response.status_code == 200, response.get_json()
+            return response.get_json()
+
+        tokens = login()
+        if 'refresh_token' not in tokens:
+            sys.exit('No refresh token issued; is Redis reachable?')
+
+        def refresh():
+            response = client.post('/auth/refresh', headers={'Authorization': f"Bearer {tokens['refresh_token']}"})
+            assert response.status_code == 200, response.get_json()
+            tokens.update(response.get_json())
+
+        login_ms = cpu_ms(args.samples, login)
+        refresh_ms = cpu_ms(args.samples, refresh)
+        access_minutes = app.config['JWT_ACCESS_TOKEN_EXPIRES'] / 60
+        refresh_days = app.config['JWT_REFRESH_TOKEN_EXPIRES'] / 86400
+
+    print(f'login   {login_ms:8.2f} ms CPU per request (Argon2 verify)')
+    print(f'refresh {refresh_ms:8.2f} ms CPU per request ({login_ms / refresh_ms:.0f}x cheaper)')
+    print()
+
+    hourly_logins = args.clients * args.active_hours
+    before = hourly_logins * login_ms / 1000
+    refreshes = args.clients * args.active_hours * 60 / access_minutes
+    logins = args.clients / refresh_days
+    after = (refreshes * refresh_ms + logins * login_ms) / 1000
+    label = f'{args.clients} clients active {args.active_hours:g} h/day'
+    print(f"{label:<40}{'requests/day':>14}{'CPU s/day':>12}")
+    print(f"{'hourly re-login (1 h tokens)':<40}{hourly_logins:>14.0f}{before:>12.0f}")
+    print(f"{f'refresh ({access_minutes:g} min tokens)':<40}{refreshes + logins:>14.0f}{after:>12.0f}")
+    print(f'CPU saved: {before - after:.0f} s/day ({(before - after) / before:.0%}), '
+          f'{(before - after) / args.active_hours / 3600:.2f} cores while clients are active')
+
+
+if __name__ == '__main__':
+    main()
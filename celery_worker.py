@@ -1,5 +1,5 @@
-from app import create_app, make_celery
+from app import create_worker_app, make_celery
 
-# Create the Flask app and initialize Celery
-flask_app = create_app()
+# Create a slim Flask app (config and database only) and initialize Celery
+flask_app = create_worker_app()
 celery = make_celery(flask_app)
@@ -0,0 +1,36 @@
+# Production WSGI server: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is imported once in the master and workers are forked from it, so
+# code and data loaded before the fork are shared copy-on-write. Each worker
+# then opens its own database and Redis connections (see post_fork).
+from app.config import BaseConfig
+from app.serving import worker_count, warm_master, reset_after_fork
+
+bind = BaseConfig.WEB_BIND
+preload_app = BaseConfig.WEB_PRELOAD
+workers = worker_count(BaseConfig.WEB_WORKERS, BaseConfig.WEB_MAX_WORKERS)
+# Embedded mode keeps Redis data, tasks and rate limits in the worker process,
+# so one worker (with threads) holds all of it and is never recycled
+if BaseConfig.EMBEDDED_MODE:
+    workers = 1
+# Threads let one worker serve several slow requests (and SSE streams) at once
+threads = BaseConfig.WEB_THREADS
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = BaseConfig.WEB_TIMEOUT
+# Workers get this long to finish in-flight requests on reload or shutdown
+graceful_timeout = BaseConfig.WEB_GRACEFUL_TIMEOUT
+# Recycle workers now and then, staggered so they do not all restart at once
+max_requests = 0 if BaseConfig.EMBEDDED_MODE else BaseConfig.WEB_MAX_REQUESTS
+max_requests_jitter = max(1, max_requests // 10) if max_requests else 0
+accesslog = '-'
+
+
+def when_ready(server):
+    if preload_app:
+        warm_master()
+    server.log.info(f'Serving with {workers} workers x {threads} threads (preload={preload_app})')
+
+
+def post_fork(server, worker):
+    if preload_app:
+        reset_after_fork(server.app.wsgi())
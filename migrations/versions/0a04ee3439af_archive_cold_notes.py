@@ -0,0 +1,50 @@
+"""Archive cold notes
+
+Revision ID: 0a04ee3439af
+Revises: 30b199f13f2b
+Create Date: 2026-10-19 17:42:24.113697
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a04ee3439af'
+down_revision = '30b199f13f2b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notes_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('body_compressed', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('processing_status', sa.String(length=16), nullable=False),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['contact_id'], ['contacts.id'], name='notes_archive_contact_id_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notes_archive', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notes_archive_contact_id'), ['contact_id'], unique=False)
+
+    # Archived notes keep their ids; AUTOINCREMENT stops SQLite reusing them.
+    # Other databases never reuse sequence values.
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('notes', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('notes', recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+            pass
+
+    with op.batch_alter_table('notes_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notes_archive_contact_id'))
+
+    op.drop_table('notes_archive')
@@ -0,0 +1,51 @@
+"""Cascade deletes and background purge
+
+Revision ID: 30b199f13f2b
+Revises: b7e2a9c4d315
+Create Date: 2026-10-19 17:22:47.194597
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '30b199f13f2b'
+down_revision = 'b7e2a9c4d315'
+branch_labels = None
+depends_on = None
+
+# Databases stamped at the initial revision after db.create_all() on SQLite have
+# unnamed foreign keys; batch mode names them this way so they can be dropped
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def upgrade():
+    # Notes are altered before contacts: SQLite batch mode recreates each table
+    with op.batch_alter_table('notes', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notes_contact_id'), ['contact_id'], unique=False)
+        batch_op.drop_constraint('notes_contact_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('notes_contact_id_fkey', 'contacts', ['contact_id'], ['id'], ondelete='CASCADE')
+
+    with op.batch_alter_table('contacts', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.drop_constraint('contacts_user_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('contacts_user_id_fkey', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
+
+    with op.batch_alter_table('contacts', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint('contacts_user_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('contacts_user_id_fkey', 'users', ['user_id'], ['id'])
+        batch_op.drop_column('deleted_at')
+
+    with op.batch_alter_table('notes', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint('notes_contact_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('notes_contact_id_fkey', 'contacts', ['contact_id'], ['id'])
+        batch_op.drop_index(batch_op.f('ix_notes_contact_id'))
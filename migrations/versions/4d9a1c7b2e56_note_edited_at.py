@@ -0,0 +1,34 @@
+"""Track the last user edit of a note separately from updated_at
+
+Revision ID: 4d9a1c7b2e56
+Revises: ef371d3e67aa
+Create Date: 2026-10-19 20:12:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d9a1c7b2e56'
+down_revision = 'ef371d3e67aa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('edited_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('notes_archive', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('edited_at', sa.DateTime(), nullable=True))
+
+    # Until now updated_at was the closest thing to a last edit
+    op.execute('UPDATE notes SET edited_at = COALESCE(updated_at, created_at)')
+    op.execute('UPDATE notes_archive SET edited_at = COALESCE(updated_at, created_at)')
+
+
+def downgrade():
+    with op.batch_alter_table('notes_archive', schema=None) as batch_op:
+        batch_op.drop_column('edited_at')
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.drop_column('edited_at')
@@ -0,0 +1,70 @@
+"""Sync change feed
+
+The /sync feed shipped before migrations existed; this revision adds its
+schema to databases stamped at the initial revision.
+
+Revision ID: 8c1f4d2e7a90
+Revises: 5033ead4a5e9
+Create Date: 2026-10-19 17:06:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1f4d2e7a90'
+down_revision = '5033ead4a5e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=16), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('deleted', sa.Boolean(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('entity', 'entity_id', name='uq_sync_changes_entity'),
+    sqlite_autoincrement=True
+    )
+    op.create_index('ix_sync_changes_user_id_id', 'sync_changes', ['user_id', 'id'], unique=False)
+    op.create_table('sync_compactions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('watermark', sa.Integer(), nullable=False),
+    sa.Column('compacted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Existing rows would only enter the feed on their next change; record them
+    # now so a client syncing from 0 gets everything
+    op.execute("""
+        INSERT INTO sync_changes (user_id, entity, entity_id, contact_id, deleted, changed_at)
+        SELECT user_id, 'contact', id, id, false, CURRENT_TIMESTAMP FROM contacts
+    """)
+    op.execute("""
+        INSERT INTO sync_changes (user_id, entity, entity_id, contact_id, deleted, changed_at)
+        SELECT contacts.user_id, 'note', notes.id, notes.contact_id, false, CURRENT_TIMESTAMP
+        FROM notes JOIN contacts ON contacts.id = notes.contact_id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    op.drop_table('sync_compactions')
+    op.drop_index('ix_sync_changes_user_id_id', table_name='sync_changes')
+    op.drop_table('sync_changes')
@@ -0,0 +1,37 @@
+"""Note processing state
+
+Processing state shipped before migrations existed; this revision adds
+its columns to databases stamped at an earlier revision.
+
+Revision ID: b7e2a9c4d315
+Revises: 8c1f4d2e7a90
+Create Date: 2026-10-19 17:08:27.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2a9c4d315'
+down_revision = '8c1f4d2e7a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Notes written before processing state was tracked were already handed to Celery
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('processing_status', sa.String(length=16), nullable=False,
+                                      server_default='processed'))
+        batch_op.add_column(sa.Column('processed_at', sa.DateTime(), nullable=True))
+
+    # The model sets the status of new notes itself
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.alter_column('processing_status', server_default=None)
+
+
+def downgrade():
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.drop_column('processed_at')
+        batch_op.drop_column('processing_status')
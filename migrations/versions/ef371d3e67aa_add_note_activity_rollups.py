@@ -0,0 +1,68 @@
+"""Add note activity rollups
+
+Revision ID: ef371d3e67aa
+Revises: 0a04ee3439af
+Create Date: 2026-10-19 17:56:22.126061
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ef371d3e67aa'
+down_revision = '0a04ee3439af'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('note_activity_daily',
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('notes_created', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['contact_id'], ['contacts.id'], name='note_activity_daily_contact_id_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('contact_id', 'day')
+    )
+    with op.batch_alter_table('note_activity_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_note_activity_daily_user_id_day', ['user_id', 'day'], unique=False)
+
+    op.create_table('note_totals',
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('notes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['contact_id'], ['contacts.id'], name='note_totals_contact_id_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('contact_id')
+    )
+    with op.batch_alter_table('note_totals', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_note_totals_user_id'), ['user_id'], unique=False)
+
+    # Backfill from the notes already stored, live and archived
+    op.execute("""
+        INSERT INTO note_activity_daily (contact_id, day, user_id, notes_created)
+        SELECT n.contact_id, date(n.created_at), c.user_id, count(*)
+        FROM (SELECT contact_id, created_at FROM notes
+              UNION ALL SELECT contact_id, created_at FROM notes_archive) AS n
+        JOIN contacts AS c ON c.id = n.contact_id
+        GROUP BY n.contact_id, date(n.created_at), c.user_id
+    """)
+    op.execute("""
+        INSERT INTO note_totals (contact_id, user_id, notes)
+        SELECT n.contact_id, c.user_id, count(*)
+        FROM (SELECT contact_id FROM notes
+              UNION ALL SELECT contact_id FROM notes_archive) AS n
+        JOIN contacts AS c ON c.id = n.contact_id
+        GROUP BY n.contact_id, c.user_id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('note_totals', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_note_totals_user_id'))
+
+    op.drop_table('note_totals')
+    with op.batch_alter_table('note_activity_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_note_activity_daily_user_id_day')
+
+    op.drop_table('note_activity_daily')
@@ -2,5 +2,6 @@ from app import create_app
 
 app = create_app()
 
+# Development server only; production runs gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == '__main__':
     app.run(debug=True)
@@ -7,6 +7,7 @@ from datetime import datetime
 from argon2 import PasswordHasher
 import pytest
 from app import create_app, db as _db, celery
+from app.ownership import cache as ownership_cache
 
 ph = PasswordHasher()
 
@@ -24,6 +25,8 @@ def app():
         yield app
         _db.session.remove()
         _db.drop_all()
+    # Row ids are reused by the next test's fresh database
+    ownership_cache.clear()
 
 @pytest.fixture(scope='function')
 def client(app):
@@ -0,0 +1,169 @@
+import http.client
+import threading
+import time
+import pytest
+import fakeredis
+from unittest.mock import patch
+from werkzeug.serving import make_server
+from app.admission import AdaptiveLimiter, Admission, queue_delay
+from app.scheduling import INTERACTIVE, _members, _tenant_queue
+from tests.test_async_operations import asgi_app, call  # noqa: F401  asgi_app is a fixture
+
+@pytest.fixture
+def limiter(app):
+    """The app's adaptive limiter, emptied again after the test."""
+    limiter = app.extensions['admission'].limiter
+    yield limiter
+    limiter.in_flight = 0
+
+def test_limit_backs_off_and_recovers():
+    """Test that slow requests cut the limit once per window and fast busy ones grow it back."""
+    limiter = AdaptiveLimiter(10, 1, 20, latency_target=0.05, write_share=1)
+    for _ in range(2):
+        assert limiter.try_acquire()
+        limiter.release(1.0)
+    assert limiter.limit == 9
+
+    for _ in range(5):
+        limiter.try_acquire()
+    limiter.release(0.001)
+    assert limiter.limit == pytest.approx(9 + 1 / 9)
+    # An idle process does not inflate its limit
+    limiter.in_flight = 0
+    limiter.try_acquire()
+    limiter.release(0.001)
+    assert limiter.limit == pytest.approx(9 + 1 / 9)
+
+def test_writes_are_shed_before_reads():
+    """Test that writes only get their share of the limit while reads may use all of it."""
+    limiter = AdaptiveLimiter(4, 1, 20, latency_target=1, write_share=0.5)
+    assert limiter.try_acquire(write=True) and limiter.try_acquire(write=True)
+    assert not limiter.try_acquire(write=True)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+def test_overload_sheds_writes_but_serves_reads(client, auth_headers, limiter):
+    """Test that a busy process answers writes with 503 and Retry-After and still serves reads."""
+    limiter.limit = 4
+    limiter.in_flight = 3
+    response = client.post('/contacts', json={'name': 'Shed', 'email': 'shed@example.com'}, headers=auth_headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(client.application.config['ADMISSION_RETRY_AFTER'])
+    assert client.get('/contacts', headers=auth_headers).status_code == 200
+    assert limiter.in_flight == 3
+
+def test_slow_requests_lower_the_limit(app, client, auth_headers, limiter):
+    """Test that requests slower than the latency target shrink the limit."""
+    app.config['ADMISSION_LATENCY_TARGET_MS'] = 0
+    limiter.latency_target = 0
+    before = limiter.limit
+    client.get('/contacts', headers=auth_headers)
+    assert limiter.limit == pytest.approx(before * 0.9)
+
+def test_backlog_sheds_data_writes(app, client, auth_headers, test_contact):
+    """Test that contact and note writes get 503 while the processing backlog is full."""
+    app.config.update(ADMISSION_MAX_BACKLOG=2, ADMISSION_BACKLOG_CHECK_INTERVAL=0)
+    store = fakeredis.FakeRedis()
+    store.sadd(_members(INTERACTIVE), 7)
+    store.rpush(_tenant_queue(INTERACTIVE, 7), 'a', 'b', 'c')
+
+    with patch('app.scheduling.get_redis_client', return_value=store):
+        response = client.post(f'/contacts/{test_contact.id}/notes', json={'body': 'Later'}, headers=auth_headers)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(app.config['ADMISSION_BACKLOG_RETRY_AFTER'])
+        assert client.post('/contacts', json={'name': 'New'}, headers=auth_headers).status_code == 503
+        assert client.get(f'/contacts/{test_contact.id}/notes', headers=auth_headers).status_code == 200
+        # Logging out is not a data write
+        assert client.post('/auth/logout', headers=auth_headers).status_code == 200
+
+        store.ltrim(_tenant_queue(INTERACTIVE, 7), 0, 0)
+        response = client.post('/contacts', json={'name': 'New', 'email': 'new@example.com'}, headers=auth_headers)
+        assert response.status_code == 201
+
+def test_unreadable_backlog_admits_writes(app, client, auth_headers):
+    """Test that writes are admitted when the backlog cannot be read."""
+    app.config['ADMISSION_BACKLOG_CHECK_INTERVAL'] = 0
+    with patch('app.scheduling.backlog', side_effect=ConnectionError('redis down')):
+        response = client.post('/contacts', json={'name': 'New', 'email': 'new@example.com'}, headers=auth_headers)
+    assert response.status_code == 201
+
+def test_async_routes_have_their_own_limit(asgi_app):
+    """Test that async routes shed writes on their own limit and leave the Flask app's capped one alone."""
+    flask_limiter = asgi_app.flask_app.extensions['admission'].limiter
+    assert flask_limiter.maximum == asgi_app.flask_app.config['WEB_THREADS']
+    limiter = asgi_app.admission.limiter
+    assert limiter is not flask_limiter
+    limiter.limit = 4
+    limiter.in_flight = 3
+    with patch('app.scheduling.backlog', return_value=0):
+        status, data = call(asgi_app, 'POST', '/contacts', {'name': 'Shed'}, token=asgi_app.token)
+    assert (status, data) == (503, {'error': 'Server is overloaded'})
+    status, _ = call(asgi_app, 'GET', '/contacts', token=asgi_app.token)
+    assert status == 200
+    assert limiter.in_flight == 3
+    assert flask_limiter.in_flight == 0
+
+def test_limit_is_capped_at_worker_threads(app):
+    """Test that the limit never exceeds the threads a worker has to run requests on."""
+    config = dict(app.config, ADMISSION_INITIAL_LIMIT=20, ADMISSION_MAX_LIMIT=200)
+    limiter = Admission(config, threads=4).limiter
+    assert (limiter.limit, limiter.maximum) == (4, 4)
+    assert Admission(config).limiter.limit == 20
+
+def test_queue_delay_reads_proxy_timestamps():
+    """Test X-Request-Start in seconds, milliseconds and microseconds, and bad values."""
+    now = 1700000010.0
+    assert queue_delay('t=1700000009.5', now) == pytest.approx(0.5)
+    assert queue_delay('1700000008000', now) == pytest.approx(2)
+    assert queue_delay('t=1700000009750000', now) == pytest.approx(0.25)
+    assert queue_delay('t=1700000020', now) == 0
+    assert queue_delay('soon', now) == queue_delay(None, now) == 0
+
+def test_queued_requests_lower_the_limit(client, auth_headers, limiter):
+    """Test that time spent waiting for a thread counts against the latency target."""
+    before = limiter.limit
+    headers = dict(auth_headers, **{'X-Request-Start': f't={time.time() - 5:.3f}'})
+    assert client.get('/contacts', headers=headers).status_code == 200
+    assert limiter.limit == pytest.approx(before * 0.9)
+
+def test_threaded_server_sheds_past_its_threads(app, auth_headers):
+    """Test that a real threaded server answers 503 once every worker thread is busy."""
+    app.extensions['admission'] = Admission(app.config, threads=2)
+    limiter = app.extensions['admission'].limiter
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    release = threading.Event()
+
+    def slow_list(user_id):
+        release.wait(5)
+        return [], 200
+
+    def get(results):
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+        connection.request('GET', '/contacts', headers=auth_headers)
+        response = connection.getresponse()
+        results.append((response.status, response.getheader('Retry-After')))
+        connection.close()
+
+    held = []
+    try:
+        with patch('app.contacts.list_contacts', slow_list):
+            workers = [threading.Thread(target=get, args=(held,)) for _ in range(2)]
+            for worker in workers:
+                worker.start()
+            deadline = time.monotonic() + 5
+            while limiter.in_flight < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            shed = []
+            get(shed)
+            assert shed == [(503, str(app.config['ADMISSION_RETRY_AFTER']))]
+
+            release.set()
+            for worker in workers:
+                worker.join(10)
+    finally:
+        release.set()
+        server.shutdown()
+    assert held == [(200, None), (200, None)]
+    assert limiter.in_flight == 0
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app import archive
+from app.archive import archive_notes, decompress_body
+from app.models import ArchivedNote, Note, SyncChange
+from app.purge import purge_contact_rows
+
+def add_note(database, contact, body, days_old):
+    stamp = datetime.utcnow() - timedelta(days=days_old)
+    note = Note(contact_id=contact.id, body=body, created_at=stamp, updated_at=stamp,
+                processing_status='processed')
+    database.session.add(note)
+    database.session.commit()
+    return note.id
+
+def test_archive_moves_only_cold_notes(database, test_contact):
+    """Test that notes past the age cutoff move to the archive with compressed bodies."""
+    old_id = add_note(database, test_contact, 'old ' * 50, days_old=400)
+    recent_id = add_note(database, test_contact, 'recent', days_old=1)
+
+    assert archive_notes(older_than_days=180, batch_size=1) == 1
+    assert [note.id for note in Note.query.all()] == [recent_id]
+    archived = ArchivedNote.query.get(old_id)
+    assert decompress_body(archived.body_compressed) == 'old ' * 50
+    assert len(archived.body_compressed) < len('old ' * 50)
+    assert archived.processing_status == 'processed'
+    # Archiving is not a delete as far as sync clients are concerned
+    assert SyncChange.query.filter_by(entity='note', deleted=True).count() == 0
+
+def test_note_edited_while_archiving_stays_live(database, test_contact):
+    """Test that an edit landing between reading and moving a cold note is not lost."""
+    edited_id = add_note(database, test_contact, 'cold', days_old=400)
+    cold_id = add_note(database, test_contact, 'also cold', days_old=400)
+    compress = archive.compress_body
+
+    def edit_then_compress(body):
+        if body == 'cold':
+            database.session.execute(archive.notes_table.update().where(archive.notes_table.c.id == edited_id)
+                                     .values(body='edited', updated_at=datetime.utcnow()))
+        return compress(body)
+
+    with patch('app.archive.compress_body', side_effect=edit_then_compress):
+        assert archive_notes(older_than_days=180, batch_size=100) == 1
+    database.session.expire_all()
+    assert Note.query.get(edited_id).body == 'edited'
+    assert ArchivedNote.query.get(edited_id) is None
+    assert ArchivedNote.query.get(cold_id) is not None
+
+def test_reads_go_through_to_archive(client, auth_headers, database, test_contact):
+    """Test that single-note reads are transparent and lists opt in to archived notes."""
+    old_id = add_note(database, test_contact, 'cold', days_old=400)
+    add_note(database, test_contact, 'hot', days_old=1)
+    archive_notes(older_than_days=180, batch_size=100)
+    base = f'/contacts/{test_contact.id}/notes'
+
+    response = client.get(f'{base}/{old_id}', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()['body'] == 'cold'
+
+    assert [n['body'] for n in client.get(base, headers=auth_headers).get_json()] == ['hot']
+    response = client.get(f'{base}?include_archived=true', headers=auth_headers)
+    assert [n['body'] for n in response.get_json()] == ['cold', 'hot']
+
+def test_archived_note_is_private(client, database, test_contact):
+    """Test that the archive read path still checks contact ownership."""
+    old_id = add_note(database, test_contact, 'cold', days_old=400)
+    archive_notes(older_than_days=180, batch_size=100)
+    client.post('/auth/register', json={'username': 'other', 'password': 'otherpass'})
+    token = client.post('/auth/login', json={'username': 'other', 'password': 'otherpass'}).get_json()['access_token']
+    response = client.get(f'/contacts/{test_contact.id}/notes/{old_id}',
+                          headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 404
+
+def test_editing_archived_note_restores_it(client, auth_headers, database, test_contact):
+    """Test that updating or deleting an archived note works like a live one."""
+    edited_id = add_note(database, test_contact, 'cold', days_old=400)
+    deleted_id = add_note(database, test_contact, 'gone', days_old=400)
+    archive_notes(older_than_days=180, batch_size=100)
+    base = f'/contacts/{test_contact.id}/notes'
+
+    response = client.put(f'{base}/{edited_id}', json={'body': 'warm again'}, headers=auth_headers)
+    assert response.status_code == 200
+    assert Note.query.get(edited_id).body == 'warm again'
+    assert ArchivedNote.query.get(edited_id) is None
+
+    assert client.delete(f'{base}/{deleted_id}', headers=auth_headers).status_code == 200
+    assert ArchivedNote.query.count() == 0
+    assert client.get(f'{base}/{deleted_id}', headers=auth_headers).status_code == 404
+    tombstone = SyncChange.query.filter_by(entity='note', entity_id=deleted_id).one()
+    assert tombstone.deleted
+
+def test_sync_returns_archived_notes(client, auth_headers, database, test_contact):
+    """Test that a client catching up still receives notes archived in the meantime."""
+    old_id = add_note(database, test_contact, 'cold', days_old=400)
+    archive_notes(older_than_days=180, batch_size=100)
+    notes = client.get('/sync', headers=auth_headers).get_json()['notes']
+    assert [(note['id'], note['body']) for note in notes] == [(old_id, 'cold')]
+
+def test_purge_removes_archived_notes(database, test_contact):
+    """Test that purging a contact deletes its archived notes in batches too."""
+    for i in range(3):
+        add_note(database, test_contact, f'cold {i}', days_old=400)
+    add_note(database, test_contact, 'hot', days_old=1)
+    archive_notes(older_than_days=180, batch_size=100)
+    assert purge_contact_rows(test_contact.id, batch_size=2) == 4
+    assert ArchivedNote.query.count() == 0
@@ -0,0 +1,266 @@
+import asyncio
+import gzip
+import json
+import re
+import pytest
+import fakeredis
+from unittest.mock import patch
+from flask_jwt_extended import create_access_token
+from app import db
+from app.asgi import create_asgi_app, async_database_url, parse_rate_limit
+from app.config import TestingConfig
+from app.models import User, Contact, Note
+from datetime import datetime, timedelta
+
+@pytest.fixture(scope='function')
+def asgi_app(tmp_path):
+    """An async app sharing a file database with its Flask app."""
+    class AsyncTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path}/async.db'
+        JWT_SECRET_KEY = 'test-secret-key'
+        REDIS_URL = 'redis://localhost:1/0'
+
+    application = create_asgi_app(AsyncTestingConfig)
+    with application.flask_app.app_context():
+        db.create_all()
+        user = User(username='asyncuser', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        contact = Contact(user_id=user.id, name='Async Contact', email='async@example.com')
+        db.session.add(contact)
+        db.session.commit()
+        application.token = create_access_token(identity=str(user.id))
+        application.contact_id = contact.id
+        db.session.remove()
+    yield application
+    asyncio.run(application.engine.dispose())
+
+def call(application, method, path, body=None, token=None, extra_headers=()):
+    """Drive the ASGI app directly and return (status, json)."""
+    start, payload = send_request(application, method, path, body, token, extra_headers)
+    return start['status'], json.loads(payload)
+
+def send_request(application, method, path, body=None, token=None, extra_headers=()):
+    """Drive the ASGI app directly and return its response start message and raw body."""
+    headers = [(b'content-type', b'application/json'), *extra_headers]
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    path, _, query = path.partition('?')
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': headers, 'client': ('127.0.0.1', 1234), 'http_version': '1.1'}
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return sent[0], b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+
+def test_async_contact_crud(asgi_app):
+    """Test the async contact views end to end."""
+    status, data = call(asgi_app, 'GET', '/contacts', token=asgi_app.token)
+    assert status == 200
+    assert [c['name'] for c in data] == ['Async Contact']
+
+    status, data = call(asgi_app, 'POST', '/contacts', {'name': 'Second'}, token=asgi_app.token)
+    assert status == 201
+    new_id = data['id']
+
+    status, data = call(asgi_app, 'PUT', f'/contacts/{new_id}', {'email': 'b@example.com'}, token=asgi_app.token)
+    assert status == 200
+    assert data['email'] == 'b@example.com'
+
+    status, _ = call(asgi_app, 'DELETE', f'/contacts/{new_id}', token=asgi_app.token)
+    assert status == 200
+    status, _ = call(asgi_app, 'GET', f'/contacts/{new_id}', token=asgi_app.token)
+    assert status == 404
+
+def test_async_note_crud(asgi_app, celery_app):
+    """Test the async note views end to end."""
+    base = f'/contacts/{asgi_app.contact_id}/notes'
+    with patch('app.tasks.process_note.delay') as mock_task:
+        status, data = call(asgi_app, 'POST', base, {'note_text': 'Async note'}, token=asgi_app.token)
+    assert status == 201
+    note_id = data['id']
+    mock_task.assert_called_once_with(note_id)
+
+    status, data = call(asgi_app, 'PUT', f'{base}/{note_id}', {'body': 'Edited'}, token=asgi_app.token)
+    assert status == 200
+    status, data = call(asgi_app, 'GET', base, token=asgi_app.token)
+    assert [n['body'] for n in data] == ['Edited']
+
+    status, _ = call(asgi_app, 'DELETE', f'{base}/{note_id}', token=asgi_app.token)
+    assert status == 200
+    status, _ = call(asgi_app, 'GET', f'{base}/{note_id}', token=asgi_app.token)
+    assert status == 404
+
+def test_async_idempotent_post(asgi_app):
+    """Test that async POSTs replay the stored response for a repeated Idempotency-Key."""
+    server = fakeredis.FakeServer()
+    asgi_app.rate_limit = None
+    key = [(b'idempotency-key', b'async-1')]
+
+    def post(name):
+        # Each call runs its own event loop, so it needs its own client
+        asgi_app.redis = fakeredis.aioredis.FakeRedis(server=server)
+        return call(asgi_app, 'POST', '/contacts', {'name': name}, token=asgi_app.token, extra_headers=key)
+
+    first = post('Once')
+    assert first[0] == 201
+    assert post('Once') == first
+    assert post('Other')[0] == 422
+    asgi_app.redis = None
+    status, data = call(asgi_app, 'GET', '/contacts', token=asgi_app.token)
+    assert [c['name'] for c in data] == ['Async Contact', 'Once']
+
+def test_async_rate_limit_counter_expires(asgi_app):
+    """Test that the async rate limit counter is created with its expiry and enforces the limit."""
+    server = fakeredis.FakeServer()
+    asgi_app.rate_limit = (2, 60)
+    statuses = []
+    for _ in range(3):
+        asgi_app.redis = fakeredis.aioredis.FakeRedis(server=server)
+        statuses.append(call(asgi_app, 'GET', '/contacts', token=asgi_app.token)[0])
+    assert statuses == [200, 200, 429]
+    store = fakeredis.FakeRedis(server=server)
+    [key] = store.keys('async-ratelimit:*')
+    assert 0 < store.ttl(key) <= 60
+
+def test_async_requires_token(asgi_app):
+    """Test that async views reject unauthenticated requests."""
+    status, data = call(asgi_app, 'GET', '/contacts')
+    assert status == 401
+    assert data['msg'] == 'Missing Authorization Header'
+
+def test_async_falls_back_to_flask(asgi_app):
+    """Test that non-async routes are served by the Flask app."""
+    status, data = call(asgi_app, 'GET', '/')
+    assert status == 200
+    assert data['message'] == 'Server is running!'
+
+def test_async_responses_are_compressed(asgi_app):
+    """Test that async routes negotiate Accept-Encoding like the Flask routes."""
+    with asgi_app.flask_app.app_context():
+        user_id = Contact.query.get(asgi_app.contact_id).user_id
+        db.session.add_all([Contact(user_id=user_id, name=f'Contact {i}', email=f'c{i}@example.com')
+                            for i in range(50)])
+        db.session.commit()
+        db.session.remove()
+
+    start, body = send_request(asgi_app, 'GET', '/contacts', token=asgi_app.token,
+                               extra_headers=[(b'accept-encoding', b'gzip')])
+    headers = dict(start['headers'])
+    assert headers[b'content-encoding'] == b'gzip'
+    assert headers[b'vary'] == b'Accept-Encoding'
+    assert int(headers[b'content-length']) == len(body)
+    assert len(json.loads(gzip.decompress(body))) == 51
+
+    start, body = send_request(asgi_app, 'GET', '/contacts', token=asgi_app.token)
+    assert b'content-encoding' not in dict(start['headers'])
+    assert len(json.loads(body)) == 51
+
+    # Small bodies stay plain, as under COMPRESSION_MIN_SIZE on the Flask routes
+    start, body = send_request(asgi_app, 'GET', f'/contacts/{asgi_app.contact_id}', token=asgi_app.token,
+                               extra_headers=[(b'accept-encoding', b'gzip')])
+    assert b'content-encoding' not in dict(start['headers'])
+    assert json.loads(body)['name'] == 'Async Contact'
+
+def test_async_database_url():
+    """Test sync URLs map onto asyncio drivers."""
+    assert str(async_database_url('postgresql://u:p@db/app')) == 'postgresql+asyncpg://u:p@db/app'
+    assert str(async_database_url('sqlite:///dev.db', '/srv/app')) == 'sqlite+aiosqlite:////srv/app/dev.db'
+    assert parse_rate_limit('100 per minute') == (100, 60)
+    assert parse_rate_limit('200/minute') == (200, 60)
+
+def test_async_reads_see_autosaved_edit(asgi_app):
+    """Test that async note reads return an autosaved edit not flushed yet."""
+    from app.autosave import buffer_key
+    server = fakeredis.FakeServer()
+    with asgi_app.flask_app.app_context():
+        note = Note(contact_id=asgi_app.contact_id, body='Stored')
+        db.session.add(note)
+        db.session.commit()
+        note_id, created_at = note.id, note.created_at.isoformat()
+        db.session.remove()
+    fakeredis.FakeRedis(server=server).hset(buffer_key(asgi_app.contact_id), note_id, json.dumps(
+        {'id': note_id, 'body': 'Buffered', 'created_at': created_at, 'updated_at': created_at}))
+
+    base = f'/contacts/{asgi_app.contact_id}/notes'
+    with patch('app.autosave.get_redis_client', return_value=fakeredis.FakeRedis(server=server)):
+        assert call(asgi_app, 'GET', f'{base}/{note_id}', token=asgi_app.token)[1]['body'] == 'Buffered'
+        assert [n['body'] for n in call(asgi_app, 'GET', base, token=asgi_app.token)[1]] == ['Buffered']
+
+def _parity_scenario(app, request):
+    """Run the same contact and note requests through `request` and return what came back, ids left out."""
+    from app.archive import archive_notes
+    with app.app_context():
+        other = User(username=f'other-{datetime.utcnow().timestamp()}', password_hash='x')
+        db.session.add(other)
+        db.session.flush()
+        foreign = Contact(user_id=other.id, name='Not yours')
+        db.session.add(foreign)
+        db.session.commit()
+        foreign_id = foreign.id
+        db.session.remove()
+
+    seen = []
+    def record(method, path, body=None):
+        status, data = request(method, path, body)
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict):
+                item.pop('id', None)
+                item.pop('created_at', None)
+        seen.append((method, re.sub(r'\d+', '#', path), status, data))
+        return status, data
+
+    _, contact = request('POST', '/contacts', {'name': 'Parity', 'email': 'p@example.com'})
+    base = f"/contacts/{contact['id']}"
+    record('PUT', base, {'name': 'Parity 2'})
+    record('GET', base)
+    _, note = request('POST', f'{base}/notes', {'note_text': 'Live'})
+    with app.app_context():
+        old = datetime.utcnow() - timedelta(days=400)
+        cold = Note(contact_id=contact['id'], body='Cold', created_at=old, updated_at=old, edited_at=old)
+        db.session.add(cold)
+        db.session.commit()
+        cold_id = cold.id
+        archive_notes(older_than_days=30, batch_size=10)
+        db.session.remove()
+    record('GET', f'{base}/notes')
+    record('GET', f'{base}/notes?include_archived=true')
+    record('GET', f'{base}/notes/{cold_id}')
+    # Editing an archived note moves it back first
+    record('PUT', f'{base}/notes/{cold_id}', {'body': 'Warm'})
+    record('DELETE', f"{base}/notes/{note['id']}")
+    record('GET', f"{base}/notes/{note['id']}")
+    record('GET', f'{base}/notes')
+    record('POST', f'{base}/notes', {})
+    record('GET', f'/contacts/{foreign_id}/notes')
+    record('POST', f'/contacts/{foreign_id}/notes', {'body': 'Intruder'})
+    record('POST', '/contacts', {'email': 'nameless@example.com'})
+    record('DELETE', base)
+    record('GET', base)
+    return seen
+
+def test_async_routes_match_flask(asgi_app, celery_app):
+    """Test that the async app answers contact and note requests exactly as the Flask app does."""
+    flask_app = asgi_app.flask_app
+    client = flask_app.test_client()
+    headers = {'Authorization': f'Bearer {asgi_app.token}'}
+
+    def via_flask(method, path, body=None):
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json()
+
+    def via_asgi(method, path, body=None):
+        return call(asgi_app, method, path, body, token=asgi_app.token)
+
+    with patch('app.tasks.process_note.delay'):
+        expected = _parity_scenario(flask_app, via_flask)
+        assert _parity_scenario(flask_app, via_asgi) == expected
+    assert [status for *_, status, _ in expected] == [200, 200, 200, 200, 200, 200, 200, 404, 200, 400,
+                                                       404, 404, 400, 200, 404]
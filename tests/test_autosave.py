@@ -0,0 +1,164 @@
+import pytest
+import fakeredis
+from unittest.mock import patch
+from sqlalchemy import event
+from app import autosave
+from app.autosave import buffer_key, flush_contact
+from app.models import Note, SyncChange
+
+@pytest.fixture
+def redis_store():
+    """An in-memory Redis used as the autosave buffer."""
+    store = fakeredis.FakeRedis()
+    with patch('app.autosave.get_redis_client', return_value=store):
+        yield store
+
+@pytest.fixture
+def note_writes(database):
+    """Record UPDATE statements sent to the notes table."""
+    statements = []
+    def listener(conn, cursor, statement, *args):
+        if statement.startswith('UPDATE notes'):
+            statements.append(statement)
+    event.listen(database.engine, 'before_cursor_execute', listener)
+    yield statements
+    event.remove(database.engine, 'before_cursor_execute', listener)
+
+def test_autosaves_are_buffered_and_read_back(client, auth_headers, test_note, redis_store, note_writes):
+    """Test that autosave edits skip the database and reads return the latest one."""
+    url = f'/contacts/{test_note.contact_id}/notes/{test_note.id}'
+    for i in range(10):
+        response = client.put(f'{url}?autosave=true', json={'body': f'draft {i}'}, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers['Autosave-Buffered'] == 'true'
+        assert response.get_json()['body'] == f'draft {i}'
+
+    assert note_writes == []
+    assert Note.query.get(test_note.id).body == 'Test note'
+    assert client.get(url, headers=auth_headers).get_json()['body'] == 'draft 9'
+    listed = client.get(f'/contacts/{test_note.contact_id}/notes', headers=auth_headers).get_json()
+    assert [n['body'] for n in listed] == ['draft 9']
+
+def test_flush_writes_latest_edit_once(client, auth_headers, database, test_note, redis_store, note_writes):
+    """Test that an explicit flush stores the latest edit in one UPDATE and empties the buffer."""
+    base = f'/contacts/{test_note.contact_id}/notes'
+    for body in ('one', 'two', 'three'):
+        client.put(f'{base}/{test_note.id}?autosave=true', json={'body': body}, headers=auth_headers)
+
+    response = client.post(f'{base}/flush', headers=auth_headers)
+    assert response.get_json() == {'flushed': 1}
+    assert len(note_writes) == 1
+    database.session.expire_all()
+    assert Note.query.get(test_note.id).body == 'three'
+    assert not redis_store.exists(buffer_key(test_note.contact_id))
+    # Sync clients are told about the flushed edit
+    assert SyncChange.query.filter_by(entity='note', entity_id=test_note.id, deleted=False).count() == 1
+
+def test_periodic_flush_task(client, auth_headers, database, test_note, redis_store):
+    """Test that the beat task flushes every contact with buffered edits."""
+    from app.tasks import flush_autosaves
+    note_id = test_note.id
+    client.put(f'/contacts/{test_note.contact_id}/notes/{note_id}?autosave=true',
+               json={'body': 'from the editor'}, headers=auth_headers)
+    assert flush_autosaves.delay().get()['flushed'] == 1
+    assert Note.query.get(note_id).body == 'from the editor'
+    assert redis_store.smembers(autosave.DIRTY_KEY) == set()
+
+def test_direct_write_supersedes_buffered_edit(client, auth_headers, database, test_note, redis_store):
+    """Test that a regular PUT wins over an older autosave still waiting for a flush."""
+    url = f'/contacts/{test_note.contact_id}/notes/{test_note.id}'
+    client.put(f'{url}?autosave=true', json={'body': 'draft'}, headers=auth_headers)
+    client.put(url, json={'body': 'final'}, headers=auth_headers)
+
+    assert client.get(url, headers=auth_headers).get_json()['body'] == 'final'
+    flush_contact(test_note.contact_id)
+    database.session.expire_all()
+    assert Note.query.get(test_note.id).body == 'final'
+
+def test_edit_during_flush_is_kept(client, auth_headers, database, test_note, redis_store):
+    """Test that an autosave arriving while a flush writes stays buffered for the next flush."""
+    url = f'/contacts/{test_note.contact_id}/notes/{test_note.id}'
+    client.put(f'{url}?autosave=true', json={'body': 'first'}, headers=auth_headers)
+    write_entries = autosave._write_entries
+    calls = []
+
+    def racing_write(contact_id, entries):
+        result = write_entries(contact_id, entries)
+        if not calls:
+            client.put(f'{url}?autosave=true', json={'body': 'second'}, headers=auth_headers)
+        calls.append(entries)
+        return result
+
+    with patch('app.autosave._write_entries', side_effect=racing_write):
+        assert flush_contact(test_note.contact_id) == 1
+    # The database was written once, and the newer edit was not dropped
+    assert [entry['body'] for entries in calls for entry in entries] == ['first']
+    database.session.expire_all()
+    assert Note.query.get(test_note.id).body == 'first'
+    assert client.get(url, headers=auth_headers).get_json()['body'] == 'second'
+    assert redis_store.sismember(autosave.DIRTY_KEY, test_note.contact_id)
+
+    assert flush_contact(test_note.contact_id) == 1
+    database.session.expire_all()
+    assert Note.query.get(test_note.id).body == 'second'
+    assert not redis_store.exists(buffer_key(test_note.contact_id))
+    assert not redis_store.sismember(autosave.DIRTY_KEY, test_note.contact_id)
+
+def test_edit_survives_processing_before_flush(client, auth_headers, database, test_note, redis_store):
+    """Test that a processing status commit between an autosave and its flush does not lose the edit."""
+    from app.tasks import set_processing_status
+    url = f'/contacts/{test_note.contact_id}/notes/{test_note.id}'
+    response = client.put(f'{url}?autosave=true', json={'body': 'edited'}, headers=auth_headers)
+    assert response.headers['Autosave-Buffered'] == 'true'
+
+    set_processing_status(Note.query.get(test_note.id), 'processed')
+    assert flush_contact(test_note.contact_id) == 1
+    database.session.expire_all()
+    assert Note.query.get(test_note.id).body == 'edited'
+    assert not redis_store.exists(buffer_key(test_note.contact_id))
+
+def test_unwritten_edits_stay_buffered(client, auth_headers, database, test_note, redis_store):
+    """Test that an edit whose UPDATE reached no row is kept for the next flush."""
+    client.put(f'/contacts/{test_note.contact_id}/notes/{test_note.id}?autosave=true',
+               json={'body': 'pending'}, headers=auth_headers)
+    with patch('app.autosave._write_entries', return_value=(set(), set())):
+        assert flush_contact(test_note.contact_id) == 0
+    assert autosave.buffered_note(test_note.contact_id, test_note.id)['body'] == 'pending'
+    assert redis_store.sismember(autosave.DIRTY_KEY, test_note.contact_id)
+
+def test_failed_write_keeps_edits_buffered(client, auth_headers, database, test_note, redis_store):
+    """Test that edits stay in the buffer when writing them to the database fails."""
+    client.put(f'/contacts/{test_note.contact_id}/notes/{test_note.id}?autosave=true',
+               json={'body': 'unsaved'}, headers=auth_headers)
+    with patch('app.autosave._write_entries', side_effect=RuntimeError('database down')):
+        with pytest.raises(RuntimeError):
+            flush_contact(test_note.contact_id)
+    assert autosave.buffered_note(test_note.contact_id, test_note.id)['body'] == 'unsaved'
+    assert redis_store.sismember(autosave.DIRTY_KEY, test_note.contact_id)
+
+def test_flush_job_follows_feature_flag(monkeypatch):
+    """Test that the periodic flush is only scheduled while autosave is enabled."""
+    import importlib
+    from app import config
+    monkeypatch.setenv('AUTOSAVE_ENABLED', 'false')
+    assert 'flush-autosaves' not in importlib.reload(config).BaseConfig.CELERY_BEAT_SCHEDULE
+    monkeypatch.setenv('AUTOSAVE_ENABLED', 'true')
+    assert 'flush-autosaves' in importlib.reload(config).BaseConfig.CELERY_BEAT_SCHEDULE
+
+def test_autosave_without_redis_writes_directly(client, auth_headers, database, test_note):
+    """Test that autosave falls back to a direct write when Redis is down."""
+    with patch('app.autosave.get_redis_client', return_value=None):
+        response = client.put(f'/contacts/{test_note.contact_id}/notes/{test_note.id}?autosave=true',
+                              json={'body': 'saved anyway'}, headers=auth_headers)
+    assert response.status_code == 200
+    assert 'Autosave-Buffered' not in response.headers
+    assert Note.query.get(test_note.id).body == 'saved anyway'
+
+def test_autosave_checks_ownership(client, test_note, redis_store):
+    """Test that another user cannot autosave into a note they do not own."""
+    client.post('/auth/register', json={'username': 'other', 'password': 'otherpass'})
+    token = client.post('/auth/login', json={'username': 'other', 'password': 'otherpass'}).get_json()['access_token']
+    response = client.put(f'/contacts/{test_note.contact_id}/notes/{test_note.id}?autosave=true',
+                          json={'body': 'intruder'}, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 404
+    assert not redis_store.exists(buffer_key(test_note.contact_id))
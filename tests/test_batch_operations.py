@@ -0,0 +1,88 @@
+from unittest.mock import patch
+from app.models import Contact, Note, db
+
+def test_batch_with_references(client, auth_headers, test_user):
+    """Test that later operations can use ids created earlier in the batch."""
+    with patch('app.tasks.process_note.delay') as mock_task:
+        response = client.post('/batch', json={'operations': [
+            {'ref': 'c1', 'method': 'POST', 'path': '/contacts', 'body': {'name': 'Batch Contact'}},
+            {'ref': 'n1', 'method': 'POST', 'path': '/contacts/$c1.id/notes', 'body': {'body': 'First'}},
+            {'method': 'POST', 'path': '/contacts/$c1.id/notes', 'body': {'note_text': 'Second'}},
+            {'method': 'GET', 'path': '/contacts/$c1.id/notes'}
+        ]}, headers=auth_headers)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['committed'] is True
+    assert [r['status'] for r in data['results']] == [201, 201, 201, 200]
+    assert [n['body'] for n in data['results'][3]['body']] == ['First', 'Second']
+
+    contact = Contact.query.filter_by(name='Batch Contact').one()
+    assert Note.query.filter_by(contact_id=contact.id).count() == 2
+    # Processing is queued only after the batch commits
+    assert mock_task.call_count == 2
+
+def test_atomic_batch_rolls_back_everything(client, auth_headers, test_contact):
+    """Test that a failing operation undoes the whole atomic batch."""
+    with patch('app.tasks.process_note.delay') as mock_task:
+        response = client.post('/batch', json={'atomic': True, 'operations': [
+            {'method': 'POST', 'path': f'/contacts/{test_contact.id}/notes', 'body': {'body': 'Lost'}},
+            {'method': 'PUT', 'path': f'/contacts/{test_contact.id}', 'body': {'name': 'Renamed'}},
+            {'method': 'GET', 'path': '/contacts/999999'}
+        ]}, headers=auth_headers)
+
+    assert response.status_code == 400
+    data = response.get_json()
+    assert data['committed'] is False
+    assert data['failed_index'] == 2
+    assert Note.query.filter_by(body='Lost').count() == 0
+    assert Contact.query.get(test_contact.id).name == 'Test Contact'
+    mock_task.assert_not_called()
+
+def test_non_atomic_batch_keeps_successful_operations(client, auth_headers, test_contact):
+    """Test that only the failing operation is rolled back without atomic."""
+    response = client.post('/batch', json={'operations': [
+        {'method': 'PUT', 'path': f'/contacts/{test_contact.id}', 'body': {'name': 'Renamed'}},
+        {'method': 'POST', 'path': '/contacts', 'body': {}},
+        {'method': 'POST', 'path': '/contacts', 'body': {'name': 'Kept'}}
+    ]}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert [r['status'] for r in response.get_json()['results']] == [200, 400, 201]
+    assert Contact.query.get(test_contact.id).name == 'Renamed'
+    assert Contact.query.filter_by(name='Kept').count() == 1
+
+def test_batch_rejects_other_routes_and_bad_refs(client, auth_headers):
+    """Test that only contact and note routes with known references run."""
+    response = client.post('/batch', json={'operations': [
+        {'method': 'POST', 'path': '/auth/register', 'body': {'username': 'x', 'password': 'y'}},
+        {'method': 'GET', 'path': '/contacts/$missing.id'}
+    ]}, headers=auth_headers)
+    assert [r['status'] for r in response.get_json()['results']] == [400, 400]
+
+def test_batch_requires_token_and_operations(client, auth_headers):
+    """Test authentication and payload validation for batches."""
+    assert client.post('/batch', json={'operations': []}).status_code == 401
+    assert client.post('/batch', json={'operations': []}, headers=auth_headers).status_code == 400
+
+def test_failing_operation_leaves_session_usable(client, auth_headers, test_contact, test_note):
+    """Test that an operation raising mid-batch is undone alone and later requests commit normally."""
+    with patch('app.notes.normalize_note_data', side_effect=RuntimeError('boom')):
+        response = client.post('/batch', json={'operations': [
+            {'method': 'POST', 'path': '/contacts', 'body': {'name': 'Kept'}},
+            {'method': 'PUT', 'path': f'/contacts/{test_contact.id}/notes/{test_note.id}', 'body': {'body': 'x'}}
+        ]}, headers=auth_headers)
+    assert [r['status'] for r in response.get_json()['results']] == [201, 500]
+
+    response = client.post('/contacts', json={'name': 'After'}, headers=auth_headers)
+    assert response.status_code == 201
+    db.session.remove()
+    assert {c.name for c in Contact.query.all()} >= {'Kept', 'After'}
+
+def test_sqlite_settings_stay_on_app_engine(app):
+    """Test that only the app's engines get the SQLite transaction and foreign key settings."""
+    from sqlalchemy import create_engine
+    with create_engine('sqlite://').connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA foreign_keys').scalar() == 0
+    with db.engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA foreign_keys').scalar() == 1
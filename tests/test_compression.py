@@ -0,0 +1,69 @@
+import gzip
+import json
+import zlib
+import pytest
+from unittest.mock import patch
+from app.compression import choose_encoding, compress_stream
+from app.models import Contact
+
+def test_choose_encoding():
+    """Test Accept-Encoding negotiation with q-values and wildcards."""
+    assert choose_encoding('gzip, deflate', ('br', 'gzip')) == 'gzip'
+    assert choose_encoding('gzip, br', ('br', 'gzip')) == 'br'
+    assert choose_encoding('br;q=0.5, gzip', ('br', 'gzip')) == 'gzip'
+    assert choose_encoding('gzip;q=0', ('gzip',)) is None
+    assert choose_encoding('*', ('gzip',)) == 'gzip'
+    assert choose_encoding(None, ('gzip',)) is None
+
+def test_large_list_is_gzipped(client, auth_headers, database, test_user):
+    """Test that a list response above the size threshold is compressed."""
+    database.session.add_all([Contact(user_id=test_user.id, name=f'Contact {i}', email=f'c{i}@example.com')
+                              for i in range(50)])
+    database.session.commit()
+
+    response = client.get('/contacts', headers={**auth_headers, 'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(json.loads(gzip.decompress(response.data))) == 50
+
+    plain = client.get('/contacts', headers=auth_headers)
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.get_json()) == 50
+
+def test_small_response_is_not_compressed(client, auth_headers, test_contact):
+    """Test that bodies under COMPRESSION_MIN_SIZE are sent uncompressed."""
+    response = client.get('/contacts', headers={**auth_headers, 'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()[0]['name'] == 'Test Contact'
+
+def test_streamed_body_is_compressed_per_chunk():
+    """Test that each streamed chunk is flushed as a decodable gzip fragment."""
+    chunks = list(compress_stream(iter(['{"a":', b' 1}']), 'gzip', 6))
+    decoder = zlib.decompressobj(31)
+    assert decoder.decompress(chunks[0]) == b'{"a":'
+    assert decoder.decompress(b''.join(chunks[1:])) == b' 1}'
+
+def test_swagger_served_from_memory_with_etag(client):
+    """Test that the spec is precompressed, cached in memory and revalidated by ETag."""
+    with patch('builtins.open', side_effect=AssertionError('spec read from disk')):
+        response = client.get('/static/swagger.json', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))['openapi']
+
+    etag = response.headers['ETag']
+    revalidated = client.get('/static/swagger.json', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+    plain = client.get('/static/swagger.json', headers={'If-None-Match': etag})
+    assert plain.status_code == 200
+    assert plain.headers['ETag'] != etag
+    assert plain.get_json() == json.loads(gzip.decompress(response.data))
+
+def test_brotli_preferred_when_available(client):
+    """Test that brotli is chosen over gzip when both are accepted."""
+    brotli = pytest.importorskip('brotli')
+    response = client.get('/static/swagger.json', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.data))['openapi']
@@ -0,0 +1,113 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app import auth, celery, create_app, db, embedded
+from app.config import TestingConfig
+from app.models import Note
+from app.ownership import cache as ownership_cache
+
+@pytest.fixture
+def app(tmp_path):
+    """An embedded-mode app. Task threads need their own connections, so the database is a file."""
+    class EmbeddedConfig(TestingConfig):
+        EMBEDDED_MODE = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'embedded.db'}"
+        JWT_SECRET_KEY = 'test-secret-key'
+
+    app = create_app(EmbeddedConfig)
+    with app.app_context(), patch.object(auth, 'redis_client', None):
+        db.create_all()
+        yield app
+        embedded.reset()
+        embedded.redis_client().flushall()
+        db.session.remove()
+        db.drop_all()
+    ownership_cache.clear()
+
+@pytest.fixture
+def queued_tasks():
+    """Run tasks on the embedded executor instead of inline."""
+    celery.conf.task_always_eager = False
+    yield
+    celery.conf.task_always_eager = True
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+def test_tokens_use_in_process_store(app, client, test_user):
+    """Test that refresh tokens and the blocklist work without a Redis server."""
+    tokens = client.post('/auth/login', json={'username': 'testuser', 'password': 'testpass'}).get_json()
+    assert tokens['refresh_token']
+    assert client.post('/auth/logout', headers=bearer(tokens['access_token'])).status_code == 200
+    assert client.get('/contacts', headers=bearer(tokens['access_token'])).status_code == 401
+
+    store = embedded.redis_client()
+    revoked = [key for key in store.keys() if not key.startswith(b'refresh:')]
+    # Blocklist entries expire with the access token they block
+    assert revoked and 0 < store.ttl(revoked[0]) <= app.config['JWT_ACCESS_TOKEN_EXPIRES']
+
+def test_queued_note_runs_on_executor_thread(queued_tasks, client, auth_headers, database, test_contact):
+    """Test that a new note is scheduled and processed on the embedded thread pool."""
+    threads = []
+    with patch('app.tasks.call_upstream_service', side_effect=lambda note: threads.append(threading.current_thread().name)):
+        response = client.post(f'/contacts/{test_contact.id}/notes', json={'body': 'Queued'}, headers=auth_headers)
+        note_id = response.get_json()['id']
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            # End the read transaction so the task thread can write
+            database.session.remove()
+            if Note.query.get(note_id).processing_status == 'processed':
+                break
+            time.sleep(0.02)
+
+    assert Note.query.get(note_id).processing_status == 'processed'
+    assert threads and threads[0].startswith('embedded-task')
+
+def test_delay_returns_result_handle(app, database, test_note, queued_tasks):
+    """Test that delay() keeps Celery's result interface in embedded mode."""
+    from app.tasks import process_note
+    note_id = test_note.id
+    database.session.remove()
+    with patch('app.tasks.call_upstream_service'):
+        result = process_note.delay(note_id)
+        assert result.id
+        assert result.get(timeout=5) == {'status': 'success', 'note_id': note_id}
+    assert result.ready() and result.successful()
+
+def test_beat_runs_periodic_tasks(app):
+    """Test that the embedded beat queues scheduled tasks at their interval."""
+    runs = threading.Event()
+    schedule = {'compact': {'task': 'app.tasks.compact_sync_changes', 'schedule': 0.05}}
+    beat = embedded.Beat(app, schedule)
+    with patch('app.tasks.compact_sync_changes.apply_async', side_effect=lambda: runs.set()):
+        beat.start()
+        try:
+            assert runs.wait(2)
+        finally:
+            beat.stop()
+            beat.join(2)
+    assert not beat.is_alive()
+
+
+def test_sweep_drops_expired_keys(app):
+    """Test that the beat's sweep frees expired keys nobody reads again."""
+    store = embedded.redis_client()
+    for i in range(50):
+        store.set(f'revoked:{i}', 1, px=10)
+    store.set('kept', 1)
+    stored = embedded.redis_server().dbs[0]._dict
+    time.sleep(0.05)
+    assert len(stored) == 51
+
+    app.config['EMBEDDED_SWEEP_INTERVAL'] = 0.05
+    beat = embedded.Beat(app, {})
+    beat.start()
+    try:
+        deadline = time.monotonic() + 2
+        while len(stored) > 1 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        beat.stop()
+        beat.join(2)
+    assert list(stored) == [b'kept']
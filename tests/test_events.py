@@ -0,0 +1,107 @@
+import json
+from unittest.mock import patch, MagicMock
+from app import db
+from app.events import EventBroker, broker
+from app.models import Note, SyncChange
+from app.tasks import process_note
+
+def test_process_note_persists_and_publishes_status(app, test_user, test_note, celery_app):
+    """Test that processing state is stored on the note and published."""
+    redis = MagicMock()
+    with patch('app.events.get_redis_client', return_value=redis), \
+         patch('app.tasks.call_upstream_service', return_value={'status': 'received'}):
+        result = process_note.delay(test_note.id).get(timeout=5)
+
+    assert result['status'] == 'success'
+    note = db.session.get(Note, test_note.id)
+    assert note.processing_status == 'processed'
+    assert note.processed_at is not None
+
+    published = [json.loads(c.args[1])['status'] for c in redis.publish.call_args_list]
+    assert published == ['processing', 'processed']
+    assert redis.publish.call_args.args[0] == f'events:user:{test_user.id}'
+
+def test_processing_is_not_a_user_edit(app, test_note, celery_app):
+    """Test that processing leaves updated_at and the sync feed alone."""
+    updated_at = test_note.updated_at
+    changes = SyncChange.query.count()
+    with patch('app.events.get_redis_client', return_value=MagicMock()), \
+         patch('app.tasks.call_upstream_service', return_value={'status': 'received'}):
+        process_note.delay(test_note.id).get(timeout=5)
+    note = db.session.get(Note, test_note.id)
+    assert note.processing_status == 'processed'
+    assert note.updated_at == updated_at
+    assert SyncChange.query.count() == changes
+
+def test_process_note_failure_is_published(app, test_note, celery_app):
+    """Test that a failed upstream call marks the note as failed."""
+    redis = MagicMock()
+    with patch('app.events.get_redis_client', return_value=redis), \
+         patch('app.tasks.call_upstream_service', side_effect=Exception('boom')):
+        process_note.delay(test_note.id).get(timeout=5)
+    assert db.session.get(Note, test_note.id).processing_status == 'failed'
+
+def test_broker_fans_out_to_user_connections():
+    """Test that one subscriber routes messages to each user's connections only."""
+    local_broker = EventBroker()
+    with patch.object(local_broker, '_ensure_listener'):
+        first = local_broker.subscribe(1)
+        second = local_broker.subscribe(1)
+        other = local_broker.subscribe(2)
+
+    local_broker._dispatch({'type': 'pmessage', 'channel': b'events:user:1', 'data': b'{"status": "processed"}'})
+    assert first.get_nowait() == second.get_nowait() == '{"status": "processed"}'
+    assert other.empty()
+
+    local_broker.unsubscribe(1, first)
+    local_broker.unsubscribe(1, second)
+    assert local_broker.connection_count() == 1
+
+def test_event_stream_delivers_updates(client, auth_headers, test_user):
+    """Test the SSE endpoint streams events published for the user."""
+    with patch.object(broker, '_ensure_listener'):
+        response = client.get('/events', headers=auth_headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        chunks = iter(response.response)
+        assert next(chunks).startswith(b'retry:')
+
+        broker._dispatch({'channel': f'events:user:{test_user.id}', 'data': '{"note_id": 1}'})
+        assert next(chunks) == b'event: note.status\ndata: {"note_id": 1}\n\n'
+        response.close()
+    assert broker.connection_count() == 0
+
+def test_event_stream_accepts_query_token(client, auth_headers):
+    """Test that EventSource clients can pass the token in the query string."""
+    token = auth_headers['Authorization'].split()[1]
+    with patch.object(broker, '_ensure_listener'):
+        response = client.get(f'/events?jwt={token}')
+        assert response.status_code == 200
+        response.close()
+
+def test_event_streams_are_capped_per_process(app, client, auth_headers):
+    """Test that streams past SSE_MAX_STREAMS get 503 until one closes."""
+    app.config['SSE_MAX_STREAMS'] = 1
+    with patch.object(broker, '_ensure_listener'):
+        first = client.get('/events', headers=auth_headers)
+        assert first.status_code == 200
+
+        refused = client.get('/events', headers=auth_headers)
+        assert refused.status_code == 503
+        assert refused.headers['Retry-After'] == str(app.config['SSE_RETRY_AFTER'])
+        assert broker.connection_count() == 1
+
+        first.close()
+        second = client.get('/events', headers=auth_headers)
+        assert second.status_code == 200
+        second.close()
+    assert broker.connection_count() == 0
+
+def test_unread_event_stream_releases_its_slot(app, auth_headers):
+    """Test that a stream response closed before its body is iterated is unsubscribed."""
+    with patch.object(broker, '_ensure_listener'), app.test_request_context('/events', headers=auth_headers):
+        response = app.full_dispatch_request()
+        assert response.status_code == 200
+        assert broker.connection_count() == 1
+        response.close()
+    assert broker.connection_count() == 0
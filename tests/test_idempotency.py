@@ -0,0 +1,65 @@
+import pytest
+import fakeredis
+from unittest.mock import patch
+from app.models import Contact, Note
+from app.tasks import call_upstream_service
+
+@pytest.fixture
+def redis_store():
+    """An in-memory Redis used as the idempotency store."""
+    store = fakeredis.FakeRedis()
+    with patch('app.idempotency.get_redis_client', return_value=store):
+        yield store
+
+def test_retried_contact_post_is_replayed(client, auth_headers, redis_store):
+    """Test that a retry with the same key returns the first response without a new row."""
+    headers = {**auth_headers, 'Idempotency-Key': 'contact-1'}
+    first = client.post('/contacts', json={'name': 'Once'}, headers=headers)
+    second = client.post('/contacts', json={'name': 'Once'}, headers=headers)
+
+    assert first.status_code == second.status_code == 201
+    assert second.get_json() == first.get_json()
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert Contact.query.filter_by(name='Once').count() == 1
+
+def test_retried_note_post_queues_processing_once(client, auth_headers, test_contact, redis_store):
+    """Test that a replayed note creation does not enqueue another process_note."""
+    headers = {**auth_headers, 'Idempotency-Key': 'note-1'}
+    with patch('app.tasks.process_note.delay') as mock_task:
+        for _ in range(3):
+            response = client.post(f'/contacts/{test_contact.id}/notes', json={'body': 'Once'}, headers=headers)
+            assert response.status_code == 201
+    assert Note.query.filter_by(body='Once').count() == 1
+    mock_task.assert_called_once()
+
+def test_key_reused_for_different_request(client, auth_headers, redis_store):
+    """Test that a key sent with a different body is rejected."""
+    headers = {**auth_headers, 'Idempotency-Key': 'contact-2'}
+    client.post('/contacts', json={'name': 'First'}, headers=headers)
+    response = client.post('/contacts', json={'name': 'Second'}, headers=headers)
+    assert response.status_code == 422
+    assert Contact.query.filter_by(name='Second').count() == 0
+
+def test_in_flight_duplicate_is_locked(client, auth_headers, test_user, redis_store):
+    """Test that a duplicate arriving while the first request runs gets 409."""
+    redis_store.set(f'idempotency:{test_user.id}:contact-3:lock', 'x')
+    headers = {**auth_headers, 'Idempotency-Key': 'contact-3'}
+    response = client.post('/contacts', json={'name': 'Busy'}, headers=headers)
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '1'
+    assert Contact.query.filter_by(name='Busy').count() == 0
+
+def test_requests_without_key_or_redis_run_normally(client, auth_headers):
+    """Test that the header is optional and Redis outages do not block writes."""
+    client.post('/contacts', json={'name': 'Plain'}, headers=auth_headers)
+    headers = {**auth_headers, 'Idempotency-Key': 'no-redis'}
+    with patch('app.idempotency.get_redis_client', return_value=None):
+        client.post('/contacts', json={'name': 'Plain'}, headers=headers)
+    assert Contact.query.filter_by(name='Plain').count() == 2
+
+def test_upstream_call_sends_stable_key(test_note):
+    """Test that upstream retries for one note share an Idempotency-Key."""
+    with patch('app.tasks.requests.post') as mock_post:
+        call_upstream_service(test_note)
+    assert mock_post.call_args.kwargs['headers'] == {'Idempotency-Key': f'process-note-{test_note.id}'}
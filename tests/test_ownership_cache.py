@@ -0,0 +1,112 @@
+import pytest
+import fakeredis
+from unittest.mock import patch
+from sqlalchemy import event
+from app.ownership import OwnershipCache, cache
+
+@pytest.fixture
+def statements(database):
+    """Record the SQL statements run while the fixture is active."""
+    recorded = []
+
+    def record(conn, cursor, statement, *args):
+        recorded.append(statement)
+
+    event.listen(database.engine, 'before_cursor_execute', record)
+    yield recorded
+    event.remove(database.engine, 'before_cursor_execute', record)
+
+# Ownership checks filter contacts by owner; the sync feed's owner lookup does not
+def ownership_queries(statements):
+    return [s for s in statements if 'contacts.user_id = ' in s]
+
+def test_cached_ownership_skips_contact_query(client, auth_headers, test_contact, test_note, statements):
+    """Test that repeated note calls on one contact stop querying the contact."""
+    base = f'/contacts/{test_contact.id}/notes'
+    assert client.get(f'{base}/{test_note.id}', headers=auth_headers).status_code == 200
+    assert ownership_queries(statements)
+
+    statements.clear()
+    assert client.get(f'{base}/{test_note.id}', headers=auth_headers).status_code == 200
+    assert client.get(base, headers=auth_headers).status_code == 200
+    response = client.put(f'{base}/{test_note.id}', json={'body': 'Edited'}, headers=auth_headers)
+    assert response.status_code == 200
+    assert ownership_queries(statements) == []
+
+def test_other_users_are_not_served_from_cache(client, auth_headers, test_contact, test_note):
+    """Test that a cached entry only covers the user who owns the contact."""
+    client.get(f'/contacts/{test_contact.id}/notes', headers=auth_headers)
+    client.post('/auth/register', json={'username': 'other', 'password': 'otherpass'})
+    token = client.post('/auth/login', json={'username': 'other', 'password': 'otherpass'}).get_json()['access_token']
+    other = {'Authorization': f'Bearer {token}'}
+
+    assert client.get(f'/contacts/{test_contact.id}/notes', headers=other).status_code == 404
+    assert client.get(f'/contacts/{test_contact.id}/notes/{test_note.id}', headers=other).status_code == 404
+
+def test_deferred_contact_delete_invalidates(app, client, auth_headers, test_contact, test_note):
+    """Test that a contact hidden for a background purge stops being served from cache."""
+    base = f'/contacts/{test_contact.id}/notes'
+    assert client.get(base, headers=auth_headers).status_code == 200
+    assert cache.is_cached(test_contact.user_id, test_contact.id)
+
+    app.config['PURGE_THRESHOLD'] = 0
+    with patch('app.tasks.purge_contact.delay'):
+        assert client.delete(f'/contacts/{test_contact.id}', headers=auth_headers).status_code == 202
+    assert client.get(base, headers=auth_headers).status_code == 404
+    assert client.get(f'{base}/{test_note.id}', headers=auth_headers).status_code == 404
+
+def test_rolled_back_batch_is_not_cached(client, auth_headers, test_user):
+    """Test that ownership seen inside a failed atomic batch is not remembered."""
+    response = client.post('/batch', json={'atomic': True, 'operations': [
+        {'ref': 'c', 'method': 'POST', 'path': '/contacts', 'body': {'name': 'Temp'}},
+        {'method': 'GET', 'path': '/contacts/$c.id/notes'},
+        {'method': 'POST', 'path': '/contacts', 'body': {}}
+    ]}, headers=auth_headers)
+    assert response.get_json()['committed'] is False
+    assert len(cache) == 0
+
+def test_local_tier_is_bounded(app):
+    """Test that the in-process tier evicts the least recently used entry and expires entries."""
+    app.config['OWNERSHIP_CACHE_REDIS'] = False
+    app.config['OWNERSHIP_CACHE_SIZE'] = 2
+    local = OwnershipCache()
+    local.remember(1, 10)
+    local.remember(1, 11)
+    assert local.is_cached(1, 10)
+    local.remember(1, 12)
+    assert len(local) == 2
+    assert not local.is_cached(1, 11)
+
+    app.config['OWNERSHIP_CACHE_TTL'] = -1
+    local.remember(1, 13)
+    assert not local.is_cached(1, 13)
+
+def test_redis_tier_is_shared_and_invalidated(app):
+    """Test that processes share entries through Redis and drop them on invalidation messages."""
+    store = fakeredis.FakeRedis()
+    first, second = OwnershipCache(), OwnershipCache()
+    with patch('app.ownership.get_redis_client', return_value=store), \
+            patch.object(OwnershipCache, '_ensure_listener'):
+        first.remember(1, 10)
+        assert second.is_cached(1, 10)
+
+        first.invalidate_contact(1, 10)
+        assert not store.hexists('ownership:1', 10)
+        # What the pub/sub listener does with the published message
+        second._handle(b'1:10')
+        assert not second.is_cached(1, 10)
+
+        first.remember(1, 11)
+        assert second.is_cached(1, 11)
+        first.invalidate_user(1)
+        second._handle(b'1:')
+        assert not second.is_cached(1, 11)
+
+def test_lookup_racing_a_delete_is_not_cached(app):
+    """Test that an ownership read from before an invalidation is discarded."""
+    app.config['OWNERSHIP_CACHE_REDIS'] = False
+    local = OwnershipCache()
+    generation = local.generation(1)
+    local.invalidate_contact(1, 10)
+    local.remember(1, 10, generation)
+    assert not local.is_cached(1, 10)
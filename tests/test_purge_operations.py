@@ -0,0 +1,76 @@
+from unittest.mock import patch
+from sqlalchemy import event
+from app.models import User, Contact, Note, SyncChange
+from app.purge import purge_contact_rows, purge_user_rows
+
+def add_notes(database, contact, count):
+    database.session.add_all([Note(contact_id=contact.id, body=f'note {i}') for i in range(count)])
+    database.session.commit()
+
+def test_small_contact_delete_cascades_in_database(client, auth_headers, database, test_contact):
+    """Test that deleting a contact removes its notes without loading them."""
+    add_notes(database, test_contact, 3)
+    database.session.expire_all()
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(database.engine, 'before_cursor_execute', record)
+    response = client.delete(f'/contacts/{test_contact.id}', headers=auth_headers)
+    event.remove(database.engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200
+    assert Note.query.count() == 0
+    assert not any(s.startswith('DELETE FROM notes') for s in statements)
+    assert SyncChange.query.filter_by(entity='contact', deleted=True).count() == 1
+
+def test_large_contact_delete_is_deferred(app, client, auth_headers, database, test_contact):
+    """Test that a contact above the threshold is hidden and purged in batches."""
+    app.config['PURGE_THRESHOLD'] = 2
+    add_notes(database, test_contact, 5)
+
+    with patch('app.tasks.purge_contact.delay') as mock_task:
+        response = client.delete(f'/contacts/{test_contact.id}', headers=auth_headers)
+    assert response.status_code == 202
+    mock_task.assert_called_once_with(test_contact.id)
+
+    # Hidden immediately, tombstoned in the sync feed, rows still present
+    assert client.get(f'/contacts/{test_contact.id}', headers=auth_headers).status_code == 404
+    assert client.get('/contacts', headers=auth_headers).get_json() == []
+    assert client.get('/sync', headers=auth_headers).get_json()['deleted']['contacts'] == [test_contact.id]
+    assert Note.query.count() == 5
+
+    assert purge_contact_rows(test_contact.id, batch_size=2) == 5
+    assert Note.query.count() == 0
+    assert Contact.query.count() == 0
+
+def test_delete_small_account(client, auth_headers, test_note):
+    """Test that account deletion removes the user, contacts and notes."""
+    response = client.delete('/auth/account', headers=auth_headers)
+    assert response.status_code == 200
+    assert User.query.count() == 0
+    assert Contact.query.count() == 0
+    assert Note.query.count() == 0
+    assert SyncChange.query.count() == 0
+
+    login = client.post('/auth/login', json={'username': 'testuser', 'password': 'testpass'})
+    assert login.status_code == 401
+
+def test_delete_large_account_is_deferred(app, client, auth_headers, database, test_user, test_contact):
+    """Test that a large account is hidden, locked out and purged in the background."""
+    app.config['PURGE_THRESHOLD'] = 2
+    add_notes(database, test_contact, 3)
+
+    with patch('app.tasks.purge_user.delay') as mock_task:
+        response = client.delete('/auth/account', headers=auth_headers)
+    assert response.status_code == 202
+    mock_task.assert_called_once_with(test_user.id)
+
+    login = client.post('/auth/login', json={'username': 'testuser', 'password': 'testpass'})
+    assert login.status_code == 401
+    assert Contact.query.get(test_contact.id).deleted_at is not None
+
+    assert purge_user_rows(test_user.id, batch_size=2) == 3
+    assert User.query.count() == 0
+    assert Note.query.count() == 0
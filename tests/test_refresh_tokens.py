@@ -0,0 +1,71 @@
+import pytest
+import fakeredis
+from unittest.mock import patch
+
+@pytest.fixture
+def redis_store():
+    """An in-memory Redis used as the refresh token and blocklist store."""
+    store = fakeredis.FakeRedis()
+    with patch('app.auth.get_redis_client', return_value=store):
+        yield store
+
+def login(client):
+    return client.post('/auth/login', json={'username': 'testuser', 'password': 'testpass'}).get_json()
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+def test_refresh_rotates_without_password_hash(client, test_user, redis_store):
+    """Test that a refresh token yields new tokens without running Argon2 again."""
+    tokens = login(client)
+    assert tokens['refresh_token']
+
+    with patch('app.auth.get_password_hasher', side_effect=AssertionError('password hashed on refresh')):
+        response = client.post('/auth/refresh', headers=bearer(tokens['refresh_token']))
+    assert response.status_code == 200
+    rotated = response.get_json()
+    assert rotated['refresh_token'] != tokens['refresh_token']
+    assert client.get('/contacts', headers=bearer(rotated['access_token'])).status_code == 200
+    assert client.post('/auth/refresh', headers=bearer(rotated['refresh_token'])).status_code == 200
+
+def test_reused_refresh_token_revokes_family(client, test_user, redis_store):
+    """Test that replaying a replaced refresh token logs out every token of the family."""
+    tokens = login(client)
+    rotated = client.post('/auth/refresh', headers=bearer(tokens['refresh_token'])).get_json()
+    # Past the grace period the replaced token only comes back if it was stolen
+    redis_store.delete(*redis_store.keys('refresh:*:previous'))
+
+    response = client.post('/auth/refresh', headers=bearer(tokens['refresh_token']))
+    assert response.status_code == 401
+    assert client.post('/auth/refresh', headers=bearer(rotated['refresh_token'])).status_code == 401
+    assert client.get('/contacts', headers=bearer(rotated['access_token'])).status_code == 401
+    # Other sessions of the same user are separate families
+    assert client.get('/contacts', headers=bearer(login(client)['access_token'])).status_code == 200
+
+def test_concurrent_refresh_within_grace_keeps_family(client, test_user, redis_store):
+    """Test that a just-replaced refresh token is refused without revoking the family."""
+    tokens = login(client)
+    rotated = client.post('/auth/refresh', headers=bearer(tokens['refresh_token'])).get_json()
+
+    response = client.post('/auth/refresh', headers=bearer(tokens['refresh_token']))
+    assert response.status_code == 401
+    assert response.get_json()['error'] == 'Refresh token was already used'
+    assert client.post('/auth/refresh', headers=bearer(rotated['refresh_token'])).status_code == 200
+
+def test_logout_revokes_access_and_refresh(client, test_user, redis_store):
+    """Test that logout blocks the access token and its refresh token family."""
+    tokens = login(client)
+    assert client.post('/auth/logout', headers=bearer(tokens['access_token'])).status_code == 200
+    assert client.get('/contacts', headers=bearer(tokens['access_token'])).status_code == 401
+    assert client.post('/auth/refresh', headers=bearer(tokens['refresh_token'])).status_code == 401
+
+def test_access_token_cannot_refresh(client, test_user, redis_store):
+    """Test that only refresh tokens are accepted by /auth/refresh."""
+    tokens = login(client)
+    assert client.post('/auth/refresh', headers=bearer(tokens['access_token'])).status_code == 422
+
+def test_login_without_redis_issues_access_token_only(client, test_user):
+    """Test that login still works when the refresh token store is down."""
+    with patch('app.auth.get_redis_client', return_value=None):
+        tokens = login(client)
+    assert set(tokens) == {'access_token'}
@@ -0,0 +1,148 @@
+import pytest
+import fakeredis
+from unittest.mock import patch
+from app import scheduling
+from app.scheduling import (enqueue_note, dispatch, task_finished, queue_stats, set_tenant_weight,
+                            INTERACTIVE, BULK, LOCK_KEY)
+
+@pytest.fixture
+def redis_store(app):
+    """An in-memory Redis holding the scheduler queues."""
+    store = fakeredis.FakeRedis()
+    with patch('app.scheduling.get_redis_client', return_value=store):
+        yield store
+
+@pytest.fixture
+def dispatched():
+    """Record the (note_id, lane) pairs handed to Celery."""
+    with patch('app.tasks.process_note.apply_async') as mock_apply:
+        yield mock_apply
+
+def dispatched_notes(mock_apply):
+    return [(call.kwargs['args'][0], call.kwargs['kwargs']['lane']) for call in mock_apply.call_args_list]
+
+def test_tenants_are_served_round_robin(app, redis_store, dispatched):
+    """Test that a light tenant is not stuck behind a heavy tenant's backlog."""
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 0
+    app.config['SCHEDULER_QUANTUM'] = 2
+    for note_id in range(1, 11):
+        enqueue_note(note_id, user_id=1)
+    enqueue_note(100, user_id=2)
+    enqueue_note(101, user_id=2)
+    assert dispatched.call_count == 0
+
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 6
+    task_finished(0, INTERACTIVE)
+    order = [note_id for note_id, _ in dispatched_notes(dispatched)]
+    assert order == [1, 2, 100, 101, 3, 4]
+
+def test_tenant_weight_scales_share(app, redis_store, dispatched):
+    """Test that a weighted tenant gets more notes per turn."""
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 0
+    app.config['SCHEDULER_QUANTUM'] = 1
+    set_tenant_weight(1, 3)
+    for note_id in range(1, 5):
+        enqueue_note(note_id, user_id=1)
+        enqueue_note(note_id + 100, user_id=2)
+
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 4
+    task_finished(0, INTERACTIVE)
+    assert [note_id for note_id, _ in dispatched_notes(dispatched)] == [1, 2, 3, 101]
+
+def test_burst_is_demoted_to_bulk_lane(app, redis_store, dispatched):
+    """Test that a tenant over the interactive burst limit is moved to the bulk queue."""
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 0
+    app.config['SCHEDULER_BULK_IN_FLIGHT'] = 0
+    app.config['SCHEDULER_INTERACTIVE_BURST'] = 2
+    for note_id in range(1, 5):
+        enqueue_note(note_id, user_id=1)
+
+    stats = queue_stats()
+    assert stats[INTERACTIVE]['waiting'] == 2
+    assert stats[BULK]['waiting'] == 2
+
+    app.config['SCHEDULER_BULK_IN_FLIGHT'] = 1
+    task_finished(0, BULK)
+    assert dispatched.call_args.kwargs['queue'] == 'notes.bulk'
+    assert dispatched_notes(dispatched) == [(3, BULK)]
+
+def test_in_flight_cap_and_release(app, redis_store, dispatched):
+    """Test that each lane keeps at most its in-flight limit outstanding."""
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 2
+    for note_id in range(1, 5):
+        enqueue_note(note_id, user_id=1)
+    assert dispatched.call_count == 2
+    assert queue_stats()[INTERACTIVE]['in_flight'] == 2
+
+    task_finished(1, INTERACTIVE)
+    assert dispatched.call_count == 3
+    assert dispatched_notes(dispatched)[-1] == (3, INTERACTIVE)
+
+    # Slots held by tasks lost with a worker expire
+    app.config['SCHEDULER_IN_FLIGHT_TIMEOUT'] = -1
+    task_finished(99, INTERACTIVE)
+    assert dispatched.call_count == 4
+
+def test_publish_failure_keeps_note_queued(app, redis_store, dispatched):
+    """Test that a note the broker refuses goes back to its queue and frees its slot."""
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 2
+    dispatched.side_effect = ConnectionError('broker down')
+    enqueue_note(1, user_id=1)
+    enqueue_note(2, user_id=1)
+    stats = queue_stats()[INTERACTIVE]
+    assert stats['in_flight'] == 0
+    assert stats['tenants'][0]['depth'] == 2
+
+    dispatched.side_effect = None
+    dispatched.reset_mock()
+    task_finished(0, INTERACTIVE)
+    assert dispatched_notes(dispatched) == [(1, INTERACTIVE), (2, INTERACTIVE)]
+
+def test_expired_dispatcher_keeps_next_holders_lock(app, redis_store, dispatched):
+    """Test that a dispatcher whose lock expired does not release the lock another one took."""
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 0
+    enqueue_note(1, user_id=1)
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 5
+    count_in_flight = scheduling._count_in_flight
+
+    def lock_expires_meanwhile(redis, lane):
+        # The lock times out and a second dispatcher takes it mid-run
+        redis.set(LOCK_KEY, 'other-dispatcher', ex=10)
+        return count_in_flight(redis, lane)
+
+    with patch('app.scheduling._count_in_flight', side_effect=lock_expires_meanwhile):
+        assert dispatch(redis_store) == 1
+    assert redis_store.get(LOCK_KEY) == b'other-dispatcher'
+
+    redis_store.delete(LOCK_KEY)
+    enqueue_note(2, user_id=1)
+    assert redis_store.get(LOCK_KEY) is None
+    assert [note_id for note_id, _ in dispatched_notes(dispatched)] == [1, 2]
+
+def test_queue_stats_reports_depth_and_wait(app, redis_store, dispatched):
+    """Test that queue stats list each waiting tenant with its oldest wait."""
+    app.config['SCHEDULER_INTERACTIVE_IN_FLIGHT'] = 0
+    with patch('app.scheduling.time.time', return_value=1000.0):
+        enqueue_note(1, user_id=7)
+        enqueue_note(2, user_id=7)
+    with patch('app.scheduling.time.time', return_value=1012.5):
+        stats = queue_stats()
+    assert stats[INTERACTIVE]['tenants'] == [
+        {'user_id': 7, 'depth': 2, 'oldest_wait_seconds': 12.5, 'weight': 1.0}
+    ]
+
+def test_batch_notes_use_bulk_lane(client, auth_headers, test_contact):
+    """Test that notes created through /batch are queued in the bulk lane."""
+    with patch('app.scheduling.enqueue_note') as mock_enqueue:
+        client.post(f'/contacts/{test_contact.id}/notes', json={'body': 'Single'}, headers=auth_headers)
+        client.post('/batch', json={'operations': [
+            {'method': 'POST', 'path': f'/contacts/{test_contact.id}/notes', 'body': {'body': 'Batched'}}
+        ]}, headers=auth_headers)
+    assert [call.args[2] for call in mock_enqueue.call_args_list] == [INTERACTIVE, BULK]
+
+def test_falls_back_to_celery_without_redis(app):
+    """Test that notes are still processed when the scheduler store is down."""
+    with patch('app.scheduling.get_redis_client', return_value=None), \
+            patch('app.tasks.process_note.delay') as mock_task:
+        enqueue_note(5, user_id=1)
+    mock_task.assert_called_once_with(5)
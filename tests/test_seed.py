@@ -0,0 +1,48 @@
+import random
+from app.models import User, Contact, Note
+from app.seed import skewed_count, SEED_PASSWORD
+
+def test_seed_command_creates_data(app, database):
+    """Test that the seed command bulk-inserts users, contacts and notes."""
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=[
+        'seed', '--users', '20', '--contacts-per-user', '3',
+        '--notes-per-contact', '4', '--batch-size', '7'
+    ])
+    assert result.exit_code == 0, result.output
+    assert User.query.count() == 20
+    assert Contact.query.count() > 0
+    assert Note.query.count() > 0
+    # Every note points at a seeded contact
+    orphans = Note.query.outerjoin(Contact, Note.contact_id == Contact.id).filter(Contact.id.is_(None)).count()
+    assert orphans == 0
+
+def test_seed_appends_after_existing_rows(app, database, test_contact):
+    """Test that seeding twice does not collide with existing ids."""
+    runner = app.test_cli_runner()
+    for _ in range(2):
+        result = runner.invoke(args=['seed', '--users', '5', '--seed', '7'])
+        assert result.exit_code == 0, result.output
+    assert User.query.count() == 11
+
+def test_seeded_user_can_login(client, app, database):
+    """Test that seeded users share the documented password."""
+    result = app.test_cli_runner().invoke(args=['seed', '--users', '1', '--contacts-per-user', '0'])
+    assert result.exit_code == 0, result.output
+    user = User.query.first()
+    response = client.post('/auth/login', json={'username': user.username, 'password': SEED_PASSWORD})
+    assert response.status_code == 200
+
+def test_seed_rejects_workers_on_memory_database(app, database):
+    """Test that parallel seeding refuses a per-process in-memory database."""
+    result = app.test_cli_runner().invoke(args=['seed', '--users', '5', '--workers', '2'])
+    assert result.exit_code != 0
+
+def test_skewed_count_is_heavy_tailed():
+    """Test that contact counts are skewed but keep roughly the requested mean."""
+    rng = random.Random(1)
+    counts = [skewed_count(rng, 20) for _ in range(20000)]
+    mean = sum(counts) / len(counts)
+    assert 12 < mean < 28
+    assert max(counts) > 5 * mean
+    assert sorted(counts)[len(counts) // 2] < mean
@@ -0,0 +1,42 @@
+import os
+import runpy
+from unittest.mock import patch
+from app import create_app, db
+from app import auth
+from app.config import TestingConfig
+from app.serving import worker_count, reset_after_fork
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_worker_count_sizing():
+    """Test that workers follow the CPU count within bounds unless configured."""
+    assert worker_count(cpus=2) == 5
+    assert worker_count(max_workers=12, cpus=32) == 12
+    assert worker_count(cpus=1, max_workers=1) == 2
+    assert worker_count(configured=3, cpus=32) == 3
+
+def test_reset_after_fork_drops_inherited_connections(tmp_path):
+    """Test that a forked worker gets a fresh database pool and Redis client."""
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'fork.db'}"
+
+    flask_app = create_app(FileConfig)
+    with flask_app.app_context():
+        db.create_all()
+        inherited_pool = db.engine.pool
+    with patch.object(auth, 'redis_client', object()):
+        reset_after_fork(flask_app)
+        assert auth.redis_client is None
+    with flask_app.app_context():
+        assert db.engine.pool is not inherited_pool
+        assert db.session.execute(db.text('SELECT 1')).scalar() == 1
+        db.session.remove()
+
+def test_gunicorn_config_preloads_and_resets(monkeypatch):
+    """Test that the production server config preloads the app and resets pools per worker."""
+    monkeypatch.chdir(ROOT)
+    settings = runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+    assert settings['preload_app'] is True
+    assert settings['workers'] >= 2
+    assert settings['worker_class'] == 'gthread'
+    assert callable(settings['post_fork'])
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+from app import create_worker_app
+from app.startup import profile_startup
+
+def test_web_startup_defers_heavy_imports():
+    """Test that building the web app leaves lazily loaded modules unimported."""
+    report = profile_startup('web', 'app.config.TestingConfig')
+    assert report['eager'] == []
+
+def test_worker_startup_defers_web_only_imports():
+    """Test that the worker factory skips blueprints, the limiter and Swagger."""
+    report = profile_startup('worker', 'app.config.TestingConfig')
+    assert report['eager'] == []
+
+def test_startup_within_budget(app):
+    """Test that web startup stays within the configured regression budget."""
+    report = profile_startup('web', 'app.config.TestingConfig')
+    assert report['wall_ms'] < app.config['STARTUP_BUDGET_MS']
+    assert report['top']
+
+def test_worker_app_registers_no_routes():
+    """Test that the worker app only carries what tasks need."""
+    worker_app = create_worker_app('app.config.TestingConfig')
+    assert worker_app.blueprints == {}
+    assert 'sqlalchemy' in worker_app.extensions
+    assert 'flask-jwt-extended' not in worker_app.extensions
+
+def test_celery_created_on_first_use():
+    """Test that importing tasks still works with the lazily created Celery app."""
+    code = ('import sys; from app import create_app; create_app("app.config.TestingConfig"); '
+            'assert "celery" not in sys.modules; '
+            'from app.tasks import process_note; from app import celery; '
+            'assert process_note.app is celery')
+    subprocess.run([sys.executable, '-c', code], check=True)
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from sqlalchemy import event
+from app.archive import archive_notes
+from app.models import Contact, Note, NoteActivity, NoteTotal
+from app.stats import rebuild_rollups
+
+def add_note(database, contact, days_old, count=1):
+    stamp = datetime.utcnow() - timedelta(days=days_old)
+    database.session.add_all([Note(contact_id=contact.id, body='note', created_at=stamp, updated_at=stamp)
+                              for _ in range(count)])
+    database.session.commit()
+
+def rollups():
+    return (sorted((a.contact_id, a.day, a.notes_created) for a in NoteActivity.query if a.notes_created),
+            sorted((t.contact_id, t.notes) for t in NoteTotal.query if t.notes))
+
+def test_note_writes_update_rollups(client, auth_headers, test_contact):
+    """Test that creating and deleting notes through the API keeps the rollups current."""
+    base = f'/contacts/{test_contact.id}/notes'
+    with patch('app.tasks.process_note.delay'):
+        first = client.post(base, json={'body': 'one'}, headers=auth_headers).get_json()['id']
+        client.post(base, json={'body': 'two'}, headers=auth_headers)
+
+    today = datetime.utcnow().date()
+    assert rollups() == ([(test_contact.id, today, 2)], [(test_contact.id, 2)])
+    # A deletion lowers the total but not the day the note was created on
+    client.delete(f'{base}/{first}', headers=auth_headers)
+    assert rollups() == ([(test_contact.id, today, 2)], [(test_contact.id, 1)])
+
+def test_stats_endpoint_series_and_totals(client, auth_headers, database, test_contact):
+    """Test that /stats returns a zero-filled daily series and per-user totals."""
+    add_note(database, test_contact, days_old=0, count=2)
+    add_note(database, test_contact, days_old=2)
+    today = datetime.utcnow().date()
+
+    response = client.get(f'/stats?from={today - timedelta(days=3)}&to={today}', headers=auth_headers)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['totals'] == {'contacts': 1, 'notes': 3}
+    assert [entry['notes_created'] for entry in data['activity']] == [0, 1, 0, 2]
+    assert data['activity'][-1]['period'] == today.isoformat()
+
+def test_stats_weekly_granularity(client, auth_headers, database, test_contact):
+    """Test that weekly stats bucket days into Monday-starting weeks."""
+    add_note(database, test_contact, days_old=0)
+    add_note(database, test_contact, days_old=7, count=3)
+    today = datetime.utcnow().date()
+    monday = today - timedelta(days=today.weekday())
+
+    response = client.get(f'/stats?from={today - timedelta(days=13)}&to={today}&granularity=week',
+                          headers=auth_headers)
+    series = response.get_json()['activity']
+    assert series[-1] == {'period': monday.isoformat(), 'notes_created': 1}
+    assert {'period': (monday - timedelta(days=7)).isoformat(), 'notes_created': 3} in series
+
+def test_stats_reads_only_rollups(client, auth_headers, database, test_contact):
+    """Test that the endpoint never scans the notes tables."""
+    add_note(database, test_contact, days_old=0, count=5)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(database.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/stats', headers=auth_headers)
+    finally:
+        event.remove(database.engine, 'before_cursor_execute', listener)
+    assert response.get_json()['totals']['notes'] == 5
+    assert not [s for s in statements if 'FROM notes' in s or 'notes_archive' in s]
+
+def test_archive_and_restore_do_not_change_counts(client, auth_headers, database, test_contact):
+    """Test that moving notes in and out of the archive leaves the rollups unchanged."""
+    add_note(database, test_contact, days_old=400)
+    before = rollups()
+    archive_notes(older_than_days=180, batch_size=100)
+    assert rollups() == before
+
+    base = f'/contacts/{test_contact.id}/notes'
+    note_id = client.get(f'{base}?include_archived=true', headers=auth_headers).get_json()[0]['id']
+    client.put(f'{base}/{note_id}', json={'body': 'edited'}, headers=auth_headers)
+    assert Note.query.get(note_id).body == 'edited'
+    assert rollups() == before
+
+def test_rebuild_matches_incremental(database, test_user, test_contact):
+    """Test that a full rebuild reproduces the incrementally maintained rollups."""
+    other = Contact(user_id=test_user.id, name='Other')
+    database.session.add(other)
+    database.session.commit()
+    add_note(database, test_contact, days_old=1, count=2)
+    add_note(database, other, days_old=400)
+    archive_notes(older_than_days=180, batch_size=100)
+    database.session.delete(Note.query.filter_by(contact_id=test_contact.id).first())
+    database.session.commit()
+    incremental = rollups()
+    assert incremental[1] == sorted([(test_contact.id, 1), (other.id, 1)])
+
+    rebuild_rollups()
+    database.session.commit()
+    assert rollups() == incremental
+
+def test_rebuild_raises_but_never_lowers_days(database, test_contact):
+    """Test that a rebuild counts notes inserted behind the ORM and keeps deleted notes' days."""
+    add_note(database, test_contact, days_old=3, count=2)
+    database.session.delete(Note.query.filter_by(contact_id=test_contact.id).first())
+    stamp = datetime.utcnow() - timedelta(days=1)
+    database.session.execute(Note.__table__.insert(), [
+        {'contact_id': test_contact.id, 'body': 'bulk', 'created_at': stamp, 'updated_at': stamp}
+        for _ in range(3)
+    ])
+    database.session.commit()
+
+    rebuild_rollups([test_contact.id])
+    database.session.commit()
+    today = datetime.utcnow().date()
+    assert rollups() == ([(test_contact.id, today - timedelta(days=3), 2), (test_contact.id, today - timedelta(days=1), 3)],
+                         [(test_contact.id, 4)])
+
+def test_stats_scoped_to_user_and_contact(client, auth_headers, database, test_contact):
+    """Test that stats exclude other users, deleted contacts and honour contact_id."""
+    add_note(database, test_contact, days_old=0)
+    client.post('/auth/register', json={'username': 'other', 'password': 'otherpass'})
+    token = client.post('/auth/login', json={'username': 'other', 'password': 'otherpass'}).get_json()['access_token']
+    other = {'Authorization': f'Bearer {token}'}
+    assert client.get('/stats', headers=other).get_json()['totals'] == {'contacts': 0, 'notes': 0}
+    assert client.get(f'/stats?contact_id={test_contact.id}', headers=other).status_code == 404
+
+    response = client.get(f'/stats?contact_id={test_contact.id}', headers=auth_headers)
+    assert response.get_json()['totals'] == {'contacts': 1, 'notes': 1}
+    client.delete(f'/contacts/{test_contact.id}', headers=auth_headers)
+    assert NoteTotal.query.count() == 0
+    assert client.get('/stats', headers=auth_headers).get_json()['totals'] == {'contacts': 0, 'notes': 0}
+
+def test_stats_validates_range(client, auth_headers):
+    """Test that bad dates, reversed ranges and ranges past STATS_MAX_DAYS are rejected."""
+    assert client.get('/stats?from=yesterday', headers=auth_headers).status_code == 400
+    assert client.get('/stats?from=2024-02-01&to=2024-01-01', headers=auth_headers).status_code == 400
+    assert client.get('/stats?from=2020-01-01&to=2024-01-01', headers=auth_headers).status_code == 400
+    assert client.get('/stats?granularity=month', headers=auth_headers).status_code == 400
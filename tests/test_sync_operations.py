@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+from app.models import SyncChange
+from app.sync import SYNC_LOCK_SPACE, _write_changes, compact_tombstones
+
+def test_initial_sync_returns_everything(client, auth_headers, test_contact, test_note):
+    """Test that syncing from 0 returns current contacts and notes."""
+    response = client.get('/sync', headers=auth_headers)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [c['name'] for c in data['contacts']] == ['Test Contact']
+    assert [n['body'] for n in data['notes']] == ['Test note']
+    assert data['next_token'] > 0
+    assert data['has_more'] is False
+
+def test_sync_returns_only_changes_since_token(client, auth_headers, test_contact, test_note):
+    """Test incremental sync picks up updates and deletes after a token."""
+    token = client.get('/sync', headers=auth_headers).get_json()['next_token']
+
+    # Nothing changed: empty page, same token
+    data = client.get(f'/sync?since={token}', headers=auth_headers).get_json()
+    assert data['contacts'] == [] and data['notes'] == []
+    assert data['next_token'] == token
+
+    client.put(f'/contacts/{test_contact.id}', json={'name': 'Renamed'}, headers=auth_headers)
+    client.delete(f'/contacts/{test_contact.id}/notes/{test_note.id}', headers=auth_headers)
+    data = client.get(f'/sync?since={token}', headers=auth_headers).get_json()
+    assert [c['name'] for c in data['contacts']] == ['Renamed']
+    assert data['notes'] == []
+    assert data['deleted']['notes'] == [test_note.id]
+    assert data['next_token'] > token
+
+def test_deleted_contact_tombstone_covers_notes(client, auth_headers, test_contact, test_note):
+    """Test that deleting a contact leaves one tombstone and no note rows."""
+    client.delete(f'/contacts/{test_contact.id}', headers=auth_headers)
+    data = client.get('/sync', headers=auth_headers).get_json()
+    assert data['deleted']['contacts'] == [test_contact.id]
+    assert data['deleted']['notes'] == []
+    assert SyncChange.query.filter_by(entity='note').count() == 0
+
+def test_sync_pages_are_bounded(client, auth_headers, test_contact):
+    """Test that has_more and next_token page through the feed."""
+    with patch('app.tasks.process_note.delay'):
+        for i in range(5):
+            client.post(f'/contacts/{test_contact.id}/notes', json={'body': f'note {i}'}, headers=auth_headers)
+    seen = []
+    token = 0
+    while True:
+        data = client.get(f'/sync?since={token}&limit=2', headers=auth_headers).get_json()
+        assert len(data['contacts']) + len(data['notes']) <= 2
+        seen += [n['body'] for n in data['notes']]
+        token = data['next_token']
+        if not data['has_more']:
+            break
+    assert seen == [f'note {i}' for i in range(5)]
+
+def test_compacted_token_requires_reset(client, auth_headers, database, test_contact, test_note):
+    """Test tombstone compaction and the reset response for stale tokens."""
+    client.delete(f'/contacts/{test_contact.id}/notes/{test_note.id}', headers=auth_headers)
+    tombstone = SyncChange.query.filter_by(deleted=True).one()
+    tombstone.changed_at = datetime.utcnow() - timedelta(days=60)
+    database.session.commit()
+
+    assert compact_tombstones(retention_days=30) == 1
+    response = client.get('/sync?since=1', headers=auth_headers)
+    assert response.status_code == 410
+    assert response.get_json()['reset'] is True
+
+def test_sync_is_scoped_to_user(client, auth_headers, database, test_contact):
+    """Test that another user's changes never appear in the feed."""
+    from app.models import User, Contact
+    other = User(username='other', password_hash='x')
+    database.session.add(other)
+    database.session.commit()
+    database.session.add(Contact(user_id=other.id, name='Not yours'))
+    database.session.commit()
+    data = client.get('/sync', headers=auth_headers).get_json()
+    assert [c['name'] for c in data['contacts']] == ['Test Contact']
+
+def test_postgres_feed_writes_hold_user_locks():
+    """Test that change rows are written under per-user advisory locks taken in user order."""
+    conn = MagicMock()
+    conn.dialect.name = 'postgresql'
+    rows = [{'user_id': user_id, 'entity': 'note', 'entity_id': user_id, 'contact_id': 1,
+             'deleted': False, 'changed_at': datetime.utcnow()} for user_id in (7, 3, 7)]
+    _write_changes(conn, rows)
+    locks = [call.args[1] for call in conn.execute.call_args_list[:2]]
+    assert locks == [{'space': SYNC_LOCK_SPACE, 'user_id': 3}, {'space': SYNC_LOCK_SPACE, 'user_id': 7}]
+    assert 'pg_advisory_xact_lock' in str(conn.execute.call_args_list[0].args[0])
+    assert conn.execute.call_count == 4
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import pytest
+import fakeredis
+from unittest.mock import MagicMock, patch
+from app import auth, create_app, db as _db, tracing
+from app.config import TestingConfig
+from app.ownership import cache as ownership_cache
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+class ListExporter:
+    """Keeps exported spans in memory; loaded by dotted path like any custom exporter."""
+    spans = []
+
+    def __init__(self, config):
+        pass
+
+    def export(self, spans):
+        ListExporter.spans.extend(spans)
+
+    def shutdown(self):
+        pass
+
+def make_app(tmp_path, **settings):
+    class TracingConfig(TestingConfig):
+        TRACING_ENABLED = True
+        TRACING_SAMPLE_RATE = 1.0
+        TRACING_FILE = str(tmp_path / 'traces.jsonl')
+        JWT_SECRET_KEY = 'test-secret-key'
+    for key, value in settings.items():
+        setattr(TracingConfig, key, value)
+    return create_app(TracingConfig)
+
+@pytest.fixture
+def app(tmp_path):
+    """An app tracing every request to a file in tmp_path."""
+    app = make_app(tmp_path)
+    with app.app_context(), patch.object(auth, 'redis_client', None):
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+    tracing.shutdown_tracing()
+    ownership_cache.clear()
+
+def read_spans(app):
+    with open(app.config['TRACING_FILE']) as f:
+        return [json.loads(line) for line in f]
+
+def test_request_continues_incoming_trace(app, client, auth_headers):
+    """Test that a request joins the caller's trace and records its SQL statements."""
+    response = client.get('/contacts', headers={**auth_headers, 'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01'})
+    assert response.status_code == 200
+    assert response.headers['traceparent'].startswith(f'00-{TRACE_ID}-')
+
+    spans = [span for span in read_spans(app) if span['trace_id'] == TRACE_ID]
+    server = next(span for span in spans if span['kind'] == 'server')
+    assert server['name'] == 'GET /contacts'
+    assert server['parent_id'] == PARENT_ID
+    assert server['attributes']['http.status_code'] == 200
+    sql = [span for span in spans if span['name'].startswith('SQL ')]
+    assert sql and all(span['parent_id'] == server['span_id'] for span in sql)
+
+def test_note_processing_joins_request_trace(app, client, auth_headers, test_contact):
+    """Test that the task and its upstream call continue the trace of the request that queued it."""
+    upstream = MagicMock(status_code=200)
+    upstream.json.return_value = {'status': 'received'}
+    with patch('app.tasks.requests.post', return_value=upstream) as post:
+        response = client.post(f'/contacts/{test_contact.id}/notes', json={'body': 'Traced'}, headers=auth_headers)
+    assert response.status_code == 201
+    trace_id = response.headers['traceparent'].split('-')[1]
+
+    spans = {span['name']: span for span in read_spans(app) if span['trace_id'] == trace_id}
+    server = spans['POST /contacts/<int:contact_id>/notes']
+    task = spans['task app.tasks.process_note']
+    call = spans['POST upstream']
+    assert task['parent_id'] == server['span_id']
+    assert call['parent_id'] == task['span_id']
+    assert call['attributes']['http.status_code'] == 200
+    # The upstream service is told which span called it
+    assert post.call_args.kwargs['headers']['traceparent'] == f"00-{trace_id}-{call['span_id']}-01"
+
+def test_task_messages_carry_trace(app, test_note):
+    """Test that published task headers let the worker continue the trace and time the queue wait."""
+    from celery import signals
+    from app.tasks import process_note
+    note_id = test_note.id
+    span, token = tracing.start_span('enqueue', parent=tracing.parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-01'))
+    headers = {'id': 'task-1'}
+    signals.before_task_publish.send(sender=process_note.name, headers=headers)
+    signals.after_task_publish.send(sender=process_note.name, headers=headers)
+    tracing.end_span(span, token)
+
+    with patch('app.tasks.call_upstream_service'):
+        process_note.apply(args=[note_id], task_id='task-1', headers=headers)
+
+    spans = {span['name']: span for span in read_spans(app) if span['trace_id'] == TRACE_ID}
+    publish = spans['publish app.tasks.process_note']
+    assert headers['traceparent'] == f"00-{TRACE_ID}-{publish['span_id']}-01"
+    task = spans['task app.tasks.process_note']
+    assert task['parent_id'] == publish['span_id']
+    assert task['attributes']['celery.queue_wait_ms'] >= 0
+    assert spans['queue wait']['parent_id'] == task['span_id']
+
+def test_failed_publish_closes_its_span(app):
+    """Test that a publish that raises ends its span with the error instead of leaking it."""
+    from celery import Task, signals
+    from app.tasks import process_note
+
+    def unreachable_broker(self, args=None, kwargs=None, task_id=None, **options):
+        signals.before_task_publish.send(sender=self.name, headers={'id': task_id})
+        raise ConnectionError('broker down')
+
+    span, token = tracing.start_span('enqueue', parent=tracing.parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-01'))
+    with patch.object(Task, 'apply_async', unreachable_broker), pytest.raises(ConnectionError):
+        process_note.apply_async(args=[1])
+    tracing.end_span(span, token)
+
+    assert tracing._publishing == {}
+    publish = next(span for span in read_spans(app) if span['name'] == 'publish app.tasks.process_note')
+    assert publish['error'] == 'ConnectionError: broker down'
+
+def test_only_app_engines_are_traced(app):
+    """Test that SQL listeners sit on the app's engine, not on every engine in the process."""
+    from sqlalchemy import create_engine, text
+    other = create_engine('sqlite://')
+    span, token = tracing.start_span('job', parent=tracing.parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-01'))
+    with other.connect() as connection:
+        connection.execute(text('SELECT 1'))
+    _db.session.execute(text('SELECT 2'))
+    tracing.end_span(span, token)
+
+    statements = [span['attributes']['db.statement'] for span in read_spans(app) if span['name'] == 'SQL SELECT']
+    assert statements == ['SELECT 2']
+
+def test_unsampled_requests_propagate_without_recording(tmp_path):
+    """Test that unsampled traces keep their id downstream but write no spans."""
+    app = make_app(tmp_path, TRACING_SAMPLE_RATE=0.0)
+    with app.app_context():
+        _db.create_all()
+        response = app.test_client().get('/')
+        assert response.headers['traceparent'].endswith('-00')
+        response = app.test_client().get('/', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-00'})
+        assert response.headers['traceparent'].startswith(f'00-{TRACE_ID}-')
+        _db.drop_all()
+    tracing.shutdown_tracing()
+    assert not (tmp_path / 'traces.jsonl').exists()
+
+def test_redis_commands_and_custom_exporter(tmp_path):
+    """Test that Redis commands are traced and spans reach an exporter loaded by path."""
+    make_app(tmp_path, TRACING_EXPORTER='tests.test_tracing.ListExporter')
+    store = tracing.instrument_redis(fakeredis.FakeRedis())
+    ListExporter.spans.clear()
+    span, token = tracing.start_span('job')
+    store.set('key', 'value')
+    with store.pipeline() as pipe:
+        pipe.incr('counter').expire('counter', 60).execute()
+    tracing.end_span(span, token)
+    tracing.shutdown_tracing()
+
+    names = [span['name'] for span in ListExporter.spans]
+    assert names == ['redis SET', 'redis pipeline', 'job']
+    assert ListExporter.spans[1]['attributes']['db.commands'] == ['INCRBY', 'EXPIRE']
+
+def test_async_views_are_traced(tmp_path):
+    """Test that the async app records server and SQL spans for the caller's trace."""
+    from flask_jwt_extended import create_access_token
+    from app.asgi import AsyncApp
+    from app.models import User
+    from tests.test_async_operations import call
+
+    flask_app = make_app(tmp_path, SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path}/async.db', REDIS_URL='redis://localhost:1/0')
+    application = AsyncApp(flask_app)
+    with flask_app.app_context():
+        _db.create_all()
+        user = User(username='asyncuser', password_hash='x')
+        _db.session.add(user)
+        _db.session.commit()
+        token = create_access_token(identity=str(user.id))
+        _db.session.remove()
+
+    status, _ = call(application, 'GET', '/contacts', token=token,
+                     extra_headers=[(b'traceparent', f'00-{TRACE_ID}-{PARENT_ID}-01'.encode())])
+    tracing.shutdown_tracing()
+    asyncio.run(application.engine.dispose())
+    assert status == 200
+    spans = [span for span in read_spans(flask_app) if span['trace_id'] == TRACE_ID]
+    server = next(span for span in spans if span['kind'] == 'server')
+    assert server['name'] == 'GET /contacts' and server['parent_id'] == PARENT_ID
+    assert any(span['name'] == 'SQL SELECT' and span['parent_id'] == server['span_id'] for span in spans)